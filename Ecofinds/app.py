@@ -1,54 +1,300 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import (Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify, g,
+                   stream_with_context)
+from flask.cli import AppGroup
 from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+import hashlib
 import os
-from database import create_connection, initialize_database
-import mysql.connector
-from datetime import datetime
+import sys
+from database import (check_schema, duplicate_key, explain_query, get_connection, init_pool, initialize_database,
+                      seed_database, set_query_hook)
+from catalog import CategoryRegistry, fetch_product_page, fetch_purchase_page, iter_purchases, monthly_spend
+from mysql.connector import Error, IntegrityError
+from PIL import Image
+
+# Modules shared with HACKATHON live in common/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import api, assets, auth, bulk, images, responses, sessions, storage
+from common.cache import Cache
+from common.fragments import FragmentCache, conditional_page
+from common.metrics import Instrumentation, stats_collector
 
 app = Flask(__name__)
+app.request_class = storage.UploadRequest
 app.secret_key = 'your_secret_key_here'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024  # 1MB for routes that take no files
+# Per-endpoint body limits, enforced while the upload is being read
+app.config['UPLOAD_LIMITS'] = {
+    'add_product': 8 * 1024 * 1024,
+    'edit_product': 8 * 1024 * 1024,
+    'dashboard': 2 * 1024 * 1024,  # profile picture
+    'import_products': 32 * 1024 * 1024,  # CSV/NDJSON body, read row by row
+}
+app.config['DB_POOL_SIZE'] = 10  # max open MySQL connections per process
+app.config['DB_POOL_TIMEOUT'] = 5  # seconds to wait for a free connection
+app.config['DB_POOL_RECYCLE'] = 1800  # seconds before a connection is replaced
+app.config['PRODUCTS_PER_PAGE'] = 24
+app.config['PURCHASES_PER_PAGE'] = 20
+app.config['CATEGORY_CACHE_TTL'] = 3600  # seconds before the category list is reloaded
+# memory:// keeps entries per process; redis://host:port/db shares them between workers
+app.config['CACHE_URL'] = os.environ.get('CACHE_URL', 'memory://?max_entries=4096')
+app.config['FRAGMENT_CACHE_TTL'] = 60  # seconds, backstop for writes made outside the app
+app.config['LISTING_CACHE_TTL'] = 30  # seconds a feed or search page is served from the cache
+app.config['SLOW_QUERY_MS'] = 100  # statements slower than this are logged with their EXPLAIN plan
+app.config['QUERY_REPEAT_THRESHOLD'] = 10  # one statement this many times in a request is logged as N+1
+# werkzeug method and cost for new hashes; older hashes are upgraded at the next login
+app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:600000'
+app.config['PASSWORD_HASH_WORKERS'] = 2  # hashing processes per app process; 0 hashes on the request thread
+# Where session data lives; the cookie only carries the session id
+app.config['SESSION_URL'] = os.environ.get('SESSION_URL', 'sqlite:///sessions.db')
+app.config['COMPRESS_MIN_SIZE'] = 1024  # bytes; smaller responses are sent as they are
+app.config['COMPRESS_LEVEL'] = 6  # gzip level
+app.config['COMPRESS_BROTLI_QUALITY'] = 4  # brotli quality, when the brotli package is installed
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+MAX_CART_QUANTITY = 1000  # per cart line, however it is added or updated
+
+# PBKDF2 runs in worker processes so a burst of logins doesn't stall other requests
+password_hasher = auth.PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS']
+)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Initialize database when the app starts
-with app.app_context():
+def save_upload(file):
+    """Store an uploaded image with its resized derivatives; returns the stored name or None"""
+    try:
+        return storage.store_image(file.stream, app.config['UPLOAD_FOLDER'])
+    except (OSError, Image.DecompressionBombError) as e:
+        print(f"Error processing upload {secure_filename(file.filename)}: {e}")
+        flash('Could not read the uploaded image.', 'error')
+        return None
+
+def release_upload(connection, name):
+    """Unlink a stored image once no product or user references it any more.
+
+    Uploads are content-addressed, so one file can back several listings;
+    only the last reference to go removes it. The count and the unlink run
+    under the image's lock, so an upload of the same file in another worker
+    can't be referenced in between.
+    """
+    with storage.release_lock(app.config['UPLOAD_FOLDER'], name) as locked:
+        if not locked:
+            return  # being stored again right now
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT (SELECT COUNT(*) FROM products WHERE image_path = %s)
+                 + (SELECT COUNT(*) FROM users WHERE user_image = %s)
+        """, (name, name))
+        (references,) = cursor.fetchone()
+        cursor.close()
+        if not references:
+            images.remove_image(app.config['UPLOAD_FOLDER'], name)
+
+def cart_summary(connection, user_id):
+    """(item count, total) of a user's cart, kept current by the cart_summaries triggers"""
+    cursor = connection.cursor()
+    cursor.execute("SELECT item_count, total FROM cart_summaries WHERE user_id = %s", (user_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    return (row[0], row[1]) if row else (0, 0)
+
+@app.after_request
+def cache_uploads(response):
+    # A content-addressed upload never changes under its name, so let browsers keep it
+    if request.endpoint == 'static' and storage.is_content_addressed(request.view_args.get('filename', '')):
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    return response
+
+# CSS, JS and images are served from fingerprinted, precompressed copies once `flask build-assets` has run
+static_assets = assets.Assets(app)
+
+@app.template_global()
+def upload_srcset(name):
+    """srcset of the WebP derivatives for an uploaded image, empty for legacy uploads"""
+    return ", ".join(
+        f"{url_for('static', filename='uploads/' + filename)} {size}w"
+        for size, filename in images.available_derivatives(app.config['UPLOAD_FOLDER'], name)
+        if size != 'thumb'
+    )
+
+@app.template_global()
+def upload_thumb(name):
+    """URL of the square thumbnail for an uploaded image, falling back to the image itself"""
+    for size, filename in images.available_derivatives(app.config['UPLOAD_FOLDER'], name):
+        if size == 'thumb':
+            return url_for('static', filename='uploads/' + filename)
+    return url_for('static', filename='uploads/' + name)
+
+# Listing pages and rendered fragments, invalidated by tag from the product and profile write paths
+shared_cache = Cache.from_url(app.config['CACHE_URL'], prefix='ecofinds:')
+fragment_cache = FragmentCache(shared_cache, ttl=app.config['FRAGMENT_CACHE_TTL'])
+
+@app.template_global()
+def product_card(product):
+    """Session-independent part of a listing card, rendered once per product version"""
+    fragment = fragment_cache.get(
+        'card', product['id'], lambda: (render_template('_product_card.html', product=product), None),
+        tags=[f"user:{product['seller_id']}"]
+    )
+    return fragment.html
+
+def cached_product_page(category_id='', search=''):
+    """One page of the feed or of search results, built once per TTL across workers.
+
+    Pages are tagged with their category (or category:all) and with every
+    product and seller on them, so a write only retires the pages it can
+    change. Concurrent misses for the same page run a single query.
+    """
+    after = request.args.get('after')
+    before = request.args.get('before')
+    per_page = app.config['PRODUCTS_PER_PAGE']
+    key = 'listing:' + hashlib.sha1(repr((category_id, search, after, before, per_page)).encode()).hexdigest()
+
+    def load():
+        filters, params = "", []
+        if category_id:
+            filters += " AND p.category_id = %s"
+            params.append(category_id)
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            page = fetch_product_page(cursor, filters, params, after=after, before=before,
+                                      per_page=per_page, search=search or None)
+            cursor.close()
+        return page
+
+    def row_tags(page):
+        for product in page[0]:
+            yield f"product:{product['id']}"
+            yield f"user:{product['seller_id']}"
+
+    return shared_cache.get_or_set(
+        key, load, ttl=app.config['LISTING_CACHE_TTL'],
+        tags=[f"category:{category_id or 'all'}"], tags_for=row_tags
+    )
+
+@app.template_global()
+def current_user():
+    """The logged-in user's profile, read once per request and cached until the profile changes"""
+    if 'user_id' not in session:
+        return None
+    if 'current_user' not in g:
+        user_id = session['user_id']
+
+        def load():
+            with get_connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute("SELECT id, username, email, user_image, created_at FROM users WHERE id = %s", (user_id,))
+                user = cursor.fetchone()
+                cursor.close()
+            return user
+
+        g.current_user = shared_cache.get_or_set(f'current_user:{user_id}', load, tags=[f'user:{user_id}'])
+    return g.current_user
+
+@app.cli.command('backfill-images')
+def backfill_images():
+    """Generate derivatives for uploads stored before the image pipeline existed."""
+    count = images.backfill(app.config['UPLOAD_FOLDER'])
+    print(f"Generated derivatives for {count} images")
+
+@app.cli.command('build-assets')
+def build_assets():
+    """Minify, fingerprint and precompress static assets into static/dist."""
+    manifest = assets.build(app.static_folder)
+    print(f"Built {len(manifest)} assets")
+
+# Text responses are gzip/brotli compressed for clients that accept it; see common/responses.py
+compression = responses.Compression(
+    app,
+    min_size=app.config['COMPRESS_MIN_SIZE'],
+    level=app.config['COMPRESS_LEVEL'],
+    brotli_quality=app.config['COMPRESS_BROTLI_QUALITY']
+)
+
+# Sessions are kept server-side; see common/sessions.py
+app.session_interface = sessions.ServerSideSessionInterface(
+    sessions.store_from_url(app.config['SESSION_URL'], prefix='ecofinds:')
+)
+
+# Route timings, query counts and the slow-query log, served at /metrics
+instrumentation = Instrumentation(
+    slow_query_ms=app.config['SLOW_QUERY_MS'],
+    repeat_threshold=app.config['QUERY_REPEAT_THRESHOLD'],
+    explain=explain_query
+)
+instrumentation.init_app(app)
+instrumentation.add_collector(
+    stats_collector('cache_events_total', 'Shared cache lookups by outcome', 'event', shared_cache.stats)
+)
+set_query_hook(instrumentation.record_query)
+
+init_pool(
+    size=app.config['DB_POOL_SIZE'],
+    timeout=app.config['DB_POOL_TIMEOUT'],
+    recycle=app.config['DB_POOL_RECYCLE']
+)
+
+# Schema changes run from `flask db upgrade`; workers only check the version
+check_schema()
+
+# Categories are seeded once and rarely change, so serve them from memory
+category_registry = CategoryRegistry(ttl=app.config['CATEGORY_CACHE_TTL'])
+
+db_cli = AppGroup('db', help='Create, migrate and seed the database.')
+
+@db_cli.command('upgrade')
+def db_upgrade():
+    """Create the database if needed and apply pending migrations."""
     initialize_database()
 
+@db_cli.command('seed')
+def db_seed():
+    """Insert the default categories into an empty database."""
+    seed_database()
+    category_registry.invalidate()
+
+app.cli.add_command(db_cli)
+
+@app.errorhandler(Error)
+def database_error(e):
+    print(f"Database error: {e}")
+    return "Database connection error", 500
+
+@app.errorhandler(api.ApiError)
+def api_error(e):
+    return jsonify(error=e.message), e.status
+
+@app.errorhandler(auth.HasherBusy)
+def hasher_busy(e):
+    print(f"Login refused: {e}")
+    flash('We are very busy right now. Please try again in a moment.', 'error')
+    return redirect(request.url)
+
+@app.errorhandler(RequestEntityTooLarge)
+@app.errorhandler(UnsupportedMediaType)
+def upload_rejected(e):
+    # Raised while the body is still streaming in, before or while the view reads it
+    if api.wants_json(request):
+        # A bulk import keeps the rows it read before the limit; its summary says how many
+        message = 'The request body is too large.' if isinstance(e, RequestEntityTooLarge) else e.description
+        return jsonify(error=message, **getattr(e, 'import_summary', {})), e.code
+    if isinstance(e, RequestEntityTooLarge):
+        flash('That file is too large to upload.', 'error')
+    else:
+        flash(e.description, 'error')
+    return redirect(request.url)
+
 # Home page
 @app.route('/')
 def index():
-    try:
-        connection = create_connection()
-        if connection:
-            cursor = connection.cursor(dictionary=True)
-            
-            # Get all products
-            cursor.execute("""
-                SELECT p.*, u.username as seller, c.name as category_name 
-                FROM products p 
-                JOIN users u ON p.seller_id = u.id 
-                JOIN categories c ON p.category_id = c.id 
-                ORDER BY p.created_at DESC
-            """)
-            products = cursor.fetchall()
-            
-            # Get categories for filter
-            cursor.execute("SELECT * FROM categories")
-            categories = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
-            
-            return render_template('index.html', products=products, categories=categories)
-        return "Database connection error", 500
-    except Exception as e:
-        return f"Error: {str(e)}", 500
+    # The page head goes out first; one page of the newest products is loaded as the template reaches it
+    return responses.stream_page('index.html', load_page=cached_product_page, categories=category_registry.all())
 
 # User registration
 @app.route('/register', methods=['GET', 'POST'])
@@ -63,40 +309,58 @@ def register():
             flash('Passwords do not match.', 'error')
             return redirect(url_for('register'))
         
-        connection = create_connection()
-        if connection:
+        hashed_password = password_hasher.hash(password)
+        
+        with get_connection() as connection:
             cursor = connection.cursor()
             
-            # Check if username or email already exists
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            if cursor.fetchone():
-                flash('Username already taken.', 'error')
-                return redirect(url_for('register'))
-            
-            cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-            if cursor.fetchone():
-                flash('Email already registered. Please login.', 'error')
+            # The unique keys on username and email catch duplicates without a lookup first
+            try:
+                cursor.execute(
+                    "INSERT INTO users (username, email, password) VALUES (%s, %s, %s)",
+                    (username, email, hashed_password)
+                )
+                connection.commit()
+            except IntegrityError as e:
+                connection.rollback()
+                if duplicate_key(e) == 'username':
+                    flash('Username already taken.', 'error')
+                else:
+                    flash('Email already registered. Please login.', 'error')
                 return redirect(url_for('register'))
-            
-            # Insert new user with hashed password
-            hashed_password = generate_password_hash(password)
-            cursor.execute(
-                "INSERT INTO users (username, email, password) VALUES (%s, %s, %s)",
-                (username, email, hashed_password)
-            )
-            connection.commit()
-            
-            cursor.close()
-            connection.close()
-            
-            flash('Registration successful. Please login.', 'success')
-            return redirect(url_for('login'))
+            finally:
+                cursor.close()
         
-        return "Database connection error", 500
+        flash('Registration successful. Please login.', 'success')
+        return redirect(url_for('login'))
     
     return render_template('register.html')
 
-# User login
+def authenticate(email, password):
+    """The user row for valid credentials, or None.
+
+    One query fetches everything login needs. The connection goes back to
+    the pool before the hash is checked, and an outdated hash is replaced
+    with one using the current method.
+    """
+    with get_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT id, username, email, password, user_image FROM users WHERE email = %s", (email,))
+        user = cursor.fetchone()
+        cursor.close()
+    
+    if not user:
+        return None
+    valid, new_hash = password_hasher.verify(user['password'], password)
+    if not valid:
+        return None
+    if new_hash:
+        with get_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("UPDATE users SET password = %s WHERE id = %s", (new_hash, user['id']))
+            connection.commit()
+            cursor.close()
+    return user
 
 # User login
 @app.route('/login', methods=['GET', 'POST'])
@@ -105,97 +369,80 @@ def login():
         email = request.form['email']
         password = request.form['password']
         
-        connection = create_connection()
-        if connection:
-            cursor = connection.cursor(dictionary=True)
-            
-            # Select only essential columns to avoid schema dependency
-            cursor.execute("SELECT id, username, email, password FROM users WHERE email = %s", (email,))
-            user = cursor.fetchone()
-            
-            cursor.close()
-            connection.close()
-            
-            if user and check_password_hash(user['password'], password):
-                session['user_id'] = user['id']
-                session['username'] = user['username']
-                session['email'] = user['email']
-                # Fetch user_image separately if it exists (optional)
-                connection = create_connection()
-                if connection:
-                    cursor = connection.cursor(dictionary=True)
-                    cursor.execute("SELECT user_image FROM users WHERE id = %s", (user['id'],))
-                    user_image = cursor.fetchone()
-                    session['user_image'] = user_image['user_image'] if user_image and 'user_image' in user_image else None
-                    cursor.close()
-                    connection.close()
-                flash('Login successful!', 'success')
-                return redirect(url_for('dashboard'))
-            else:
-                flash('Invalid email or password.', 'error')
+        user = authenticate(email, password)
+        if user:
+            session.regenerate()
+            session['user_id'] = user['id']
+            flash('Login successful!', 'success')
+            return redirect(url_for('dashboard'))
         
-        return "Database connection error", 500
+        flash('Invalid email or password.', 'error')
     
     return render_template('login.html')
+
 # User dashboard
 @app.route('/dashboard', methods=['GET', 'POST'])
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = create_connection()
-    if connection:
+    # Hash a new password before borrowing a connection, since it takes a while
+    password = request.form.get('password') if request.method == 'POST' else None
+    hashed_password = password_hasher.hash(password) if password else None
+    
+    with get_connection() as connection:
         cursor = connection.cursor(dictionary=True)
         
         if request.method == 'POST':
             # Handle profile update
             username = request.form['username']
             email = request.form['email']
-            password = request.form.get('password', None)
-            
-            # Check for duplicates
-            cursor.execute("SELECT id FROM users WHERE username = %s AND id != %s", (username, session['user_id']))
-            if cursor.fetchone():
-                flash('Username already taken.', 'error')
-                return redirect(url_for('dashboard'))
-            
-            cursor.execute("SELECT id FROM users WHERE email = %s AND id != %s", (email, session['user_id']))
-            if cursor.fetchone():
-                flash('Email already in use.', 'error')
-                return redirect(url_for('dashboard'))
             
             update_query = "UPDATE users SET username = %s, email = %s"
             params = [username, email]
             
-            if password:
-                hashed_password = generate_password_hash(password)
+            if hashed_password:
                 update_query += ", password = %s"
                 params.append(hashed_password)
             
             # Handle user image upload
+            old_image = None
+            filename = None
             if 'user_image' in request.files:
                 file = request.files['user_image']
                 if file and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"{timestamp}_{filename}"
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(file_path)
-                    update_query += ", user_image = %s"
-                    params.append(filename)
+                    filename = save_upload(file)
+                    if filename:
+                        # Read from the row, not the cache, since this file is about to be released
+                        cursor.execute("SELECT user_image FROM users WHERE id = %s", (session['user_id'],))
+                        old_image = cursor.fetchone()['user_image']
+                        update_query += ", user_image = %s"
+                        params.append(filename)
             
             update_query += " WHERE id = %s"
             params.append(session['user_id'])
             
-            cursor.execute(update_query, params)
-            connection.commit()
+            # The unique keys on username and email catch duplicates without a lookup first
+            try:
+                cursor.execute(update_query, params)
+                connection.commit()
+            except IntegrityError as e:
+                connection.rollback()
+                if filename:
+                    release_upload(connection, filename)
+                if duplicate_key(e) == 'username':
+                    flash('Username already taken.', 'error')
+                else:
+                    flash('Email already in use.', 'error')
+                return redirect(url_for('dashboard'))
+            
+            # The seller name shows on this user's cached cards, pages and listings, and
+            # the profile itself is cached for current_user()
+            shared_cache.invalidate_tag(f"user:{session['user_id']}")
+            g.pop('current_user', None)
             
-            # Update session
-            session['username'] = username
-            session['email'] = email
-            cursor.execute("SELECT user_image FROM users WHERE id = %s", (session['user_id'],))
-            user = cursor.fetchone()
-            session['user_image'] = user['user_image']
+            if old_image:
+                release_upload(connection, old_image)
             
             flash('Profile updated successfully!', 'success')
         
@@ -209,16 +456,9 @@ def dashboard():
         """, (session['user_id'],))
         products = cursor.fetchall()
         
-        # Get current user details for display
-        cursor.execute("SELECT * FROM users WHERE id = %s", (session['user_id'],))
-        user = cursor.fetchone()
-        
         cursor.close()
-        connection.close()
-        
-        return render_template('dashboard.html', products=products, user=user)
     
-    return "Database connection error", 500
+    return render_template('dashboard.html', products=products, user=current_user())
 
 # Add product
 @app.route('/add_product', methods=['GET', 'POST'])
@@ -226,45 +466,33 @@ def add_product():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor(dictionary=True)
-        
-        cursor.execute("SELECT * FROM categories")
-        categories = cursor.fetchall()
-        
-        if request.method == 'POST':
-            title = request.form['title']
-            description = request.form['description']
-            price = float(request.form['price'])
-            category_id = int(request.form['category_id'])
-            image_path = None
-            
-            if 'image' in request.files:
-                file = request.files['image']
-                if file and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"{timestamp}_{filename}"
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(file_path)
-                    image_path = filename
-            
+    if request.method == 'POST':
+        title = request.form['title']
+        description = request.form['description']
+        price = float(request.form['price'])
+        category_id = int(request.form['category_id'])
+        image_path = None
+        
+        if 'image' in request.files:
+            file = request.files['image']
+            if file and allowed_file(file.filename):
+                image_path = save_upload(file)
+        
+        with get_connection() as connection:
+            cursor = connection.cursor()
             cursor.execute(
                 "INSERT INTO products (title, description, price, category_id, seller_id, image_path) VALUES (%s, %s, %s, %s, %s, %s)",
                 (title, description, price, category_id, session['user_id'], image_path)
             )
             connection.commit()
-            
-            flash('Product added successfully!', 'success')
-            return redirect(url_for('dashboard'))
+            cursor.close()
         
-        cursor.close()
-        connection.close()
+        shared_cache.invalidate_tag(f'category:{category_id}', 'category:all')
         
-        return render_template('add_product.html', categories=categories)
+        flash('Product added successfully!', 'success')
+        return redirect(url_for('dashboard'))
     
-    return "Database connection error", 500
+    return render_template('add_product.html', categories=category_registry.all())
 
 # Edit product
 @app.route('/edit_product/<int:product_id>', methods=['GET', 'POST'])
@@ -272,8 +500,7 @@ def edit_product(product_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = create_connection()
-    if connection:
+    with get_connection() as connection:
         cursor = connection.cursor(dictionary=True)
         
         cursor.execute("SELECT * FROM products WHERE id = %s AND seller_id = %s", (product_id, session['user_id']))
@@ -283,9 +510,6 @@ def edit_product(product_id):
             flash('Product not found or you are not the owner.', 'error')
             return redirect(url_for('dashboard'))
         
-        cursor.execute("SELECT * FROM categories")
-        categories = cursor.fetchall()
-        
         if request.method == 'POST':
             title = request.form['title']
             description = request.form['description']
@@ -295,20 +519,12 @@ def edit_product(product_id):
             update_query = "UPDATE products SET title = %s, description = %s, price = %s, category_id = %s"
             params = [title, description, price, category_id]
             
+            old_image = None
             if 'image' in request.files:
                 file = request.files['image']
-                if file and allowed_file(file.filename):
-                    # Delete old image if exists
-                    if product['image_path']:
-                        old_path = os.path.join(app.config['UPLOAD_FOLDER'], product['image_path'])
-                        if os.path.exists(old_path):
-                            os.remove(old_path)
-                    
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"{timestamp}_{filename}"
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(file_path)
+                filename = save_upload(file) if file and allowed_file(file.filename) else None
+                if filename:
+                    old_image = product['image_path']
                     update_query += ", image_path = %s"
                     params.append(filename)
             
@@ -317,16 +533,21 @@ def edit_product(product_id):
             
             cursor.execute(update_query, params)
             connection.commit()
+            # Title or category changes can move it between listing and search pages
+            shared_cache.invalidate_tag(
+                f'product:{product_id}', f"category:{product['category_id']}", f'category:{category_id}', 'category:all'
+            )
+            
+            # Delete old image if nothing else uses it
+            if old_image:
+                release_upload(connection, old_image)
             
             flash('Product updated successfully!', 'success')
             return redirect(url_for('dashboard'))
         
         cursor.close()
-        connection.close()
-        
-        return render_template('edit_product.html', product=product, categories=categories)
     
-    return "Database connection error", 500
+    return render_template('edit_product.html', product=product, categories=category_registry.all())
 
 # Delete product
 @app.route('/delete_product/<int:product_id>')
@@ -334,37 +555,136 @@ def delete_product(product_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = create_connection()
-    if connection:
+    with get_connection() as connection:
         cursor = connection.cursor(dictionary=True)
         
         cursor.execute("SELECT * FROM products WHERE id = %s AND seller_id = %s", (product_id, session['user_id']))
         product = cursor.fetchone()
         
         if product:
-            # Delete image if exists
-            if product['image_path']:
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], product['image_path'])
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-            
             cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
             connection.commit()
+            # Listing pages are keyset-paged, so only the pages showing it change
+            fragment_cache.invalidate(product_id)
+            
+            # Delete image if nothing else uses it
+            if product['image_path']:
+                release_upload(connection, product['image_path'])
             
             flash('Product deleted successfully!', 'success')
         else:
             flash('Product not found or you are not the owner.', 'error')
         
         cursor.close()
-        connection.close()
     
     return redirect(url_for('dashboard'))
 
+# Bulk import products from a raw text/csv or application/x-ndjson body
+@app.route('/products/import', methods=['POST'])
+def import_products():
+    if 'user_id' not in session:
+        return jsonify(error='Log in to import products.'), 401
+    
+    fmt = bulk.FORMATS.get(request.mimetype) or request.args.get('format')
+    if fmt not in bulk.MIMETYPES:
+        return jsonify(error='Send the rows as text/csv or application/x-ndjson.'), 415
+    
+    seller_id = session['user_id']
+    # Categories can be given by name (as exported) or by id
+    categories = {}
+    for category in category_registry.all():
+        categories[category['name'].lower()] = categories[str(category['id'])] = category['id']
+    touched = set()
+    
+    def validate(row):
+        title = bulk.text_field(row, 'title', 255)
+        description = bulk.text_field(row, 'description', 65535, required=False)
+        price = bulk.number_field(row, 'price', maximum=99999999.99)
+        category_id = categories.get(str(row.get('category') or '').strip().lower())
+        if category_id is None:
+            raise bulk.RowError(f"Unknown category: {row.get('category')!r}")
+        touched.add(category_id)
+        return title, description, price, category_id, seller_id
+    
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        
+        def insert_batch(values):
+            # One multi-row INSERT and one commit per batch
+            try:
+                cursor.executemany(
+                    "INSERT INTO products (title, description, price, category_id, seller_id) VALUES (%s, %s, %s, %s, %s)",
+                    values
+                )
+                connection.commit()
+            except Error:
+                connection.rollback()
+                raise
+        
+        try:
+            summary = bulk.import_rows(bulk.read_rows(request.stream, fmt), validate, insert_batch, Error)
+        finally:
+            # Also runs when the body goes over the size limit part way; the rows before it stay imported
+            cursor.close()
+            if touched:
+                shared_cache.invalidate_tag('category:all', *(f'category:{category_id}' for category_id in touched))
+    
+    return jsonify(summary)
+
+# Bulk export the seller's products as CSV or NDJSON
+@app.route('/products/export')
+def export_products():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in bulk.MIMETYPES:
+        return jsonify(error='format must be csv or ndjson.'), 400
+    
+    seller_id = session['user_id']
+    fields = ('id', 'title', 'description', 'price', 'category', 'created_at')
+    
+    def rows():
+        with get_connection() as connection:
+            # An unbuffered cursor streams rows from the server as they are written out
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT p.id, p.title, p.description, p.price, c.name, p.created_at
+                FROM products p
+                JOIN categories c ON p.category_id = c.id
+                WHERE p.seller_id = %s
+                ORDER BY p.id
+            """, (seller_id,))
+            while True:
+                chunk = cursor.fetchmany(bulk.BATCH_SIZE)
+                if not chunk:
+                    break
+                yield from chunk
+            cursor.close()
+    
+    response = Response(stream_with_context(bulk.export_rows(rows(), fields, fmt)), mimetype=bulk.MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=products.{fmt}'
+    return response
+
 # Product detail
 @app.route('/product/<int:product_id>')
 def product_detail(product_id):
-    connection = create_connection()
-    if connection:
+    # Hot listings come straight from the fragment cache, or as a 304
+    fragment = fragment_cache.get(
+        'detail', product_id, lambda: render_product_detail(product_id),
+        tags_for=lambda fragment: [f"user:{fragment.data['seller_id']}"]
+    )
+    if fragment is None:
+        flash('Product not found.', 'error')
+        return redirect(url_for('index'))
+    
+    return conditional_page(
+        fragment, lambda: render_template('product_detail.html', fragment=fragment, product_id=product_id)
+    )
+
+def render_product_detail(product_id):
+    """Render the session-independent body of a product page; None if there is no such product"""
+    with get_connection() as connection:
         cursor = connection.cursor(dictionary=True)
         
         cursor.execute("""
@@ -377,15 +697,10 @@ def product_detail(product_id):
         product = cursor.fetchone()
         
         cursor.close()
-        connection.close()
-        
-        if product:
-            return render_template('product_detail.html', product=product)
-        else:
-            flash('Product not found.', 'error')
-            return redirect(url_for('index'))
     
-    return "Database connection error", 500
+    if not product:
+        return None
+    return render_template('_product_detail.html', product=product), {'seller_id': product['seller_id']}
 
 # Add to cart
 @app.route('/add_to_cart/<int:product_id>')
@@ -393,30 +708,26 @@ def add_to_cart(product_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = create_connection()
-    if connection:
+    with get_connection() as connection:
         cursor = connection.cursor()
         
-        # Check if already in cart
-        cursor.execute("SELECT id, quantity FROM carts WHERE user_id = %s AND product_id = %s", (session['user_id'], product_id))
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Increment quantity
-            cursor.execute("UPDATE carts SET quantity = quantity + 1 WHERE id = %s", (existing[0],))
-        else:
-            # Add new
+        # Add new or increment quantity in one statement (uk_carts_user_product);
+        # the foreign key on product_id rejects listings that don't exist
+        try:
             cursor.execute(
-                "INSERT INTO carts (user_id, product_id, quantity) VALUES (%s, %s, 1)",
-                (session['user_id'], product_id)
+                """INSERT INTO carts (user_id, product_id, quantity) VALUES (%s, %s, 1)
+                   ON DUPLICATE KEY UPDATE quantity = LEAST(quantity + 1, %s)""",
+                (session['user_id'], product_id, MAX_CART_QUANTITY)
             )
-        
-        connection.commit()
-        cursor.close()
-        connection.close()
-        
-        flash('Item added to cart.', 'success')
+            connection.commit()
+        except IntegrityError:
+            connection.rollback()
+            flash('Product not found.', 'error')
+            return redirect(url_for('index'))
+        finally:
+            cursor.close()
     
+    flash('Item added to cart.', 'success')
     return redirect(url_for('index'))
 
 # Cart view
@@ -425,8 +736,7 @@ def cart():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = create_connection()
-    if connection:
+    with get_connection() as connection:
         cursor = connection.cursor(dictionary=True)
         
         if request.method == 'POST':
@@ -434,13 +744,16 @@ def cart():
             cart_id = int(request.form['cart_id'])
             
             if action == 'update':
-                quantity = int(request.form['quantity'])
+                quantity = min(int(request.form['quantity']), MAX_CART_QUANTITY)
                 if quantity > 0:
-                    cursor.execute("UPDATE carts SET quantity = %s WHERE id = %s", (quantity, cart_id))
+                    cursor.execute(
+                        "UPDATE carts SET quantity = %s WHERE id = %s AND user_id = %s",
+                        (quantity, cart_id, session['user_id'])
+                    )
                 else:
-                    cursor.execute("DELETE FROM carts WHERE id = %s", (cart_id,))
+                    cursor.execute("DELETE FROM carts WHERE id = %s AND user_id = %s", (cart_id, session['user_id']))
             elif action == 'remove':
-                cursor.execute("DELETE FROM carts WHERE id = %s", (cart_id,))
+                cursor.execute("DELETE FROM carts WHERE id = %s AND user_id = %s", (cart_id, session['user_id']))
             
             connection.commit()
         
@@ -454,14 +767,131 @@ def cart():
         """, (session['user_id'],))
         cart_items = cursor.fetchall()
         
-        total = sum(item['price'] * item['quantity'] for item in cart_items)
-        
         cursor.close()
-        connection.close()
         
-        return render_template('cart.html', cart_items=cart_items, total=total)
+        _, total = cart_summary(connection, session['user_id'])
     
-    return "Database connection error", 500
+    return render_template('cart.html', cart_items=cart_items, total=total)
+
+# Cart badge: one primary-key lookup, fetched by script.js on every page
+@app.route('/cart/summary')
+def cart_badge():
+    if 'user_id' not in session:
+        return jsonify(count=0, total=0.0)
+    
+    with get_connection() as connection:
+        count, total = cart_summary(connection, session['user_id'])
+    
+    return jsonify(count=count, total=float(total))
+
+# JSON API v1: the feed, search and cart for script.js to update pages in place
+PRODUCT_FIELDS = ('id', 'title', 'price', 'image_path', 'created_at', 'seller_id', 'seller', 'category_name',
+                  'url', 'html')
+PRODUCT_DEFAULT_FIELDS = ('id', 'title', 'price', 'seller', 'category_name', 'url')
+PRODUCT_COMPUTED = {
+    'url': lambda product: url_for('product_detail', product_id=product['id']),
+    'html': product_card,  # the cached card fragment the HTML pages use
+}
+CART_FIELDS = ('product_id', 'title', 'price', 'quantity', 'subtotal', 'image_path', 'seller')
+CART_DEFAULT_FIELDS = ('product_id', 'title', 'price', 'quantity', 'subtotal')
+CART_COMPUTED = {'subtotal': lambda item: item['price'] * item['quantity']}
+
+def api_user_id():
+    if 'user_id' not in session:
+        raise api.ApiError('Log in to use the cart.', 401)
+    return session['user_id']
+
+def api_product_page(category_id='', search=''):
+    # Served from the same cached pages as the HTML feed and search
+    fields = api.select_fields(request.args.get('fields'), PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    products, next_cursor, prev_cursor = cached_product_page(category_id, search)
+    return jsonify(products=[api.project(product, fields, PRODUCT_COMPUTED) for product in products],
+                   next=next_cursor, prev=prev_cursor)
+
+def api_cart_summary(connection, user_id):
+    count, total = cart_summary(connection, user_id)
+    return jsonify(count=count, total=float(total))
+
+# API: product feed, one keyset page at a time (?category_id=&after=&before=&fields=)
+@app.route('/api/v1/products')
+def api_products():
+    return api_product_page(request.args.get('category_id', ''))
+
+# API: search (?q=&category_id=&after=&before=&fields=)
+@app.route('/api/v1/search')
+def api_search():
+    return api_product_page(request.args.get('category_id', ''), request.args.get('q', ''))
+
+# API: cart contents and totals; POST {"product_id", "quantity"} adds to it
+@app.route('/api/v1/cart', methods=['GET', 'POST'])
+def api_cart():
+    user_id = api_user_id()
+    
+    if request.method == 'POST':
+        body = api.json_body(request)
+        product_id = api.int_param(body.get('product_id'), 'product_id', None)
+        if product_id is None:
+            raise api.ApiError('product_id is required.')
+        quantity = api.int_param(body.get('quantity'), 'quantity', 1, maximum=MAX_CART_QUANTITY)
+        with get_connection() as connection:
+            cursor = connection.cursor()
+            # Selecting from products turns a missing listing into zero rows instead of an FK error;
+            # the derived table's alias names the incoming row, which VALUES() no longer should
+            cursor.execute("""
+                INSERT INTO carts (user_id, product_id, quantity)
+                SELECT * FROM (SELECT %s AS user_id, id AS product_id, %s AS quantity FROM products WHERE id = %s) AS new
+                ON DUPLICATE KEY UPDATE quantity = LEAST(carts.quantity + new.quantity, %s)
+            """, (user_id, quantity, product_id, MAX_CART_QUANTITY))
+            connection.commit()
+            added = cursor.rowcount
+            if not added:
+                # Zero rows also means a line already at the cap was left as it was
+                cursor.execute("SELECT 1 FROM products WHERE id = %s", (product_id,))
+                added = cursor.fetchone()
+            cursor.close()
+            if not added:
+                raise api.ApiError('Product not found.', 404)
+            return api_cart_summary(connection, user_id)
+    
+    fields = api.select_fields(request.args.get('fields'), CART_FIELDS, CART_DEFAULT_FIELDS)
+    with get_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT c.product_id, c.quantity, p.title, p.price, p.image_path, u.username as seller
+            FROM carts c
+            JOIN products p ON c.product_id = p.id
+            JOIN users u ON p.seller_id = u.id
+            WHERE c.user_id = %s
+            ORDER BY c.id
+        """, (user_id,))
+        items = cursor.fetchall()
+        cursor.close()
+        count, total = cart_summary(connection, user_id)
+    
+    return jsonify(items=[api.project(item, fields, CART_COMPUTED) for item in items],
+                   count=count, total=float(total))
+
+# API: set a cart line's quantity with PUT {"quantity"} (0 removes it), or DELETE it
+@app.route('/api/v1/cart/<int:product_id>', methods=['PUT', 'DELETE'])
+def api_cart_item(product_id):
+    user_id = api_user_id()
+    quantity = 0
+    if request.method == 'PUT':
+        quantity = api.int_param(api.json_body(request).get('quantity'), 'quantity', None,
+                                 minimum=0, maximum=MAX_CART_QUANTITY)
+        if quantity is None:
+            raise api.ApiError('quantity is required.')
+    
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        if quantity:
+            cursor.execute("UPDATE carts SET quantity = %s WHERE user_id = %s AND product_id = %s",
+                           (quantity, user_id, product_id))
+        else:
+            cursor.execute("DELETE FROM carts WHERE user_id = %s AND product_id = %s", (user_id, product_id))
+        connection.commit()
+        cursor.close()
+        return api_cart_summary(connection, user_id)
 
 # Checkout
 @app.route('/checkout')
@@ -469,40 +899,32 @@ def checkout():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor(dictionary=True)
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        connection.start_transaction()
+        
+        # Lock the cart rows so a concurrent checkout of the same cart waits
+        cursor.execute("SELECT id FROM carts WHERE user_id = %s FOR UPDATE", (session['user_id'],))
+        if not cursor.fetchall():
+            flash('Your cart is empty.', 'error')
+            return redirect(url_for('cart'))
         
-        # Get cart items
+        # Price the cart and move it to purchases in one statement
         cursor.execute("""
-            SELECT c.*, p.price 
+            INSERT INTO purchases (user_id, product_id, quantity, total_price)
+            SELECT c.user_id, c.product_id, c.quantity, p.price * c.quantity
             FROM carts c 
             JOIN products p ON c.product_id = p.id 
             WHERE c.user_id = %s
         """, (session['user_id'],))
-        cart_items = cursor.fetchall()
-        
-        if not cart_items:
-            flash('Your cart is empty.', 'error')
-            return redirect(url_for('cart'))
-        
-        # Move to purchases
-        for item in cart_items:
-            total_price = item['price'] * item['quantity']
-            cursor.execute(
-                "INSERT INTO purchases (user_id, product_id, quantity, total_price) VALUES (%s, %s, %s, %s)",
-                (session['user_id'], item['product_id'], item['quantity'], total_price)
-            )
         
         # Clear cart
         cursor.execute("DELETE FROM carts WHERE user_id = %s", (session['user_id'],))
         connection.commit()
         
         cursor.close()
-        connection.close()
-        
-        flash('Purchase completed successfully!', 'success')
     
+    flash('Purchase completed successfully!', 'success')
     return redirect(url_for('purchases'))
 
 # View purchases
@@ -511,26 +933,31 @@ def purchases():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = create_connection()
-    if connection:
+    user_id = session['user_id']
+    show_all = bool(request.args.get('all'))
+    
+    with get_connection() as connection:
         cursor = connection.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT pur.*, p.title, p.image_path, u.username as seller 
-            FROM purchases pur 
-            JOIN products p ON pur.product_id = p.id 
-            JOIN users u ON p.seller_id = u.id 
-            WHERE pur.user_id = %s 
-            ORDER BY pur.purchase_date DESC
-        """, (session['user_id'],))
-        purchases = cursor.fetchall()
-        
+        months = monthly_spend(cursor, user_id)
+        purchases, next_cursor = [], None
+        if not show_all:
+            purchases, next_cursor = fetch_purchase_page(
+                cursor, user_id, after=request.args.get('after'), per_page=app.config['PURCHASES_PER_PAGE']
+            )
         cursor.close()
-        connection.close()
-        
-        return render_template('purchases.html', purchases=purchases)
     
-    return "Database connection error", 500
+    if show_all:
+        # Full history: rows go from an unbuffered cursor to the client as the template renders them
+        def stream_purchases():
+            with get_connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                yield from iter_purchases(cursor, user_id)
+                cursor.close()
+        
+        return responses.stream_page('purchases.html', purchases=stream_purchases(), months=months, show_all=True)
+    
+    return render_template('purchases.html', purchases=purchases, months=months, next_cursor=next_cursor,
+                           paged=bool(request.args.get('after')))
 
 # Search products
 @app.route('/search')
@@ -538,41 +965,8 @@ def search():
     query = request.args.get('q', '')
     category_id = request.args.get('category_id', '')
     
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor(dictionary=True)
-        
-        sql = """
-            SELECT p.*, u.username as seller, c.name as category_name 
-            FROM products p 
-            JOIN users u ON p.seller_id = u.id 
-            JOIN categories c ON p.category_id = c.id 
-            WHERE 1=1
-        """
-        params = []
-        
-        if query:
-            sql += " AND p.title LIKE %s"
-            params.append(f"%{query}%")
-        
-        if category_id:
-            sql += " AND p.category_id = %s"
-            params.append(category_id)
-        
-        sql += " ORDER BY p.created_at DESC"
-        
-        cursor.execute(sql, params)
-        products = cursor.fetchall()
-        
-        cursor.execute("SELECT * FROM categories")
-        categories = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
-        
-        return render_template('index.html', products=products, categories=categories, search_query=query, selected_category=category_id)
-    
-    return "Database connection error", 500
+    return responses.stream_page('index.html', load_page=lambda: cached_product_page(category_id, query),
+                                 categories=category_registry.all(), search_query=query, selected_category=category_id)
 
 # User logout
 @app.route('/logout')
@@ -586,4 +980,8 @@ if __name__ == '__main__':
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
         os.makedirs(app.config['UPLOAD_FOLDER'])
     
+    # The dev server sets itself up; deployments run `flask db upgrade` once instead
+    initialize_database()
+    seed_database()
+    
     app.run(debug=True)
\ No newline at end of file
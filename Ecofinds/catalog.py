@@ -0,0 +1,222 @@
+import re
+import threading
+import time
+from datetime import datetime
+
+from database import get_connection
+
+# Only the columns the product cards in index.html render
+CARD_COLUMNS = """
+    p.id, p.title, p.price, p.image_path, p.created_at, p.seller_id,
+    u.username as seller, c.name as category_name
+"""
+
+# Served by the ft_products_search FULLTEXT index. Relevance is rounded so the
+# value echoed back in a cursor compares equal to the one MySQL recomputes.
+MATCH_EXPR = "MATCH(p.title, p.description) AGAINST (%s IN BOOLEAN MODE)"
+RELEVANCE_EXPR = f"ROUND({MATCH_EXPR}, 6)"
+
+CURSOR_FORMAT = "%Y%m%d%H%M%S"
+
+def load_categories():
+    with get_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT id, name FROM categories ORDER BY id")
+        categories = cursor.fetchall()
+        cursor.close()
+    return categories
+
+class CategoryRegistry:
+    """Process-local cache of the categories table.
+
+    The list is loaded once and served from memory until ``ttl`` seconds have
+    passed or invalidate() is called, so category pickers and filters don't
+    cost a query per request. Callers must treat the returned rows as
+    read-only since they are shared between requests.
+    """
+
+    def __init__(self, loader=load_categories, ttl=3600):
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._categories = None
+        self._loaded_at = 0.0
+
+    def all(self):
+        """Return every category, reloading first if the cache is empty or stale"""
+        if self._stale():
+            with self._lock:
+                if self._stale():
+                    self._load()
+        return self._categories
+
+    def invalidate(self):
+        """Drop the cached list so the next lookup reloads it from the database"""
+        with self._lock:
+            self._categories = None
+
+    def _stale(self):
+        return self._categories is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _load(self):
+        categories = self.loader()
+        self._loaded_at = time.monotonic()
+        self._categories = categories
+
+def boolean_query(text):
+    """Turn free text into a BOOLEAN MODE query requiring every word as a prefix.
+
+    Returns None when nothing searchable is left after stripping operators.
+    """
+    words = re.findall(r"\w+", text)
+    return " ".join(f"+{word}*" for word in words) or None
+
+def encode_cursor(row, date_column='created_at'):
+    """Turn a feed row into an opaque ``<sort key>_<id>`` URL token"""
+    if 'relevance' in row:
+        return f"{row['relevance']:.6f}_{row['id']}"
+    return f"{row[date_column].strftime(CURSOR_FORMAT)}_{row['id']}"
+
+def decode_cursor(token, ranked=False):
+    """Parse a cursor token back into (sort key, id), or None if it is malformed"""
+    try:
+        key, product_id = token.split('_')
+        key = float(key) if ranked else datetime.strptime(key, CURSOR_FORMAT)
+        return key, int(product_id)
+    except (AttributeError, ValueError):
+        return None
+
+def fetch_product_page(cursor, filters="", params=(), after=None, before=None, per_page=24, search=None):
+    """Fetch one page of the product feed.
+
+    Pages are addressed by keyset cursors rather than OFFSET, so every page is
+    a bounded range scan no matter how deep the reader has paged. The plain
+    feed is newest-first on (created_at, id), served by idx_products_feed (or
+    idx_products_category_feed when filtering by category). When ``search``
+    is given the FULLTEXT index picks the candidate rows and the page is
+    ordered by (relevance, id) instead. ``filters`` is appended to the WHERE
+    clause and must start with AND.
+
+    Returns (products, next_cursor, prev_cursor); a cursor is None when there
+    is nothing further in that direction. A search with no words in it (only
+    punctuation, say) matches nothing rather than falling back to the feed.
+    """
+    match_query = boolean_query(search) if search else None
+    if search and not match_query:
+        return [], None, None
+    columns = CARD_COLUMNS
+    select_params = []
+    where_params = list(params)
+
+    if match_query:
+        columns += f", {RELEVANCE_EXPR} as relevance"
+        select_params.append(match_query)
+        filters += f" AND {MATCH_EXPR}"
+        where_params.append(match_query)
+        sort_expr, sort_params, order_expr = RELEVANCE_EXPR, [match_query], "relevance"
+    else:
+        sort_expr, sort_params, order_expr = "p.created_at", [], "p.created_at"
+
+    sql = f"""
+        SELECT {columns}
+        FROM products p
+        JOIN users u ON p.seller_id = u.id
+        JOIN categories c ON p.category_id = c.id
+        WHERE 1=1 {filters}
+    """
+    params = select_params + where_params
+
+    backward = decode_cursor(before, ranked=bool(match_query))
+    forward = None if backward else decode_cursor(after, ranked=bool(match_query))
+
+    if backward:
+        sql += f" AND ({sort_expr} > %s OR ({sort_expr} = %s AND p.id > %s))"
+        sql += f" ORDER BY {order_expr} ASC, p.id ASC"
+        params += sort_params + [backward[0]] + sort_params + [backward[0], backward[1]]
+    else:
+        if forward:
+            sql += f" AND ({sort_expr} < %s OR ({sort_expr} = %s AND p.id < %s))"
+            params += sort_params + [forward[0]] + sort_params + [forward[0], forward[1]]
+        sql += f" ORDER BY {order_expr} DESC, p.id DESC"
+
+    # Fetch one extra row to learn whether another page exists
+    sql += " LIMIT %s"
+    params.append(per_page + 1)
+
+    cursor.execute(sql, params)
+    products = cursor.fetchall()
+    has_more = len(products) > per_page
+    products = products[:per_page]
+
+    if backward:
+        products.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = forward is not None, has_more
+
+    next_cursor = encode_cursor(products[-1]) if products and has_older else None
+    prev_cursor = encode_cursor(products[0]) if products and has_newer else None
+    return products, next_cursor, prev_cursor
+
+# Only what a purchase history card renders; descriptions stay in the products table
+PURCHASE_COLUMNS = """
+    pur.id, pur.purchase_date, pur.quantity, pur.total_price,
+    p.title, p.image_path, u.username as seller
+"""
+
+PURCHASE_HISTORY_SQL = f"""
+    SELECT {PURCHASE_COLUMNS}
+    FROM purchases pur
+    JOIN products p ON pur.product_id = p.id
+    JOIN users u ON p.seller_id = u.id
+    WHERE pur.user_id = %s {{filters}}
+    ORDER BY pur.purchase_date DESC, pur.id DESC
+"""
+
+def fetch_purchase_page(cursor, user_id, after=None, per_page=20):
+    """Fetch one page of a user's purchase history, newest first.
+
+    Keyset-paginated on (purchase_date, id) like the product feed, so deep
+    pages cost the same range scan of idx_purchases_history as the first.
+    Returns (purchases, next_cursor); next_cursor is None on the last page.
+    """
+    filters, params = "", [user_id]
+    forward = decode_cursor(after)
+    if forward:
+        filters = "AND (pur.purchase_date < %s OR (pur.purchase_date = %s AND pur.id < %s))"
+        params += [forward[0], forward[0], forward[1]]
+    cursor.execute(PURCHASE_HISTORY_SQL.format(filters=filters) + " LIMIT %s", params + [per_page + 1])
+    purchases = cursor.fetchall()
+    has_more = len(purchases) > per_page
+    purchases = purchases[:per_page]
+    next_cursor = encode_cursor(purchases[-1], 'purchase_date') if has_more else None
+    return purchases, next_cursor
+
+def iter_purchases(cursor, user_id, chunk_size=500):
+    """Yield a user's whole purchase history, newest first, ``chunk_size`` rows at a time.
+
+    Meant for an unbuffered cursor, so rows are read from the server as the
+    caller consumes them rather than collected into one list.
+    """
+    cursor.execute(PURCHASE_HISTORY_SQL.format(filters=""), (user_id,))
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            return
+        yield from chunk
+
+def monthly_spend(cursor, user_id):
+    """Purchase count, items and spend per calendar month, newest month first.
+
+    Aggregated in MySQL from the covering idx_purchases_history index, so
+    the history page gets its totals without reading every purchase row.
+    """
+    cursor.execute("""
+        SELECT YEAR(purchase_date) AS year, MONTH(purchase_date) AS month,
+               COUNT(*) AS purchases, SUM(quantity) AS item_count, SUM(total_price) AS spend
+        FROM purchases
+        WHERE user_id = %s
+        GROUP BY YEAR(purchase_date), MONTH(purchase_date)
+        ORDER BY year DESC, month DESC
+    """, (user_id,))
+    return cursor.fetchall()
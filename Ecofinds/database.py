@@ -1,128 +1,267 @@
+import threading
+import time
+from contextlib import contextmanager
+
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
 
-def create_connection():
-    try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            database='ecofinds_db',
-            user='ecofinds_user',
-            password='your_secure_password_123'  # Use the password you set
-        )
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+from migrations import LATEST_VERSION, migrate, schema_version
+
+DB_CONFIG = {
+    'host': 'localhost',
+    'database': 'ecofinds_db',
+    'user': 'ecofinds_user',
+    'password': 'your_secure_password_123'  # Use the password you set
+}
+
+class TimedCursor:
+    """Cursor wrapper reporting each statement and how long it took to the query hook"""
+
+    def __init__(self, cursor, hook):
+        self._cursor = cursor
+        self._hook = hook
+
+    def execute(self, operation, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, **kwargs)
+        finally:
+            self._hook(operation, params, time.perf_counter() - start)
+
+    def executemany(self, operation, seq_params):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params)
+        finally:
+            self._hook(operation, None, time.perf_counter() - start)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class TimedConnection:
+    """Connection wrapper whose cursors are TimedCursors"""
+
+    def __init__(self, connection, hook):
+        self._connection = connection
+        self._hook = hook
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._connection.cursor(*args, **kwargs), self._hook)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+_query_hook = None
+
+def set_query_hook(hook):
+    """Report every statement run on connections opened from now on to ``hook(sql, params, seconds)``"""
+    global _query_hook
+    _query_hook = hook
+
+def _connect(**config):
+    connection = mysql.connector.connect(**config)
+    return TimedConnection(connection, _query_hook) if _query_hook else connection
+
+def duplicate_key(error):
+    """Name of the unique key an IntegrityError collided with, or None for other integrity errors"""
+    if error.errno != errorcode.ER_DUP_ENTRY:
         return None
+    # "Duplicate entry 'bob' for key 'users.username'" (older servers omit the table)
+    return error.msg.rsplit("'", 2)[-2].rsplit('.', 1)[-1]
+
+class PoolTimeout(Error):
+    """Raised when no pooled connection frees up within the checkout timeout"""
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQL connections.
+
+    At most ``size`` connections are checked out or idle at any time; callers
+    block for up to ``timeout`` seconds waiting for a free slot. Idle
+    connections are pinged before reuse once they have sat for longer than
+    ``ping_interval`` seconds, and connections older than ``recycle`` seconds
+    are closed instead of being handed out again.
+    """
+
+    def __init__(self, size=10, timeout=5.0, recycle=1800, ping_interval=5.0, config=None):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.config = config or DB_CONFIG
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []  # stack of (connection, created_at, last_used)
+
+    def acquire(self):
+        """Check out a healthy connection, returning (connection, created_at)"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        try:
+            return self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, created_at):
+        """Return a connection to the pool, resetting any open transaction"""
+        try:
+            if connection.unread_result:
+                connection.consume_results()
+            if connection.in_transaction:
+                connection.rollback()
+        except Error:
+            self._discard(connection)
+        else:
+            with self._lock:
+                self._idle.append((connection, created_at, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                return _connect(**self.config), time.monotonic()
+
+            connection, created_at, last_used = entry
+            now = time.monotonic()
+            if now - created_at > self.recycle:
+                self._discard(connection)
+            elif now - last_used > self.ping_interval and not connection.is_connected():
+                self._discard(connection)
+            else:
+                return connection, created_at
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def init_pool(**kwargs):
+    """(Re)create the process-wide connection pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(**kwargs)
+    return _pool
+
+def _get_pool():
+    # Created with the defaults if init_pool() hasn't run; never replaces a pool another thread made
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection for the duration of a ``with`` block.
+
+    The connection always goes back to the pool, including when the block
+    returns early or raises; uncommitted work is rolled back as it goes back.
+    """
+    pool = _get_pool()
+    connection, created_at = pool.acquire()
+    try:
+        yield connection
+    finally:
+        pool.release(connection, created_at)
+
+def explain_query(sql, params=None):
+    """MySQL's plan for a SELECT, one line per table it reads"""
+    with get_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("EXPLAIN " + sql, params)
+        plan = cursor.fetchall()
+        cursor.close()
+    return [
+        f"table={row['table']} type={row['type']} key={row['key']} rows={row['rows']} extra={row['Extra']}"
+        for row in plan
+    ]
 
 def initialize_database():
-    """Initialize the database with all required tables"""
+    """Create the database if needed and apply pending migrations (``flask db upgrade``)"""
+    connection = None
     try:
         # First connect without specifying a database to check if it exists
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='ecofinds_user',
-            password='your_secure_password_123'
-        )
+        server_config = {k: v for k, v in DB_CONFIG.items() if k != 'database'}
+        connection = mysql.connector.connect(**server_config)
         
         if connection.is_connected():
             cursor = connection.cursor()
             
             # Create database if it doesn't exist
-            cursor.execute("CREATE DATABASE IF NOT EXISTS ecofinds_db")
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_CONFIG['database']}")
             print("Database checked/created successfully")
             
             # Switch to the database
-            cursor.execute("USE ecofinds_db")
-            
-            # Create users table (added user_image)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    username VARCHAR(50) UNIQUE NOT NULL,
-                    email VARCHAR(100) UNIQUE NOT NULL,
-                    password VARCHAR(255) NOT NULL,
-                    user_image VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            print("Users table checked/created successfully")
-            
-            # Create categories table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS categories (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(50) NOT NULL
-                )
-            """)
-            print("Categories table checked/created successfully")
-            
-            # Create products table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS products (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    title VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    price DECIMAL(10, 2) NOT NULL,
-                    category_id INT,
-                    seller_id INT,
-                    image_path VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (category_id) REFERENCES categories(id),
-                    FOREIGN KEY (seller_id) REFERENCES users(id)
-                )
-            """)
-            print("Products table checked/created successfully")
+            cursor.execute(f"USE {DB_CONFIG['database']}")
             
-            # Create carts table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS carts (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT,
-                    product_id INT,
-                    quantity INT DEFAULT 1,
-                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (product_id) REFERENCES products(id)
-                )
-            """)
-            print("Carts table checked/created successfully")
-            
-            # Create purchases table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS purchases (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT,
-                    product_id INT,
-                    purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    quantity INT DEFAULT 1,
-                    total_price DECIMAL(10, 2),
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (product_id) REFERENCES products(id)
-                )
-            """)
-            print("Purchases table checked/created successfully")
-            
-            # Insert default categories if table is empty
-            cursor.execute("SELECT COUNT(*) FROM categories")
-            if cursor.fetchone()[0] == 0:
-                categories = [
-                    ('Electronics',),
-                    ('Clothing',),
-                    ('Furniture',),
-                    ('Books',),
-                    ('Sports',),
-                    ('Toys',),
-                    ('Other',)
-                ]
-                cursor.executemany("INSERT INTO categories (name) VALUES (%s)", categories)
-                print("Default categories added successfully")
-            
-            connection.commit()
+            # Create or upgrade the schema; a no-op once every migration is recorded
+            migrate(connection)
+            cursor.close()
             print("Database initialization completed successfully!")
             
     except Error as e:
         print(f"Error initializing database: {e}")
     finally:
-        if connection.is_connected():
+        # None when the server could not be reached at all
+        if connection is not None and connection.is_connected():
+            connection.close()
+
+def seed_database():
+    """Insert the default categories if the table is empty (``flask db seed``)"""
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM categories")
+        if cursor.fetchone()[0] == 0:
+            categories = [
+                ('Electronics',),
+                ('Clothing',),
+                ('Furniture',),
+                ('Books',),
+                ('Sports',),
+                ('Toys',),
+                ('Other',)
+            ]
+            cursor.executemany("INSERT INTO categories (name) VALUES (%s)", categories)
+            connection.commit()
+            print("Default categories added successfully")
+        cursor.close()
+
+def check_schema():
+    """Warn if the database is behind the code's migrations; True when it is current.
+
+    This is the only database work done at boot: a single indexed MAX()
+    instead of re-running DDL and seeding in every worker.
+    """
+    try:
+        with get_connection() as connection:
+            cursor = connection.cursor()
+            version = schema_version(cursor)
             cursor.close()
-            connection.close()
\ No newline at end of file
+    except Error as e:
+        print(f"Could not check database schema: {e}")
+        return False
+    if version < LATEST_VERSION:
+        print(f"Database schema is at version {version} but the code expects {LATEST_VERSION}; run `flask db upgrade`")
+        return False
+    return True
\ No newline at end of file
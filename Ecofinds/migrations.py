@@ -0,0 +1,231 @@
+"""Versioned schema migrations for the MySQL database.
+
+Each migration is (version, name, steps) where a step is either an SQL
+statement or a function taking the cursor. Applied versions are recorded
+in schema_migrations, so migrate() only runs what is new and a normal
+startup executes no DDL at all. Append new migrations to the end of
+MIGRATIONS; never edit one that has shipped.
+
+MySQL commits implicitly around DDL, so a migration that fails part-way
+is not rolled back. Keep every step safe to re-run (IF NOT EXISTS,
+ensure_index, drop_index) so fixing the cause and restarting finishes the job.
+"""
+from mysql.connector import ProgrammingError
+
+def index_exists(cursor, table, name):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    return bool(cursor.fetchall())
+
+def ensure_index(cursor, table, name, columns, kind=""):
+    """Create an index unless it already exists (MySQL has no CREATE INDEX IF NOT EXISTS)
+
+    ``kind`` is an optional index type such as UNIQUE or FULLTEXT.
+    """
+    if not index_exists(cursor, table, name):
+        cursor.execute(f"CREATE {kind} INDEX {name} ON {table} ({columns})")
+
+def drop_index(cursor, table, name):
+    """Drop an index if it exists (MySQL has no DROP INDEX IF EXISTS)"""
+    if index_exists(cursor, table, name):
+        cursor.execute(f"DROP INDEX {name} ON {table}")
+
+def add_feed_indexes(cursor):
+    # Composite indexes backing the keyset-paginated product feed
+    ensure_index(cursor, 'products', 'idx_products_feed', 'created_at, id')
+    ensure_index(cursor, 'products', 'idx_products_category_feed', 'category_id, created_at, id')
+    # Full-text index for relevance-ranked search over titles and descriptions
+    ensure_index(cursor, 'products', 'ft_products_search', 'title, description', kind='FULLTEXT')
+
+def add_image_reference_indexes(cursor):
+    # Reference lookups for content-addressed uploads shared between rows
+    ensure_index(cursor, 'products', 'idx_products_image_path', 'image_path')
+    ensure_index(cursor, 'users', 'idx_users_user_image', 'user_image')
+
+def add_lookup_indexes(cursor):
+    # Fold duplicate cart rows into one before making the pair unique
+    cursor.execute("""
+        UPDATE carts c
+        JOIN (
+            SELECT MIN(id) AS keep_id, SUM(quantity) AS total
+            FROM carts GROUP BY user_id, product_id HAVING COUNT(*) > 1
+        ) dup ON c.id = dup.keep_id
+        SET c.quantity = dup.total
+    """)
+    cursor.execute("""
+        DELETE c FROM carts c
+        JOIN carts keep ON keep.user_id = c.user_id AND keep.product_id = c.product_id AND keep.id < c.id
+    """)
+    ensure_index(cursor, 'carts', 'uk_carts_user_product', 'user_id, product_id', kind='UNIQUE')
+    # Dashboard listings and purchase history, newest first
+    ensure_index(cursor, 'products', 'idx_products_seller', 'seller_id, created_at')
+    ensure_index(cursor, 'purchases', 'idx_purchases_user_date', 'user_id, purchase_date')
+
+# Keep cart_summaries in step with every write to carts and every price change
+CART_SUMMARY_TRIGGERS = [
+    ('carts_summary_insert', """
+        CREATE TRIGGER carts_summary_insert AFTER INSERT ON carts FOR EACH ROW
+        INSERT INTO cart_summaries (user_id, item_count, total)
+        VALUES (NEW.user_id, NEW.quantity, NEW.quantity * (SELECT price FROM products WHERE id = NEW.product_id))
+        ON DUPLICATE KEY UPDATE item_count = item_count + VALUES(item_count), total = total + VALUES(total)
+    """),
+    ('carts_summary_update', """
+        CREATE TRIGGER carts_summary_update AFTER UPDATE ON carts FOR EACH ROW
+        UPDATE cart_summaries
+        SET item_count = item_count + NEW.quantity - OLD.quantity,
+            total = total + (NEW.quantity - OLD.quantity) * (SELECT price FROM products WHERE id = NEW.product_id)
+        WHERE user_id = NEW.user_id
+    """),
+    ('carts_summary_delete', """
+        CREATE TRIGGER carts_summary_delete AFTER DELETE ON carts FOR EACH ROW
+        UPDATE cart_summaries
+        SET item_count = item_count - OLD.quantity,
+            total = total - OLD.quantity * (SELECT price FROM products WHERE id = OLD.product_id)
+        WHERE user_id = OLD.user_id
+    """),
+    ('products_cart_reprice', """
+        CREATE TRIGGER products_cart_reprice AFTER UPDATE ON products FOR EACH ROW
+        UPDATE cart_summaries s JOIN carts c ON c.user_id = s.user_id
+        SET s.total = s.total + c.quantity * (NEW.price - OLD.price)
+        WHERE c.product_id = NEW.id AND NEW.price <> OLD.price
+    """),
+]
+
+def add_cart_summaries(cursor):
+    # Per-user item count and total, so the cart badge and total never read the whole cart
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cart_summaries (
+            user_id INT PRIMARY KEY,
+            item_count INT NOT NULL DEFAULT 0,
+            total DECIMAL(12, 2) NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+    for name, sql in CART_SUMMARY_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(sql)
+    # Backfill after the triggers exist so no concurrent cart write is missed
+    cursor.execute("""
+        REPLACE INTO cart_summaries (user_id, item_count, total)
+        SELECT c.user_id, SUM(c.quantity), SUM(c.quantity * p.price)
+        FROM carts c JOIN products p ON p.id = c.product_id
+        WHERE c.user_id IS NOT NULL
+        GROUP BY c.user_id
+    """)
+
+def add_purchase_history_index(cursor):
+    # Covers the paginated history and its monthly totals without touching the rows
+    ensure_index(cursor, 'purchases', 'idx_purchases_history', 'user_id, purchase_date, id, quantity, total_price')
+
+def drop_purchase_date_index(cursor):
+    # idx_purchases_history starts with the same (user_id, purchase_date) and also backs the user_id foreign key
+    drop_index(cursor, 'purchases', 'idx_purchases_user_date')
+
+MIGRATIONS = [
+    (1, 'create tables', [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            user_image VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(50) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            description TEXT,
+            price DECIMAL(10, 2) NOT NULL,
+            category_id INT,
+            seller_id INT,
+            image_path VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories(id),
+            FOREIGN KEY (seller_id) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS carts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            product_id INT,
+            quantity INT DEFAULT 1,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS purchases (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            product_id INT,
+            purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            quantity INT DEFAULT 1,
+            total_price DECIMAL(10, 2),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+        """,
+    ]),
+    (2, 'feed and search indexes', [add_feed_indexes]),
+    (3, 'index uploaded image references', [add_image_reference_indexes]),
+    (4, 'index foreign keys and filters', [add_lookup_indexes]),
+    (5, 'cart summaries', [add_cart_summaries]),
+    (6, 'purchase history index', [add_purchase_history_index]),
+    (7, 'drop redundant purchase date index', [drop_purchase_date_index]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(cursor):
+    """Applied version without creating anything; 0 if migrations have never run"""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_migrations")
+    except ProgrammingError:  # no schema_migrations table yet
+        return 0
+    return cursor.fetchone()[0] or 0
+
+def current_version(cursor):
+    """Highest applied migration version, or 0 for a fresh database"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+def migrate(connection):
+    """Apply pending migrations in order; returns how many ran"""
+    cursor = connection.cursor()
+    applied = current_version(cursor)
+    count = 0
+    for version, name, steps in MIGRATIONS:
+        if version <= applied:
+            continue
+        for step in steps:
+            if callable(step):
+                step(cursor)
+            else:
+                cursor.execute(step)
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        connection.commit()
+        print(f"Applied migration {version}: {name}")
+        count += 1
+    cursor.close()
+    return count
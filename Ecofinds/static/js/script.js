@@ -74,4 +74,100 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     });
+});
+
+// Fill the nav cart badge from the cheap summary endpoint
+document.addEventListener('DOMContentLoaded', function() {
+    const badge = document.querySelector('[data-cart-summary]');
+    if (!badge) return;
+    
+    fetch(badge.dataset.cartSummary, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(summary => {
+            if (summary.count) badge.textContent = summary.count;
+        });
+});
+
+// Add to cart through the JSON API and update the badge without leaving the page
+document.addEventListener('DOMContentLoaded', function() {
+    const badge = document.querySelector('[data-cart-api]');
+    if (!badge) return;
+    
+    document.addEventListener('click', function(e) {
+        const link = e.target.closest('[data-add-to-cart]');
+        if (!link) return;
+        e.preventDefault();
+        
+        fetch(badge.dataset.cartApi, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ product_id: Number(link.dataset.addToCart), quantity: 1 })
+        })
+            .then(response => {
+                if (!response.ok) throw new Error(response.status);
+                return response.json();
+            })
+            .then(summary => {
+                badge.textContent = summary.count || '';
+                link.textContent = 'Added to Cart';
+            })
+            // Fall back to the plain link, which redirects with a flash message
+            .catch(() => { window.location = link.href; });
+    });
+});
+
+// Run searches through the JSON API and redraw only the results
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.querySelector('form[data-api-search]');
+    if (!form) return;
+    const results = document.querySelector(form.dataset.results);
+    
+    // The session-dependent part of a card, matching index.html
+    function cartAction(product) {
+        const userId = results.dataset.userId;
+        if (!userId) {
+            return `<p class="text-muted mt-2"><a href="${results.dataset.loginUrl}">Login</a> to add this item to your cart.</p>`;
+        }
+        if (String(product.seller_id) === userId) {
+            return '<p class="text-muted mt-2">You cannot add your own product to cart.</p>';
+        }
+        const href = results.dataset.addUrl.replace(/0$/, product.id);
+        return `<a href="${href}" class="btn btn-success mt-2" data-add-to-cart="${product.id}">Add to Cart</a>`;
+    }
+    
+    form.addEventListener('submit', function(e) {
+        if (e.defaultPrevented) return;  // failed validation
+        e.preventDefault();
+        const params = new URLSearchParams(new FormData(form));
+        params.set('fields', 'id,seller_id,html');
+        
+        fetch(`${form.dataset.apiSearch}?${params}`, { credentials: 'same-origin' })
+            .then(response => {
+                if (!response.ok) throw new Error(response.status);
+                return response.json();
+            })
+            .then(page => {
+                params.delete('fields');
+                history.pushState(null, '', `${form.action}?${params}`);
+                if (!page.products.length) {
+                    results.innerHTML = '<p class="text-center">No products found.</p>';
+                    return;
+                }
+                const cards = page.products.map(product => `
+                    <div class="col-md-4 mb-3">
+                        <div class="card shadow">
+                            ${product.html}
+                            <div class="card-body text-center pt-0">${cartAction(product)}</div>
+                        </div>
+                    </div>`).join('');
+                let pager = '';
+                if (page.next) {
+                    params.set('after', page.next);
+                    pager = `<div class="d-flex justify-content-center gap-2 mb-4"><a href="${form.action}?${params}" class="btn btn-outline-secondary">Older &raquo;</a></div>`;
+                }
+                results.innerHTML = `<div class="row justify-content-center">${cards}</div>${pager}`;
+            })
+            .catch(() => form.submit());
+    });
 });
\ No newline at end of file
@@ -1,70 +1,243 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file
+from flask import (Flask, Response, render_template, request, redirect, url_for, session, flash, send_file, jsonify,
+                   g, stream_with_context)
+from flask.cli import AppGroup
+import hashlib
+import json
 import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
 import os
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import io
+import sys
 import random
+import re
+import threading
+import time
 from datetime import datetime
+from PIL import Image
+from bills import Bill, BillItem, BillStore
+from connections import ConnectionManager
+from migrations import LATEST_VERSION, migrate, schema_version
+
+# Modules shared with Ecofinds live in common/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import api, assets, auth, bulk, images, responses, sessions, storage
+from common.cache import Cache
+from common.fragments import FragmentCache, conditional_page
+from common.metrics import Instrumentation, stats_collector
 
 app = Flask(__name__)
+app.request_class = storage.UploadRequest
 app.secret_key = 'supersecretkey'  # Change in production
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024  # 1MB for routes that take no files
+# Per-endpoint body limits, enforced while the upload is being read
+app.config['UPLOAD_LIMITS'] = {
+    'add_product': 8 * 1024 * 1024,
+    'edit_product': 8 * 1024 * 1024,
+    'import_products': 32 * 1024 * 1024,  # CSV/NDJSON body, read row by row
+}
+app.config['BEST_PICKS_COUNT'] = 8
+app.config['BEST_PICKS_REFRESH'] = 300  # seconds between reloads of the candidate id pool
+app.config['PURCHASES_PER_PAGE'] = 20
+app.config['API_PAGE_SIZE'] = 24  # default ?limit for API listings
+app.config['BILL_FOLDER'] = 'bills'
+app.config['BILL_WORKERS'] = 2
+app.config['DB_BUSY_TIMEOUT'] = 5  # seconds a writer waits for the lock before "database is locked"
+app.config['DB_CACHE_SIZE_KB'] = 16 * 1024  # SQLite page cache per connection
+app.config['DB_MMAP_SIZE'] = 128 * 1024 * 1024  # bytes of the database file read through mmap
+# memory:// keeps entries per process; redis://host:port/db shares them between workers
+app.config['CACHE_URL'] = os.environ.get('CACHE_URL', 'memory://?max_entries=4096')
+app.config['FRAGMENT_CACHE_TTL'] = 60  # seconds, backstop for writes made outside the app
+app.config['LISTING_CACHE_TTL'] = 30  # seconds a search or category listing is served from the cache
+app.config['SLOW_QUERY_MS'] = 100  # statements slower than this are logged with their query plan
+app.config['QUERY_REPEAT_THRESHOLD'] = 10  # one statement this many times in a request is logged as N+1
+# werkzeug method and cost for new hashes; older hashes are upgraded at the next login
+app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:600000'
+app.config['PASSWORD_HASH_WORKERS'] = 2  # hashing processes per app process; 0 hashes on the request thread
+# Where session data lives; the cookie only carries the session id
+app.config['SESSION_URL'] = os.environ.get('SESSION_URL', 'sqlite:///sessions.db')
+app.config['COMPRESS_MIN_SIZE'] = 1024  # bytes; smaller responses are sent as they are
+app.config['COMPRESS_LEVEL'] = 6  # gzip level
+app.config['COMPRESS_BROTLI_QUALITY'] = 4  # brotli quality, when the brotli package is installed
 
 DB_NAME = 'ecofinds.db'
+MAX_CART_QUANTITY = 1000  # per cart line, however it is added or updated
+
+# Text responses are gzip/brotli compressed for clients that accept it; see common/responses.py
+compression = responses.Compression(
+    app,
+    min_size=app.config['COMPRESS_MIN_SIZE'],
+    level=app.config['COMPRESS_LEVEL'],
+    brotli_quality=app.config['COMPRESS_BROTLI_QUALITY']
+)
+
+# Sessions are kept server-side; see common/sessions.py
+app.session_interface = sessions.ServerSideSessionInterface(
+    sessions.store_from_url(app.config['SESSION_URL'], prefix='hackathon:')
+)
+
+# Route timings, query counts and the slow-query log, served at /metrics
+instrumentation = Instrumentation(
+    slow_query_ms=app.config['SLOW_QUERY_MS'],
+    repeat_threshold=app.config['QUERY_REPEAT_THRESHOLD']
+)
+instrumentation.init_app(app)
+
+db = ConnectionManager(
+    DB_NAME,
+    busy_timeout=app.config['DB_BUSY_TIMEOUT'],
+    cache_size_kb=app.config['DB_CACHE_SIZE_KB'],
+    mmap_size=app.config['DB_MMAP_SIZE'],
+    query_hook=instrumentation.record_query
+)
+instrumentation.explain = db.explain
+
+# PBKDF2 runs in worker processes so a burst of logins doesn't stall other requests
+password_hasher = auth.PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS']
+)
+
+# Single source for every category picker and filter
+CATEGORIES = ('Electronics', 'Clothing', 'Furniture', 'Books', 'Other')
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-# Initialize DB
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        username TEXT NOT NULL
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS products (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        title TEXT NOT NULL,
-        description TEXT NOT NULL,
-        category TEXT NOT NULL,
-        price REAL NOT NULL,
-        discount REAL DEFAULT 0.0,
-        image_url TEXT DEFAULT 'placeholder.jpg'
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS carts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        product_id INTEGER NOT NULL,
-        quantity INTEGER DEFAULT 1
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS purchases (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        product_id INTEGER NOT NULL,
-        purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-    conn.commit()
+def save_upload(file):
+    # Store the image under its content hash with resized derivatives; returns its image_url or None
+    try:
+        stored = storage.store_image(file.stream, app.config['UPLOAD_FOLDER'])
+    except (OSError, Image.DecompressionBombError) as e:
+        print(f"Error processing upload {secure_filename(file.filename)}: {e}")
+        flash('Could not read the uploaded image.')
+        return None
+    return f'uploads/{stored}'
 
-    # Add discount if not exists
-    c.execute("PRAGMA table_info(products)")
-    columns = [col['name'] for col in c.fetchall()]
-    if 'discount' not in columns:
-        c.execute("ALTER TABLE products ADD COLUMN discount REAL DEFAULT 0.0")
-        conn.commit()
+def release_upload(conn, image_url):
+    # Identical uploads share one file, so only unlink it once no listing references it.
+    # The lock keeps a concurrent upload of the same file from being referenced in between.
+    if not image_url.startswith('uploads/'):
+        return
+    name = image_url[len('uploads/'):]
+    with storage.release_lock(app.config['UPLOAD_FOLDER'], name) as locked:
+        if not locked:
+            return  # being stored again right now
+        c = conn.cursor()
+        c.execute('SELECT 1 FROM products WHERE image_url = ? LIMIT 1', (image_url,))
+        if not c.fetchone():
+            images.remove_image(app.config['UPLOAD_FOLDER'], name)
+
+@app.errorhandler(auth.HasherBusy)
+def hasher_busy(e):
+    print(f"Login refused: {e}")
+    flash('We are very busy right now. Please try again in a moment.')
+    return redirect(request.url)
+
+@app.errorhandler(api.ApiError)
+def api_error(e):
+    return jsonify(error=e.message), e.status
+
+@app.errorhandler(RequestEntityTooLarge)
+@app.errorhandler(UnsupportedMediaType)
+def upload_rejected(e):
+    # Raised while the body is still streaming in, before or while the view reads it
+    if api.wants_json(request):
+        # A bulk import keeps the rows it read before the limit; its summary says how many
+        message = 'The request body is too large.' if isinstance(e, RequestEntityTooLarge) else e.description
+        return jsonify(error=message, **getattr(e, 'import_summary', {})), e.code
+    if isinstance(e, RequestEntityTooLarge):
+        flash('That file is too large to upload.')
+    else:
+        flash(e.description)
+    return redirect(request.url)
+
+@app.after_request
+def cache_uploads(response):
+    # A content-addressed upload never changes under its name, so let browsers keep it
+    if request.endpoint == 'static' and storage.is_content_addressed(request.view_args.get('filename', '')):
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    return response
+
+# CSS, JS and images are served from fingerprinted, precompressed copies once `flask build-assets` has run
+static_assets = assets.Assets(app)
+
+@app.template_global()
+def image_src(image_url):
+    # Seeded products point at external URLs; uploads live under static/
+    if image_url.startswith(('http://', 'https://')):
+        return image_url
+    return url_for('static', filename=image_url)
+
+def _derivatives(image_url):
+    if not image_url.startswith('uploads/'):
+        return ()
+    return images.available_derivatives(app.config['UPLOAD_FOLDER'], image_url[len('uploads/'):])
+
+@app.template_global()
+def image_srcset(image_url):
+    # srcset of the WebP derivatives; empty for external and legacy images
+    return ', '.join(f"{url_for('static', filename='uploads/' + f)} {size}w" for size, f in _derivatives(image_url) if size != 'thumb')
+
+@app.template_global()
+def image_thumb(image_url):
+    # Square thumbnail, falling back to the full image
+    for size, f in _derivatives(image_url):
+        if size == 'thumb':
+            return url_for('static', filename='uploads/' + f)
+    return image_src(image_url)
+
+# Listings and rendered fragments, invalidated by tag from the product write paths
+shared_cache = Cache.from_url(app.config['CACHE_URL'], prefix='hackathon:')
+fragment_cache = FragmentCache(shared_cache, ttl=app.config['FRAGMENT_CACHE_TTL'])
+instrumentation.add_collector(
+    stats_collector('cache_events_total', 'Shared cache lookups by outcome', 'event', shared_cache.stats)
+)
+
+@app.template_global()
+def product_card(product):
+    # A listing card only changes when its product does, so render each one once
+    fragment = fragment_cache.get(
+        'card', product['id'], lambda: (render_template('_product_card.html', product=product), None)
+    )
+    return fragment.html
+
+@app.cli.command('backfill-images')
+def backfill_images():
+    """Generate derivatives for uploads stored before the image pipeline existed."""
+    count = images.backfill(app.config['UPLOAD_FOLDER'])
+    print(f"Generated derivatives for {count} images")
+
+@app.cli.command('build-assets')
+def build_assets():
+    """Minify, fingerprint and precompress static assets into static/dist."""
+    manifest = assets.build(app.static_folder)
+    print(f"Built {len(manifest)} assets")
+
+def fts_query(text):
+    # Quote each word as an FTS5 prefix term so user input can't break MATCH syntax
+    words = re.findall(r'\w+', text)
+    return ' '.join('"{}"*'.format(word) for word in words) or None
+
+# Create or upgrade the schema; a no-op once every migration is recorded
+def upgrade_db():
+    conn = db.connect()
+    migrate(conn)
+    conn.close()
+
+# Seed the admin user and sample listings into an empty database
+def seed_db():
+    conn = db.connect()
+    c = conn.cursor()
 
     # Seed dummy admin user if not exists
     c.execute('SELECT * FROM users WHERE email = "admin@ecofinds.com"')
     if not c.fetchone():
-        admin_password = generate_password_hash('adminpass')
+        admin_password = generate_password_hash('adminpass', app.config['PASSWORD_HASH_METHOD'])
         c.execute('INSERT INTO users (email, password, username) VALUES (?, ?, ?)', 
                   ('admin@ecofinds.com', admin_password, 'Admin'))
         conn.commit()
@@ -94,43 +267,237 @@ def init_db():
         conn.commit()
     conn.close()
 
-init_db()
+def init_db():
+    upgrade_db()
+    seed_db()
+
+# Schema changes run from `flask db upgrade`; workers only check the version
+def check_schema():
+    conn = db.connect()
+    version = schema_version(conn)
+    conn.close()
+    if version < LATEST_VERSION:
+        print(f"Database schema is at version {version} but the code expects {LATEST_VERSION}; run `flask db upgrade`")
+        return False
+    return True
+
+check_schema()
+
+db_cli = AppGroup('db', help='Create, migrate and seed the database.')
+
+@db_cli.command('upgrade')
+def db_upgrade():
+    """Create the database if needed and apply pending migrations."""
+    upgrade_db()
 
-# Helper: Get DB connection
+@db_cli.command('seed')
+def db_seed():
+    """Add the admin user and sample listings to an empty database."""
+    seed_db()
+
+app.cli.add_command(db_cli)
+
+# Helper: Get DB connection (this thread's, reused across requests; don't close it)
 def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db.get()
+
+@app.teardown_appcontext
+def release_db(exc):
+    db.release()
+
+def cart_summary(conn, user_id):
+    # (item count, total) kept current by the cart_summaries triggers
+    c = conn.cursor()
+    c.execute('SELECT item_count, total FROM cart_summaries WHERE user_id = ?', (user_id,))
+    row = c.fetchone()
+    return (row['item_count'], row['total']) if row else (0, 0.0)
+
+class BestPicks:
+    """Random "best picks" without ORDER BY RANDOM().
+
+    Keeps the product ids in memory and draws k of them per request, so
+    a homepage hit fetches k rows by primary key instead of sorting the whole
+    table. The id pool is reloaded once it is older than refresh_after
+    seconds, or on the next draw after invalidate().
+    """
+    def __init__(self, refresh_after=300):
+        self.refresh_after = refresh_after
+        self._ids = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def sample(self, conn, k):
+        ids = self._candidates(conn)
+        picked = random.sample(ids, min(k, len(ids)))
+        if not picked:
+            return []
+        c = conn.cursor()
+        c.execute('SELECT * FROM products WHERE id IN ({})'.format(','.join('?' * len(picked))), picked)
+        rows = {row['id']: row for row in c.fetchall()}
+        # Rows come back in id order; keep the random draw order
+        return [rows[i] for i in picked if i in rows]
+
+    def _candidates(self, conn):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_after:
+                self._ids = [row[0] for row in conn.execute('SELECT id FROM products')]
+                self._loaded_at = time.monotonic()
+            return self._ids
+
+best_picks = BestPicks(refresh_after=app.config['BEST_PICKS_REFRESH'])
+
+def place_order(conn, user_id):
+    """Move a user's cart into purchases as one set-based transaction.
+
+    Prices the whole cart with a single join, copies it into purchases with
+    INSERT ... SELECT and clears it, all under BEGIN IMMEDIATE so a concurrent
+    checkout of the same cart waits for the write lock instead of
+    double-buying. The bill's contents are saved in the same transaction
+    under the first purchase id. Returns (items, total, first_purchase_id);
+    items is empty when the cart was.
+    """
+    c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        c.execute('''SELECT p.title, c.quantity, (p.price - IFNULL(p.discount, 0.0)) * c.quantity AS subtotal
+                     FROM carts c JOIN products p ON p.id = c.product_id
+                     WHERE c.user_id = ? ORDER BY c.id''', (user_id,))
+        items = tuple(BillItem(*row) for row in c.fetchall())
+        if not items:
+            conn.rollback()
+            return items, 0, None
+        c.execute('''INSERT INTO purchases (user_id, product_id, quantity, total_price)
+                     SELECT c.user_id, c.product_id, c.quantity,
+                            ROUND((p.price - IFNULL(p.discount, 0.0)) * c.quantity, 2)
+                     FROM carts c JOIN products p ON p.id = c.product_id
+                     WHERE c.user_id = ? ORDER BY c.id''', (user_id,))
+        # Rows inserted by one statement under the write lock get consecutive ids
+        first_purchase_id = c.lastrowid - c.rowcount + 1
+        total = sum(item.subtotal for item in items)
+        c.execute('''INSERT INTO bills (id, user_id, username, created_at, items, total)
+                     SELECT ?, id, username, ?, ?, ? FROM users WHERE id = ?''',
+                  (first_purchase_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), json.dumps(items),
+                   round(total, 2), user_id))
+        c.execute('DELETE FROM carts WHERE user_id = ?', (user_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return items, total, first_purchase_id
+
+def load_bill(conn, bill_id, user_id):
+    # The saved snapshot of one of the user's orders, or None
+    row = conn.execute('SELECT username, created_at, items, total FROM bills WHERE id = ? AND user_id = ?',
+                       (bill_id, user_id)).fetchone()
+    if not row:
+        return None
+    items = tuple(BillItem(*item) for item in json.loads(row['items']))
+    return Bill(row['username'], row['created_at'], items, row['total'])
+
+# Purchase history: only the columns the page shows, newest first on (purchase_date, id)
+PURCHASE_HISTORY = '''SELECT pu.id, pu.purchase_date, pu.quantity, pu.total_price, p.title
+                      FROM purchases pu JOIN products p ON p.id = pu.product_id
+                      WHERE pu.user_id = ? {filters}
+                      ORDER BY pu.purchase_date DESC, pu.id DESC'''
+
+def purchase_page(conn, user_id, after=None, per_page=20):
+    """One page of a user's purchases and the cursor for the next, keyset-paginated.
+
+    ``after`` is the ``<purchase_date>_<id>`` token of the last row already
+    shown, so every page is one range scan of idx_purchases_history however
+    far back the reader goes. The cursor is None on the last page.
+    """
+    filters, params = '', [user_id]
+    if after:
+        try:
+            date, purchase_id = after.rsplit('_', 1)
+            params += [date, date, int(purchase_id)]
+            filters = 'AND (pu.purchase_date < ? OR (pu.purchase_date = ? AND pu.id < ?))'
+        except ValueError:
+            pass  # a mangled cursor starts from the newest purchase
+    rows = conn.execute(PURCHASE_HISTORY.format(filters=filters) + ' LIMIT ?', params + [per_page + 1]).fetchall()
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, f"{rows[-1]['purchase_date']}_{rows[-1]['id']}"
+
+def monthly_spend(conn, user_id):
+    # Count, items and spend per month, aggregated by SQLite straight from the covering index
+    return conn.execute('''SELECT strftime('%Y-%m', purchase_date) AS month, COUNT(*) AS purchases,
+                                   SUM(quantity) AS item_count, ROUND(SUM(total_price), 2) AS spend
+                            FROM purchases WHERE user_id = ?
+                            GROUP BY month ORDER BY month DESC''', (user_id,)).fetchall()
+# What a listing card shows; descriptions stay out of cached listings
+LISTING_COLUMNS = 'p.id, p.user_id, p.title, p.category, p.price, p.discount, p.image_url'
+
+def cached_listing(category, query, params):
+    # Search and category results shared between workers. Each carries one tag, its
+    # category (or category:all), which every product write path invalidates, so a
+    # hit checks a single tag version however many rows the listing holds
+    key = 'listing:' + hashlib.sha1(repr((query, params)).encode()).hexdigest()
+
+    def load():
+        return [dict(row) for row in get_db().execute(query, params)]
+
+    return shared_cache.get_or_set(
+        key, load, ttl=app.config['LISTING_CACHE_TTL'], tags=[f"category:{category or 'all'}"]
+    )
+
+@app.template_global()
+def current_user():
+    # The logged-in user's profile, read once per request and cached until the profile changes
+    if 'user_id' not in session:
+        return None
+    if 'current_user' not in g:
+        user_id = session['user_id']
+
+        def load():
+            row = get_db().execute('SELECT id, email, username FROM users WHERE id = ?', (user_id,)).fetchone()
+            return dict(row) if row else None
+
+        g.current_user = shared_cache.get_or_set(f'current_user:{user_id}', load, tags=[f'user:{user_id}'])
+    return g.current_user
+
+bill_store = BillStore(app.config['BILL_FOLDER'], workers=app.config['BILL_WORKERS'])
 
 # Landing
 @app.route('/')
 def landing():
-    conn = get_db()
-    c = conn.cursor()
     category = request.args.get('category')
     search = request.args.get('search')
-    query = 'SELECT * FROM products'
-    params = []
-    if category:
-        query += ' WHERE category = ?'
-        params.append(category)
-    elif search:
-        query += ' WHERE title LIKE ?'
-        params.append(f'%{search}%')
-    else:
-        query += ' ORDER BY RANDOM() LIMIT 8'  # Random best picks
-    c.execute(query, params)
-    products = c.fetchall()
-    conn.close()
-    categories = ['Electronics', 'Clothing', 'Furniture', 'Books', 'Other']
-    return render_template('landing.html', products=products, categories=categories)
+    match = fts_query(search) if search else None
+
+    # Runs once the page head has been sent
+    def load_products():
+        if search and not match:
+            return []  # Nothing searchable left, e.g. only punctuation
+        if match:
+            # Relevance-ranked full-text search over title and description
+            query = f'''SELECT {LISTING_COLUMNS} FROM products_fts
+                       JOIN products p ON p.id = products_fts.rowid
+                       WHERE products_fts MATCH ?'''
+            params = [match]
+            if category:
+                query += ' AND p.category = ?'
+                params.append(category)
+            query += ' ORDER BY products_fts.rank'
+            return cached_listing(category, query, params)
+        if category:
+            return cached_listing(category, f'SELECT {LISTING_COLUMNS} FROM products p WHERE p.category = ?', [category])
+        return best_picks.sample(get_db(), app.config['BEST_PICKS_COUNT'])  # Random best picks
+
+    return responses.stream_page('landing.html', load_products=load_products, categories=CATEGORIES,
+                                 selected_category=category, search_query=search)
 
 # Sign Up
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
         email = request.form['email']
-        password = generate_password_hash(request.form['password'])
+        password = password_hasher.hash(request.form['password'])
         username = request.form['username']
         conn = get_db()
         c = conn.cursor()
@@ -141,23 +508,30 @@ def signup():
             return redirect(url_for('login'))
         except sqlite3.IntegrityError:
             flash('Email already exists.')
-        conn.close()
     return render_template('signup.html')
 
+def authenticate(email, password):
+    # One lookup; the hash is checked in the hasher pool and upgraded if its parameters are outdated
+    conn = get_db()
+    user = conn.execute('SELECT id, username, password FROM users WHERE email = ?', (email,)).fetchone()
+    if not user:
+        return None
+    valid, new_hash = password_hasher.verify(user['password'], password)
+    if not valid:
+        return None
+    if new_hash:
+        conn.execute('UPDATE users SET password = ? WHERE id = ?', (new_hash, user['id']))
+        conn.commit()
+    return user
+
 # Login
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        email = request.form['email']
-        password = request.form['password']
-        conn = get_db()
-        c = conn.cursor()
-        c.execute('SELECT * FROM users WHERE email = ?', (email,))
-        user = c.fetchone()
-        conn.close()
-        if user and check_password_hash(user['password'], password):
+        user = authenticate(request.form['email'], request.form['password'])
+        if user:
+            session.regenerate()
             session['user_id'] = user['id']
-            session['username'] = user['username']
             return redirect(url_for('landing'))
         flash('Invalid credentials.')
     return render_template('login.html')
@@ -175,18 +549,17 @@ def dashboard():
         return redirect(url_for('login'))
     conn = get_db()
     c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],))
-    user = c.fetchone()
     if request.method == 'POST':
         username = request.form['username']
         c.execute('UPDATE users SET username = ? WHERE id = ?', (username, session['user_id']))
         conn.commit()
-        session['username'] = username
+        # Drop the cached profile so current_user() reads the new name
+        shared_cache.invalidate_tag(f"user:{session['user_id']}")
+        g.pop('current_user', None)
         flash('Profile updated.')
     c.execute('SELECT * FROM products WHERE user_id = ?', (session['user_id'],))
     listings = c.fetchall()
-    conn.close()
-    return render_template('dashboard.html', user=user, listings=listings)
+    return render_template('dashboard.html', user=current_user(), listings=listings)
 
 # Add Product
 @app.route('/add_product', methods=['GET', 'POST'])
@@ -204,19 +577,17 @@ def add_product():
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image_url = f'uploads/{filename}'
+                image_url = save_upload(file) or image_url
         conn = get_db()
         c = conn.cursor()
         c.execute('INSERT INTO products (user_id, title, description, category, price, discount, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)',
                   (session['user_id'], title, description, category, price, discount, image_url))
         conn.commit()
-        conn.close()
+        best_picks.invalidate()
+        shared_cache.invalidate_tag(f'category:{category}', 'category:all')
         flash('Product added successfully!')
         return redirect(url_for('dashboard'))
-    categories = ['Electronics', 'Clothing', 'Furniture', 'Books', 'Other']
-    return render_template('add_product.html', categories=categories)
+    return render_template('add_product.html', categories=CATEGORIES)
 
 # Edit Product
 @app.route('/edit_product/<int:product_id>', methods=['GET', 'POST'])
@@ -241,17 +612,19 @@ def edit_product(product_id):
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image_url = f'uploads/{filename}'
+                image_url = save_upload(file) or image_url
         c.execute('UPDATE products SET title = ?, description = ?, category = ?, price = ?, discount = ?, image_url = ? WHERE id = ?',
                   (title, description, category, price, discount, image_url, product_id))
         conn.commit()
+        # Title or category changes can move it between search and category listings
+        shared_cache.invalidate_tag(
+            f'product:{product_id}', f"category:{product['category']}", f'category:{category}', 'category:all'
+        )
+        if image_url != product['image_url']:
+            release_upload(conn, product['image_url'])
         flash('Product updated successfully!')
         return redirect(url_for('dashboard'))
-    categories = ['Electronics', 'Clothing', 'Furniture', 'Books', 'Other']
-    conn.close()
-    return render_template('edit_product.html', product=product, categories=categories)
+    return render_template('edit_product.html', product=product, categories=CATEGORIES)
 
 # Delete Product
 @app.route('/delete_product/<int:product_id>')
@@ -260,25 +633,105 @@ def delete_product(product_id):
         return redirect(url_for('login'))
     conn = get_db()
     c = conn.cursor()
+    c.execute('SELECT category, image_url FROM products WHERE id = ? AND user_id = ?', (product_id, session['user_id']))
+    product = c.fetchone()
     c.execute('DELETE FROM products WHERE id = ? AND user_id = ?', (product_id, session['user_id']))
     conn.commit()
-    conn.close()
+    fragment_cache.invalidate(product_id)
+    if product:
+        shared_cache.invalidate_tag(f"category:{product['category']}", 'category:all')
+        release_upload(conn, product['image_url'])
+    best_picks.invalidate()
     flash('Product deleted successfully!')
     return redirect(url_for('dashboard'))
 
+# Bulk Import: raw text/csv or application/x-ndjson body, one product per row
+@app.route('/products/import', methods=['POST'])
+def import_products():
+    if 'user_id' not in session:
+        return jsonify(error='Log in to import products.'), 401
+    fmt = bulk.FORMATS.get(request.mimetype) or request.args.get('format')
+    if fmt not in bulk.MIMETYPES:
+        return jsonify(error='Send the rows as text/csv or application/x-ndjson.'), 415
+    user_id = session['user_id']
+    categories = {category.lower(): category for category in CATEGORIES}
+    touched = set()
+
+    def validate(row):
+        title = bulk.text_field(row, 'title', 255)
+        description = bulk.text_field(row, 'description', 5000)
+        category = categories.get(str(row.get('category') or '').strip().lower())
+        if category is None:
+            raise bulk.RowError(f"category must be one of {', '.join(CATEGORIES)}")
+        price = bulk.number_field(row, 'price', maximum=10_000_000)
+        discount = bulk.number_field(row, 'discount', maximum=price, default=0.0)
+        image_url = bulk.text_field(row, 'image_url', 1000, required=False) or 'placeholder.jpg'
+        if not (image_url == 'placeholder.jpg' or image_url.startswith(('http://', 'https://'))
+                or (storage.is_content_addressed(image_url.removeprefix('uploads/'))
+                    and os.path.exists(os.path.join('static', image_url)))):
+            raise bulk.RowError('image_url must be an http(s) URL or an image already uploaded here')
+        touched.add(category)
+        return user_id, title, description, category, price, discount, image_url
+
+    conn = get_db()
+
+    def insert_batch(values):
+        # One transaction per batch
+        try:
+            conn.executemany('INSERT INTO products (user_id, title, description, category, price, discount, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             values)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+    try:
+        summary = bulk.import_rows(bulk.read_rows(request.stream, fmt), validate, insert_batch, sqlite3.Error)
+    finally:
+        # Also runs when the body goes over the size limit part way; the rows before it stay imported
+        if touched:
+            best_picks.invalidate()
+            shared_cache.invalidate_tag('category:all', *(f'category:{category}' for category in touched))
+    return jsonify(summary)
+
+# Bulk Export of the user's listings as CSV or NDJSON
+@app.route('/products/export')
+def export_products():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    fmt = request.args.get('format', 'csv')
+    if fmt not in bulk.MIMETYPES:
+        return jsonify(error='format must be csv or ndjson.'), 400
+    fields = ('id', 'title', 'description', 'category', 'price', 'discount', 'image_url')
+    # SQLite steps the cursor as the response is written, so rows are never all in memory
+    rows = get_db().execute(f"SELECT {', '.join(fields)} FROM products WHERE user_id = ? ORDER BY id",
+                            (session['user_id'],))
+    response = Response(stream_with_context(bulk.export_rows(rows, fields, fmt)), mimetype=bulk.MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=products.{fmt}'
+    return response
+
 # Product Detail
 @app.route('/product/<int:product_id>')
 def product_detail(product_id):
+    # Hot listings come straight from the fragment cache, or as a 304
+    fragment = fragment_cache.get('detail', product_id, lambda: render_product_detail(product_id))
+    if fragment is None:
+        flash('Product not found.')
+        return redirect(url_for('landing'))
+    return conditional_page(
+        fragment, lambda: render_template('product_detail.html', fragment=fragment, product_id=product_id)
+    )
+
+def render_product_detail(product_id):
+    # The session-independent body of the product page; None if there is no such product
     conn = get_db()
     c = conn.cursor()
     c.execute('SELECT * FROM products WHERE id = ?', (product_id,))
     product = c.fetchone()
-    conn.close()
     if not product:
-        flash('Product not found.')
-        return redirect(url_for('landing'))
+        return None
     score = min(len(product['description']) // 10 + {'Electronics': 5, 'Clothing': 10}.get(product['category'], 0), 100)
-    return render_template('product_detail.html', product=product, score=score)
+    return render_template('_product_detail.html', product=product, score=score), {'title': product['title']}
 
 # Add to Cart
 @app.route('/add_to_cart/<int:product_id>')
@@ -287,14 +740,14 @@ def add_to_cart(product_id):
         return redirect(url_for('login'))
     conn = get_db()
     c = conn.cursor()
-    c.execute('SELECT * FROM carts WHERE user_id = ? AND product_id = ?', (session['user_id'], product_id))
-    existing = c.fetchone()
-    if existing:
-        c.execute('UPDATE carts SET quantity = quantity + 1 WHERE id = ?', (existing['id'],))
-    else:
-        c.execute('INSERT INTO carts (user_id, product_id) VALUES (?, ?)', (session['user_id'], product_id))
+    # Selecting from products keeps rows for missing listings out of carts (no FKs here)
+    c.execute('''INSERT INTO carts (user_id, product_id) SELECT ?, id FROM products WHERE id = ?
+                 ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = MIN(quantity + 1, ?)''',
+              (session['user_id'], product_id, MAX_CART_QUANTITY))
     conn.commit()
-    conn.close()
+    if not c.rowcount:
+        flash('Product not found!')
+        return redirect(url_for('landing'))
     flash('Added to cart!')
     return redirect(url_for('product_detail', product_id=product_id))
 
@@ -308,10 +761,150 @@ def cart():
     c.execute('''SELECT p.*, c.quantity FROM products p 
                  JOIN carts c ON p.id = c.product_id WHERE c.user_id = ?''', (session['user_id'],))
     items = c.fetchall()
-    total = sum((item['price'] - (item['discount'] or 0.0)) * item['quantity'] for item in items)
-    conn.close()
+    _, total = cart_summary(conn, session['user_id'])
     return render_template('cart.html', items=items, total=total)
 
+# Cart badge: one primary-key lookup, fetched by script.js on every page
+@app.route('/cart/summary')
+def cart_badge():
+    if 'user_id' not in session:
+        return jsonify(count=0, total=0.0)
+    count, total = cart_summary(get_db(), session['user_id'])
+    return jsonify(count=count, total=total)
+
+# JSON API v1: listings, search and the cart for script.js to update pages in place
+PRODUCT_FIELDS = ('id', 'title', 'description', 'category', 'price', 'discount', 'image_url', 'url', 'html')
+PRODUCT_DEFAULT_FIELDS = ('id', 'title', 'category', 'price', 'discount', 'url')
+PRODUCT_COMPUTED = {
+    'url': lambda product: url_for('product_detail', product_id=product['id']),
+    'html': product_card,  # the cached card fragment the landing page uses
+}
+CART_FIELDS = ('product_id', 'title', 'price', 'discount', 'quantity', 'subtotal', 'image_url')
+CART_DEFAULT_FIELDS = ('product_id', 'title', 'price', 'discount', 'quantity', 'subtotal')
+CART_COMPUTED = {'subtotal': lambda item: round((item['price'] - (item['discount'] or 0)) * item['quantity'], 2)}
+MAX_API_PAGE_SIZE = 100
+
+def api_user_id():
+    if 'user_id' not in session:
+        raise api.ApiError('Log in to use the cart.', 401)
+    return session['user_id']
+
+def api_listing_args():
+    # (fields, columns to select, page size) for the product endpoints; descriptions only on request
+    fields = api.select_fields(request.args.get('fields'), PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    columns = LISTING_COLUMNS
+    if 'description' in fields:
+        columns += ', p.description'
+    limit = api.int_param(request.args.get('limit'), 'limit', app.config['API_PAGE_SIZE'], maximum=MAX_API_PAGE_SIZE)
+    return fields, columns, limit
+
+def api_cart_summary(conn, user_id):
+    count, total = cart_summary(conn, user_id)
+    return jsonify(count=count, total=total)
+
+# API: listings newest first (?category=&after=<id>&limit=&fields=)
+@app.route('/api/v1/products')
+def api_products():
+    """Listings newest first, keyset-paged on id.
+
+    Ecofinds pages its feed on (created_at, id). products here has no
+    created_at, and AUTOINCREMENT ids are handed out in insertion order,
+    so the id alone gives the same order and the cursor is just the last
+    id. Clients should treat ``next`` as opaque in both apps.
+    """
+    fields, columns, limit = api_listing_args()
+    category = request.args.get('category')
+    after = api.int_param(request.args.get('after'), 'after', None)
+    query, params = f'SELECT {columns} FROM products p WHERE 1=1', []
+    if category:
+        query += ' AND p.category = ?'
+        params.append(category)
+    if after:
+        query += ' AND p.id < ?'
+        params.append(after)
+    # One extra row tells whether there is a next page
+    products = cached_listing(category, query + ' ORDER BY p.id DESC LIMIT ?', params + [limit + 1])
+    next_cursor = str(products[limit - 1]['id']) if len(products) > limit else None
+    return jsonify(products=[api.project(product, fields, PRODUCT_COMPUTED) for product in products[:limit]],
+                   next=next_cursor)
+
+# API: full-text search by relevance (?search=&category=&after=<rank>_<id>&limit=&fields=)
+@app.route('/api/v1/search')
+def api_search():
+    fields, columns, limit = api_listing_args()
+    category = request.args.get('category')
+    match = fts_query(request.args.get('search', ''))
+    if not match:
+        raise api.ApiError('search must contain at least one word.')
+    query = f'''SELECT {columns}, products_fts.rank AS rank FROM products_fts
+                 JOIN products p ON p.id = products_fts.rowid
+                 WHERE products_fts MATCH ?'''
+    params = [match]
+    if category:
+        query += ' AND p.category = ?'
+        params.append(category)
+    after = request.args.get('after')
+    if after:
+        # Keyset on (rank, id): the page after the last row already returned, however deep
+        try:
+            rank, product_id = after.rsplit('_', 1)
+            params += [float(rank), float(rank), int(product_id)]
+        except ValueError:
+            raise api.ApiError('after must be the next cursor of a previous page.')
+        query += ' AND (products_fts.rank > ? OR (products_fts.rank = ? AND p.id > ?))'
+    query += ' ORDER BY products_fts.rank, p.id LIMIT ?'
+    params.append(limit + 1)
+    # Only first pages are shared; a cache entry per cursor would rarely be hit again
+    products = cached_listing(category, query, params) if not after else get_db().execute(query, params).fetchall()
+    next_cursor = f"{products[limit - 1]['rank']!r}_{products[limit - 1]['id']}" if len(products) > limit else None
+    return jsonify(products=[api.project(product, fields, PRODUCT_COMPUTED) for product in products[:limit]],
+                   next=next_cursor)
+
+# API: cart contents and totals; POST {"product_id", "quantity"} adds to it
+@app.route('/api/v1/cart', methods=['GET', 'POST'])
+def api_cart():
+    user_id = api_user_id()
+    conn = get_db()
+    if request.method == 'POST':
+        body = api.json_body(request)
+        product_id = api.int_param(body.get('product_id'), 'product_id', None)
+        if product_id is None:
+            raise api.ApiError('product_id is required.')
+        quantity = api.int_param(body.get('quantity'), 'quantity', 1, maximum=MAX_CART_QUANTITY)
+        c = conn.cursor()
+        c.execute('''INSERT INTO carts (user_id, product_id, quantity) SELECT ?, id, ? FROM products WHERE id = ?
+                     ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = MIN(quantity + excluded.quantity, ?)''',
+                  (user_id, quantity, product_id, MAX_CART_QUANTITY))
+        conn.commit()
+        if not c.rowcount:
+            raise api.ApiError('Product not found.', 404)
+        return api_cart_summary(conn, user_id)
+
+    fields = api.select_fields(request.args.get('fields'), CART_FIELDS, CART_DEFAULT_FIELDS)
+    items = conn.execute('''SELECT c.product_id, c.quantity, p.title, p.price, p.discount, p.image_url
+                           FROM carts c JOIN products p ON p.id = c.product_id
+                           WHERE c.user_id = ? ORDER BY c.id''', (user_id,)).fetchall()
+    count, total = cart_summary(conn, user_id)
+    return jsonify(items=[api.project(item, fields, CART_COMPUTED) for item in items], count=count, total=total)
+
+# API: set a cart line's quantity with PUT {"quantity"} (0 removes it), or DELETE it
+@app.route('/api/v1/cart/<int:product_id>', methods=['PUT', 'DELETE'])
+def api_cart_item(product_id):
+    user_id = api_user_id()
+    quantity = 0
+    if request.method == 'PUT':
+        quantity = api.int_param(api.json_body(request).get('quantity'), 'quantity', None,
+                                 minimum=0, maximum=MAX_CART_QUANTITY)
+        if quantity is None:
+            raise api.ApiError('quantity is required.')
+    conn = get_db()
+    if quantity:
+        conn.execute('UPDATE carts SET quantity = ? WHERE user_id = ? AND product_id = ?', (quantity, user_id, product_id))
+    else:
+        conn.execute('DELETE FROM carts WHERE user_id = ? AND product_id = ?', (user_id, product_id))
+    conn.commit()
+    return api_cart_summary(conn, user_id)
+
 # Remove from Cart
 @app.route('/remove_from_cart/<int:product_id>')
 def remove_from_cart(product_id):
@@ -321,7 +914,6 @@ def remove_from_cart(product_id):
     c = conn.cursor()
     c.execute('DELETE FROM carts WHERE user_id = ? AND product_id = ?', (session['user_id'], product_id))
     conn.commit()
-    conn.close()
     flash('Removed from cart!')
     return redirect(url_for('cart'))
 
@@ -331,38 +923,27 @@ def checkout():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     conn = get_db()
-    c = conn.cursor()
-    c.execute('SELECT * FROM carts WHERE user_id = ?', (session['user_id'],))
-    cart_items = c.fetchall()
-    items = []
-    total = 0
-    for item in cart_items:
-        c.execute('SELECT * FROM products WHERE id = ?', (item['product_id'],))
-        product = c.fetchone()
-        discounted_price = product['price'] - (product['discount'] or 0.0)
-        subtotal = discounted_price * item['quantity']
-        total += subtotal
-        items.append({'title': product['title'], 'quantity': item['quantity'], 'subtotal': subtotal})
-        c.execute('INSERT INTO purchases (user_id, product_id) VALUES (?, ?)', (session['user_id'], item['product_id']))
-    c.execute('DELETE FROM carts WHERE user_id = ?', (session['user_id'],))
-    conn.commit()
-    conn.close()
+    items, total, bill_id = place_order(conn, session['user_id'])
+    if not items:
+        flash('Your cart is empty.')
+        return redirect(url_for('cart'))
 
-    # Generate PDF bill
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.drawString(100, 750, "EcoFinds Bill")
-    p.drawString(100, 730, f"User: {session['username']}")
-    p.drawString(100, 710, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    y = 680
-    for item in items:
-        p.drawString(100, y, f"{item['title']} x {item['quantity']} = ₹{item['subtotal']}")
-        y -= 20
-    p.drawString(100, y - 20, f"Total: ₹{total}")
-    p.save()
-    buffer.seek(0)
+    # Render the PDF bill off the request thread; it is stored under the order's first purchase id
+    bill_store.submit(bill_id, load_bill(conn, bill_id, session['user_id']))
     flash('Checkout complete! Congratulations on your purchase!')
-    return send_file(buffer, as_attachment=True, download_name='bill.pdf', mimetype='application/pdf')
+    return redirect(url_for('previous_purchases', bill=bill_id))
+
+# Download Bill
+@app.route('/bill/<int:bill_id>')
+def download_bill(bill_id):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    bill = load_bill(get_db(), bill_id, session['user_id'])
+    path = bill_store.get(bill_id, bill) if bill else None
+    if not path:
+        flash('Bill not found.')
+        return redirect(url_for('previous_purchases'))
+    return send_file(path, as_attachment=True, download_name=f'bill-{bill_id}.pdf', mimetype='application/pdf')
 
 # Previous Purchases
 @app.route('/previous_purchases')
@@ -370,13 +951,23 @@ def previous_purchases():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     conn = get_db()
-    c = conn.cursor()
-    c.execute('''SELECT p.*, pu.purchase_date FROM products p 
-                 JOIN purchases pu ON p.id = pu.product_id WHERE pu.user_id = ?''', (session['user_id'],))
-    purchases = c.fetchall()
-    conn.close()
-    return render_template('previous_purchases.html', purchases=purchases)
+    user_id = session['user_id']
+    months = monthly_spend(conn, user_id)
+    bill_id = request.args.get('bill', type=int)
+
+    if request.args.get('all'):
+        # Full history: the cursor is read lazily as the template streams each row out
+        purchases = conn.execute(PURCHASE_HISTORY.format(filters=''), (user_id,))
+        return responses.stream_page('previous_purchases.html', purchases=purchases, months=months,
+                                     bill_id=bill_id, show_all=True)
+
+    after = request.args.get('after')
+    purchases, next_cursor = purchase_page(conn, user_id, after, per_page=app.config['PURCHASES_PER_PAGE'])
+    return render_template('previous_purchases.html', purchases=purchases, months=months, bill_id=bill_id,
+                           next_cursor=next_cursor, paged=bool(after))
 
 if __name__ == '__main__':
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # The dev server sets itself up; deployments run `flask db upgrade` once instead
+    init_db()
     app.run(debug=True)
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Immutable order snapshot handed to the render workers
+BillItem = namedtuple('BillItem', 'title quantity subtotal')
+Bill = namedtuple('Bill', 'username date items total')
+
+def render_bill(path, bill):
+    # Imported here so workers that never render a bill don't pay for reportlab at boot
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    # Render to a temp file of its own first, so readers never see a half-written PDF
+    # and two renders of the same bill can't write into each other
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.pdf.tmp')
+    os.close(fd)
+    try:
+        p = canvas.Canvas(tmp_path, pagesize=letter)
+        p.drawString(100, 750, "EcoFinds Bill")
+        p.drawString(100, 730, f"User: {bill.username}")
+        p.drawString(100, 710, f"Date: {bill.date}")
+        y = 680
+        for item in bill.items:
+            p.drawString(100, y, f"{item.title} x {item.quantity} = ₹{item.subtotal}")
+            y -= 20
+        p.drawString(100, y - 20, f"Total: ₹{bill.total}")
+        p.save()
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+class BillStore:
+    """Renders bills on a background pool and keeps the PDFs on disk.
+
+    Bills are stored by purchase id, so a bill is rendered once at checkout
+    and every later download is served straight from the file. The files
+    are only a cache of the bills table: one that failed to render or has
+    since been deleted is rendered again from its snapshot on download.
+    """
+    def __init__(self, folder, workers=2):
+        self.folder = folder
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bill')
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def path(self, bill_id):
+        return os.path.join(self.folder, f'{bill_id}.pdf')
+
+    def submit(self, bill_id, bill):
+        """Queue a render of the bill, or return the one already queued or running for it"""
+        os.makedirs(self.folder, exist_ok=True)
+        with self._lock:
+            future = self._pending.get(bill_id)
+            if future is not None and not future.done():
+                return future
+            future = self._executor.submit(render_bill, self.path(bill_id), bill)
+            self._pending[bill_id] = future
+        future.add_done_callback(lambda done: self._forget(bill_id, done))
+        return future
+
+    def get(self, bill_id, bill=None, timeout=10):
+        """Path of a rendered bill, waiting up to timeout seconds if it is still rendering.
+
+        When there is no file and ``bill`` is given, it is rendered now.
+        """
+        with self._lock:
+            future = self._pending.get(bill_id)
+        if future is not None:
+            self._wait(bill_id, future, timeout)
+        path = self.path(bill_id)
+        if not os.path.exists(path) and bill is not None:
+            self._wait(bill_id, self.submit(bill_id, bill), timeout)
+        return path if os.path.exists(path) else None
+
+    def _wait(self, bill_id, future, timeout):
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            print(f"Error rendering bill {bill_id}: {e}")
+
+    def _forget(self, bill_id, future):
+        # A later render of the same bill may have taken the slot; leave that one alone
+        with self._lock:
+            if self._pending.get(bill_id) is future:
+                del self._pending[bill_id]
@@ -0,0 +1,118 @@
+import sqlite3
+import threading
+import time
+import weakref
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor reporting each statement and how long it took to the connection's query hook"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._report(sql, parameters, start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._report(sql, None, start)
+
+    def _report(self, sql, parameters, start):
+        hook = self.connection.query_hook
+        if hook:
+            hook(sql, parameters, time.perf_counter() - start)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors, and execute() shortcut, are TimedCursors"""
+
+    query_hook = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class ConnectionManager:
+    """Hands out one tuned SQLite connection per thread.
+
+    A thread keeps its connection across requests instead of reconnecting
+    (and re-reading the schema) every time, and the statement cache on it
+    stays warm. release() is called from teardown_appcontext to roll back
+    anything a request left open; a connection that can't be reset is
+    closed and replaced on next use. A connection is closed when its thread
+    goes away, so servers that start a thread per request (the threaded dev
+    server) don't pile up open connections.
+
+    Every connection runs in WAL mode, so readers never block the writer
+    and vice versa, with synchronous=NORMAL (durable across app crashes,
+    fsyncs only at checkpoints). Writers that still collide wait up to
+    ``busy_timeout`` seconds for the lock instead of failing with
+    "database is locked".
+
+    With a ``query_hook``, every statement is reported to
+    ``query_hook(sql, params, seconds)`` after it runs.
+    """
+
+    def __init__(self, path, busy_timeout=5.0, cache_size_kb=16 * 1024,
+                 mmap_size=128 * 1024 * 1024, cached_statements=256, query_hook=None):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.query_hook = query_hook
+        self._local = threading.local()
+
+    def connect(self):
+        """Open a new tuned connection that the caller owns and must close"""
+        factory = TimedConnection if self.query_hook else sqlite3.Connection
+        # Not tied to the opening thread, so the close when that thread goes away can run anywhere
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, cached_statements=self.cached_statements,
+                               factory=factory, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{self.cache_size_kb}')
+        conn.execute(f'PRAGMA mmap_size = {self.mmap_size}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        if self.query_hook:
+            conn.query_hook = self.query_hook  # set last so the PRAGMAs aren't reported
+        return conn
+
+    def explain(self, sql, params=()):
+        """SQLite's query plan for a statement, one line per step"""
+        return [row[3] for row in self.get().execute('EXPLAIN QUERY PLAN ' + sql, params or ())]
+
+    def get(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+            self._local.finalizer = weakref.finalize(threading.current_thread(), conn.close)
+        return conn
+
+    def release(self):
+        """Reset this thread's connection after a request so the next one starts clean"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            print(f"Dropping broken database connection: {e}")
+            self.close()
+
+    def close(self):
+        """Close this thread's connection; the next get() opens a fresh one"""
+        finalizer = getattr(self._local, 'finalizer', None)
+        self._local.conn = self._local.finalizer = None
+        if finalizer is not None:
+            finalizer()
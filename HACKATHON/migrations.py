@@ -0,0 +1,224 @@
+"""Versioned schema migrations for the SQLite database.
+
+Each migration is (version, name, steps) where a step is either an SQL
+statement or a function taking the connection. Applied versions are
+recorded in schema_migrations, so migrate() only runs what is new and a
+normal startup executes no DDL at all. Append new migrations to the end
+of MIGRATIONS; never edit one that has shipped.
+"""
+import sqlite3
+
+def add_discount_column(conn):
+    # Databases created before discounts existed lack the column
+    columns = [col[1] for col in conn.execute('PRAGMA table_info(products)')]
+    if 'discount' not in columns:
+        conn.execute('ALTER TABLE products ADD COLUMN discount REAL DEFAULT 0.0')
+
+def add_purchase_totals(conn):
+    # Purchases used to record only the product; keep what was paid so history
+    # totals don't move with later price edits. Older rows get today's price.
+    columns = [col[1] for col in conn.execute('PRAGMA table_info(purchases)')]
+    if 'quantity' not in columns:
+        conn.execute('ALTER TABLE purchases ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1')
+    if 'total_price' not in columns:
+        conn.execute('ALTER TABLE purchases ADD COLUMN total_price REAL')
+    conn.execute('''UPDATE purchases SET total_price = (
+                        SELECT ROUND(price - COALESCE(discount, 0), 2) FROM products WHERE id = purchases.product_id
+                    ) WHERE total_price IS NULL''')
+
+MIGRATIONS = [
+    (1, 'create tables', [
+        '''CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            username TEXT NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            discount REAL DEFAULT 0.0,
+            image_url TEXT DEFAULT 'placeholder.jpg'
+        )''',
+        '''CREATE TABLE IF NOT EXISTS carts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER DEFAULT 1
+        )''',
+        '''CREATE TABLE IF NOT EXISTS purchases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+    ]),
+    (2, 'add products.discount', [add_discount_column]),
+    (3, 'full-text search', [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            title, description, content='products', content_rowid='id'
+        )''',
+        "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+        '''CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF title, description ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO products_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END''',
+    ]),
+    (4, 'index uploaded image references', [
+        'CREATE INDEX IF NOT EXISTS idx_products_image_url ON products(image_url)',
+    ]),
+    (5, 'index foreign keys and filters', [
+        # Fold duplicate cart rows into one before making the pair unique
+        '''UPDATE carts SET quantity = (
+               SELECT SUM(quantity) FROM carts dup
+               WHERE dup.user_id = carts.user_id AND dup.product_id = carts.product_id
+           )
+           WHERE id IN (SELECT MIN(id) FROM carts GROUP BY user_id, product_id HAVING COUNT(*) > 1)''',
+        'DELETE FROM carts WHERE id NOT IN (SELECT MIN(id) FROM carts GROUP BY user_id, product_id)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_carts_user_product ON carts(user_id, product_id)',
+        'CREATE INDEX IF NOT EXISTS idx_products_user ON products(user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)',
+        'CREATE INDEX IF NOT EXISTS idx_purchases_user ON purchases(user_id, purchase_date)',
+    ]),
+    (6, 'cart summaries', [
+        # Per-user item count and total, kept current by the triggers below so
+        # the cart badge and total never have to read the whole cart
+        '''CREATE TABLE IF NOT EXISTS cart_summaries (
+            user_id INTEGER PRIMARY KEY,
+            item_count INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0.0
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_carts_product ON carts(product_id)',
+        'DELETE FROM carts WHERE product_id NOT IN (SELECT id FROM products)',
+        '''INSERT OR REPLACE INTO cart_summaries (user_id, item_count, total)
+           SELECT c.user_id, SUM(c.quantity), ROUND(SUM(c.quantity * (p.price - COALESCE(p.discount, 0))), 2)
+           FROM carts c JOIN products p ON p.id = c.product_id
+           GROUP BY c.user_id''',
+        '''CREATE TRIGGER IF NOT EXISTS carts_summary_insert AFTER INSERT ON carts BEGIN
+            INSERT INTO cart_summaries (user_id, item_count, total)
+            VALUES (new.user_id, new.quantity, ROUND(new.quantity * COALESCE(
+                (SELECT price - COALESCE(discount, 0) FROM products WHERE id = new.product_id), 0), 2))
+            ON CONFLICT (user_id) DO UPDATE SET
+                item_count = item_count + excluded.item_count,
+                total = ROUND(total + excluded.total, 2);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS carts_summary_update AFTER UPDATE OF quantity ON carts BEGIN
+            UPDATE cart_summaries SET
+                item_count = item_count + new.quantity - old.quantity,
+                total = ROUND(total + (new.quantity - old.quantity) * COALESCE(
+                    (SELECT price - COALESCE(discount, 0) FROM products WHERE id = new.product_id), 0), 2)
+            WHERE user_id = new.user_id;
+        END''',
+        # An emptied cart is reset to exactly 0 so float error can't accumulate
+        '''CREATE TRIGGER IF NOT EXISTS carts_summary_delete AFTER DELETE ON carts BEGIN
+            UPDATE cart_summaries SET
+                item_count = item_count - old.quantity,
+                total = CASE WHEN item_count = old.quantity THEN 0 ELSE ROUND(total - old.quantity * COALESCE(
+                    (SELECT price - COALESCE(discount, 0) FROM products WHERE id = old.product_id), 0), 2) END
+            WHERE user_id = old.user_id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS products_cart_reprice AFTER UPDATE OF price, discount ON products BEGIN
+            UPDATE cart_summaries SET
+                total = ROUND(total + (
+                    SELECT quantity FROM carts c WHERE c.user_id = cart_summaries.user_id AND c.product_id = new.id
+                ) * ((new.price - COALESCE(new.discount, 0)) - (old.price - COALESCE(old.discount, 0))), 2)
+            WHERE user_id IN (SELECT user_id FROM carts WHERE product_id = new.id);
+        END''',
+        # A deleted listing leaves every cart it was in, while its price is still known
+        '''CREATE TRIGGER IF NOT EXISTS products_cart_delete BEFORE DELETE ON products BEGIN
+            DELETE FROM carts WHERE product_id = old.id;
+        END''',
+    ]),
+    (7, 'purchase history', [
+        add_purchase_totals,
+        # Covers the paginated history and its monthly totals; rowid rides along as the tiebreak
+        'CREATE INDEX IF NOT EXISTS idx_purchases_history ON purchases(user_id, purchase_date, quantity, total_price)',
+        'DROP INDEX IF EXISTS idx_purchases_user',
+    ]),
+    (8, 'bill snapshots', [
+        # What each order's bill shows, kept so the PDF can be rendered again at any time.
+        # id is the order's first purchase id; items is JSON [[title, quantity, subtotal], ...]
+        '''CREATE TABLE IF NOT EXISTS bills (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            items TEXT NOT NULL,
+            total REAL NOT NULL
+        )''',
+        # Earlier orders are rebuilt from purchases, which never recorded the order they
+        # belonged to. The first checkout inserted one row per item, so an order's rows can
+        # straddle a second; a user's purchases less than two seconds apart count as one
+        # order. Two checkouts that close together are merged, and a product deleted before
+        # migration 7 recorded no price, so these bills are approximate.
+        '''WITH ordered AS (
+               SELECT pu.*,
+                      CASE WHEN julianday(pu.purchase_date) - julianday(LAG(pu.purchase_date) OVER by_user) < 2.0 / 86400
+                           THEN 0 ELSE 1 END AS starts_order
+               FROM purchases pu
+               WINDOW by_user AS (PARTITION BY pu.user_id ORDER BY pu.id)
+           ), orders AS (
+               SELECT *, SUM(starts_order) OVER (PARTITION BY user_id ORDER BY id) AS order_no FROM ordered
+           )
+           INSERT OR IGNORE INTO bills (id, user_id, username, created_at, items, total)
+           SELECT MIN(o.id), o.user_id, u.username, MIN(o.purchase_date),
+                  json_group_array(json_array(COALESCE(p.title, 'Removed product'), o.quantity, COALESCE(o.total_price, 0))),
+                  ROUND(COALESCE(SUM(o.total_price), 0), 2)
+           FROM orders o
+           JOIN users u ON u.id = o.user_id
+           LEFT JOIN products p ON p.id = o.product_id
+           GROUP BY o.user_id, o.order_no''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    """Applied version without creating anything; 0 if migrations have never run"""
+    try:
+        return conn.execute('SELECT MAX(version) FROM schema_migrations').fetchone()[0] or 0
+    except sqlite3.OperationalError:  # no schema_migrations table yet
+        return 0
+
+def current_version(conn):
+    """Highest applied migration version, or 0 for a fresh database"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations').fetchone()[0]
+
+def migrate(conn):
+    """Apply pending migrations in order, each in its own transaction; returns how many ran"""
+    applied = current_version(conn)
+    conn.commit()
+    count = 0
+    for version, name, steps in MIGRATIONS:
+        if version <= applied:
+            continue
+        try:
+            conn.execute('BEGIN')  # so DDL is rolled back along with everything else
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied migration {version}: {name}")
+        count += 1
+    return count
@@ -37,4 +37,71 @@ document.addEventListener('DOMContentLoaded', () => {
             if (!valid) e.preventDefault();
         });
     });
+});
+
+// Fill the nav cart badge from the cheap summary endpoint
+document.addEventListener('DOMContentLoaded', () => {
+    const badge = document.querySelector('[data-cart-summary]');
+    if (!badge) return;
+    fetch(badge.dataset.cartSummary, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(summary => {
+            if (summary.count) badge.textContent = `(${summary.count})`;
+        });
+});
+
+// Add to cart through the JSON API and update the badge without leaving the page
+document.addEventListener('DOMContentLoaded', () => {
+    const badge = document.querySelector('[data-cart-api]');
+    if (!badge) return;
+    document.addEventListener('click', (e) => {
+        const link = e.target.closest('[data-add-to-cart]');
+        if (!link) return;
+        e.preventDefault();
+        fetch(badge.dataset.cartApi, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ product_id: Number(link.dataset.addToCart), quantity: 1 })
+        })
+            .then(response => {
+                if (!response.ok) throw new Error(response.status);
+                return response.json();
+            })
+            .then(summary => {
+                badge.textContent = summary.count ? `(${summary.count})` : '';
+                link.textContent = 'Added to cart!';
+            })
+            // Fall back to the plain link, which redirects with a flash message
+            .catch(() => { window.location = link.href; });
+    });
+});
+
+// Run searches through the JSON API and swap in the cached product cards
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.querySelector('form[data-api-search]');
+    if (!form) return;
+    const grid = document.querySelector(form.dataset.results);
+    form.addEventListener('submit', (e) => {
+        if (e.defaultPrevented) return;  // failed validation
+        e.preventDefault();
+        const params = new URLSearchParams(new FormData(form));
+        params.set('fields', 'html');
+        fetch(`${form.dataset.apiSearch}?${params}`, { credentials: 'same-origin' })
+            .then(response => {
+                if (!response.ok) throw new Error(response.status);
+                return response.json();
+            })
+            .then(page => {
+                params.delete('fields');
+                history.pushState(null, '', `${form.action}?${params}`);
+                grid.innerHTML = page.products.map(product => product.html).join('') || '<p>No products found.</p>';
+                if (page.next) {
+                    // The API pages search results; the full list is still one click away
+                    grid.insertAdjacentHTML('beforeend', `<a href="${form.action}?${params}" class="view-btn">All results</a>`);
+                }
+            })
+            // An empty search or any error falls back to the normal page load
+            .catch(() => form.submit());
+    });
 });
\ No newline at end of file
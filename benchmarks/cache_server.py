@@ -0,0 +1,109 @@
+"""A tiny Redis-compatible server for exercising the redis:// cache backend locally.
+
+Implements just what cache.RedisBackend sends (PING, GET, SET with PX/EX/NX,
+DEL, INCR, MGET, SELECT, FLUSHDB) over RESP, keeping everything in one
+in-memory dict. Not for production; point CACHE_URL at a real Redis there.
+
+    python benchmarks/cache_server.py --port 6390
+    CACHE_URL=redis://localhost:6390/0 flask run
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}  # key -> (value, expires_at or None)
+
+    def get(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry[0]
+
+def bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+def execute(store, args):
+    command = args[0].upper()
+    with store.lock:
+        if command == b'PING':
+            return b'+PONG\r\n'
+        if command in (b'SELECT', b'FLUSHDB'):
+            if command == b'FLUSHDB':
+                store.data.clear()
+            return b'+OK\r\n'
+        if command == b'GET':
+            return bulk(store.get(args[1]))
+        if command == b'MGET':
+            values = [bulk(store.get(key)) for key in args[1:]]
+            return b'*%d\r\n' % len(values) + b''.join(values)
+        if command == b'SET':
+            key, value, options = args[1], args[2], [arg.upper() for arg in args[3:]]
+            expires_at = None
+            if b'PX' in options:
+                expires_at = time.monotonic() + int(options[options.index(b'PX') + 1]) / 1000
+            elif b'EX' in options:
+                expires_at = time.monotonic() + int(options[options.index(b'EX') + 1])
+            if b'NX' in options and store.get(key) is not None:
+                return b'$-1\r\n'
+            store.data[key] = (value, expires_at)
+            return b'+OK\r\n'
+        if command == b'DEL':
+            removed = sum(store.get(key) is not None and store.data.pop(key) is not None for key in args[1:])
+            return b':%d\r\n' % removed
+        if command == b'INCR':
+            current = store.get(args[1])
+            try:
+                value = int(current or 0) + 1
+            except ValueError:
+                return b'-ERR value is not an integer or out of range\r\n'
+            store.data[args[1]] = (str(value).encode(), None)
+            return b':%d\r\n' % value
+    return b'-ERR unknown command\r\n'
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.startswith(b'*'):
+                self.wfile.write(b'-ERR expected an array\r\n')
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(execute(self.server.store, args))
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, Handler)
+        self.store = Store()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+
+    server = Server((args.host, args.port))
+    print(f"Cache stand-in listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Compare HACKATHON's set-based place_order() with the old per-item checkout loop.
+
+Runs against a throwaway SQLite database in a temp directory:
+
+    python benchmarks/checkout_bench.py --orders 200 --cart-size 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+HACKATHON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'HACKATHON')
+
+def legacy_checkout(conn, user_id):
+    # The pre-batching checkout(): one SELECT and one INSERT per cart row
+    c = conn.cursor()
+    c.execute('SELECT * FROM carts WHERE user_id = ?', (user_id,))
+    total = 0
+    for item in c.fetchall():
+        c.execute('SELECT * FROM products WHERE id = ?', (item['product_id'],))
+        product = c.fetchone()
+        total += (product['price'] - (product['discount'] or 0.0)) * item['quantity']
+        c.execute('INSERT INTO purchases (user_id, product_id) VALUES (?, ?)', (user_id, item['product_id']))
+    c.execute('DELETE FROM carts WHERE user_id = ?', (user_id,))
+    conn.commit()
+    return total
+
+def fill_carts(conn, user_ids, product_ids, cart_size):
+    rows = [(user_id, product_ids[(user_id + i) % len(product_ids)], 1 + i % 3)
+            for user_id in user_ids for i in range(cart_size)]
+    conn.executemany('INSERT INTO carts (user_id, product_id, quantity) VALUES (?, ?, ?)', rows)
+    conn.commit()
+
+def run(label, checkout, conn, user_ids):
+    start = time.perf_counter()
+    for user_id in user_ids:
+        checkout(conn, user_id)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {len(user_ids) / elapsed:10.1f} orders/s  {elapsed / len(user_ids) * 1000:8.3f} ms/order")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--cart-size', type=int, default=50)
+    parser.add_argument('--products', type=int, default=1000)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='checkout-bench-'))
+    sys.path.insert(0, HACKATHON_DIR)
+    import app
+    app.init_db()  # creates and seeds ecofinds.db in the temp dir
+
+    conn = app.get_db()
+    conn.executemany(
+        'INSERT INTO products (user_id, title, description, category, price, discount) VALUES (1, ?, ?, ?, ?, ?)',
+        [(f'Item {i}', 'Benchmark listing', 'Other', 10.0 + i % 50, i % 5) for i in range(args.products)]
+    )
+    product_ids = [row[0] for row in conn.execute('SELECT id FROM products')]
+    user_ids = list(range(1000, 1000 + args.orders))
+
+    print(f"{args.orders} orders x {args.cart_size} items, {len(product_ids)} products")
+    fill_carts(conn, user_ids, product_ids, args.cart_size)
+    legacy = run('loop', legacy_checkout, conn, user_ids)
+    fill_carts(conn, user_ids, product_ids, args.cart_size)
+    batched = run('set-based', app.place_order, conn, user_ids)
+    print(f"speedup      {legacy / batched:10.2f}x")
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""Load-test the real marketplace routes and record per-route throughput and latency.
+
+Seeds a benchmark database with synthetic data (SQLite for HACKATHON; for
+Ecofinds, a local MySQL-compatible server such as MariaDB or a mysql
+container), then drives each route with ``--concurrency`` workers, either
+through Flask's test client or over HTTP against a threaded server started
+in this process. Results go to a JSON file that a later run can be compared
+against:
+
+    python benchmarks/routes_bench.py --app hackathon --products 100000
+    python benchmarks/routes_bench.py --app hackathon --mode http --concurrency 8 \\
+        --compare results/hackathon-http-20250101-120000.json
+    python benchmarks/routes_bench.py --app ecofinds --mysql-user root --mysql-password secret
+
+Seeding is skipped when the workdir (or MySQL database) already holds
+products, so repeat runs can reuse one large dataset via --workdir.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+from seed_data import BENCH_PASSWORD, CART_USERS, SEARCH_TERMS, email, seed_ecofinds, seed_hackathon
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Each scenario returns the requests for one iteration as (path, measured);
+# unmeasured steps set up state, like filling the cart before a checkout.
+# Checkout empties carts, so it runs last.
+HACKATHON_SCENARIOS = {
+    'landing': lambda args, rng: [('/', True)],
+    'search': lambda args, rng: [(f'/?search={rng.choice(SEARCH_TERMS)}', True)],
+    'product_detail': lambda args, rng: [(f'/product/{rng.randint(1, args.products)}', True)],
+    'cart': lambda args, rng: [('/cart', True)],
+    'purchases': lambda args, rng: [('/previous_purchases', True)],
+    'checkout': lambda args, rng: [(f'/add_to_cart/{rng.randint(1, args.products)}', False), ('/checkout', True)],
+}
+
+ECOFINDS_SCENARIOS = {
+    'index': lambda args, rng: [('/', True)],
+    'search': lambda args, rng: [(f'/search?q={rng.choice(SEARCH_TERMS)}', True)],
+    'product_detail': lambda args, rng: [(f'/product/{rng.randint(1, args.products)}', True)],
+    'cart': lambda args, rng: [('/cart', True)],
+    'purchases': lambda args, rng: [('/purchases', True)],
+    'checkout': lambda args, rng: [(f'/add_to_cart/{rng.randint(1, args.products)}', False), ('/checkout', True)],
+}
+
+class ClientSession:
+    """One logged-in user talking to the app through Flask's test client"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post(self, path, data):
+        return self.client.post(path, data=data).status_code
+
+    def close(self):
+        pass
+
+class HTTPSession:
+    """One logged-in user on a keep-alive HTTP connection, carrying its cookies"""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+        self.cookies = {}
+
+    def get(self, path):
+        return self._request('GET', path)
+
+    def post(self, path, data):
+        return self._request('POST', path, urlencode(data), {'Content-Type': 'application/x-www-form-urlencoded'})
+
+    def close(self):
+        self.conn.close()
+
+    def _request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        self.conn.request(method, path, body, headers)
+        response = self.conn.getresponse()
+        response.read()
+        for header in response.msg.get_all('Set-Cookie') or ():
+            name, _, value = header.split(';', 1)[0].partition('=')
+            self.cookies[name.strip()] = value
+        return response.status
+
+def prepare_hackathon(args):
+    sys.path.insert(0, os.path.join(ROOT, 'HACKATHON'))
+    import app
+    app.upgrade_db()
+    conn = app.db.connect()
+    (existing,) = conn.execute('SELECT COUNT(*) FROM products').fetchone()
+    if not existing:
+        print(f"Seeding {args.users} users, {args.products} products, {args.purchases} purchases...")
+        start = time.perf_counter()
+        seed_hackathon(conn, args.users, args.products, args.cart_items, args.purchases, seed=args.seed)
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+    else:
+        print(f"Reusing {existing} products in {os.path.abspath(app.DB_NAME)}")
+    conn.close()
+    return app.app, HACKATHON_SCENARIOS
+
+def prepare_ecofinds(args):
+    sys.path.insert(0, os.path.join(ROOT, 'Ecofinds'))
+    import mysql.connector
+    import database
+    database.DB_CONFIG.update(
+        host=args.mysql_host, port=args.mysql_port, user=args.mysql_user,
+        password=args.mysql_password, database=args.mysql_database
+    )
+    database.initialize_database()
+    database.seed_database()
+    connection = mysql.connector.connect(**database.DB_CONFIG)
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM products")
+    (existing,) = cursor.fetchone()
+    cursor.close()
+    if not existing:
+        print(f"Seeding {args.users} users, {args.products} products, {args.purchases} purchases...")
+        start = time.perf_counter()
+        seed_ecofinds(connection, args.users, args.products, args.cart_items, args.purchases, seed=args.seed)
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+    else:
+        print(f"Reusing {existing} products in {args.mysql_database}")
+    connection.close()
+    import app
+    return app.app, ECOFINDS_SCENARIOS
+
+def start_server(flask_app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def percentile(ordered, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+            'p50': ms(percentile(ordered, 0.50)),
+            'p90': ms(percentile(ordered, 0.90)),
+            'p95': ms(percentile(ordered, 0.95)),
+            'p99': ms(percentile(ordered, 0.99)),
+            'max': ms(ordered[-1]) if ordered else 0.0,
+        },
+    }
+
+def run_scenario(name, scenario, sessions, args):
+    """Run ``args.requests`` measured iterations split across the sessions' workers"""
+    per_worker = max(1, args.requests // len(sessions))
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(sessions) + 1)
+
+    def worker(index, session):
+        rng = random.Random(f'{args.seed}:{name}:{index}')
+        for _ in range(args.warmup):
+            for path, _ in scenario(args, rng):
+                session.get(path)
+        barrier.wait()
+        mine, failed = [], 0
+        for _ in range(per_worker):
+            for path, measured in scenario(args, rng):
+                start = time.perf_counter()
+                try:
+                    status = session.get(path)
+                except (OSError, http.client.HTTPException):
+                    status = 599
+                if measured:
+                    mine.append(time.perf_counter() - start)
+                    failed += status >= 400
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(i, s)) for i, s in enumerate(sessions)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()  # time only the measured phase, after every worker has warmed up
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {baseline_path} ({baseline.get('git_commit')}):")
+    print(f"{'route':<16}{'rps before':>12}{'rps after':>12}{'change':>9}{'p95 before':>13}{'p95 after':>12}{'change':>9}")
+    for name, after in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if not before:
+            continue
+        rps_change = (after['throughput_rps'] / before['throughput_rps'] - 1) * 100 if before['throughput_rps'] else 0
+        p95_before, p95_after = before['latency_ms']['p95'], after['latency_ms']['p95']
+        p95_change = (p95_after / p95_before - 1) * 100 if p95_before else 0
+        print(f"{name:<16}{before['throughput_rps']:>12.1f}{after['throughput_rps']:>12.1f}{rps_change:>+8.1f}%"
+              f"{p95_before:>13.2f}{p95_after:>12.2f}{p95_change:>+8.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', choices=('hackathon', 'ecofinds'), default='hackathon')
+    parser.add_argument('--mode', choices=('client', 'http'), default='client',
+                        help='Flask test client in-process, or real HTTP to a threaded server')
+    parser.add_argument('--routes', help='comma-separated subset of scenarios to run')
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured iterations per worker first')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--cart-items', type=int, default=5)
+    parser.add_argument('--purchases', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help='directory holding the database and uploads; reused if seeded')
+    parser.add_argument('--mysql-host', default='127.0.0.1')
+    parser.add_argument('--mysql-port', type=int, default=3306)
+    parser.add_argument('--mysql-user', default='ecofinds_user')
+    parser.add_argument('--mysql-password', default='')
+    parser.add_argument('--mysql-database', default='ecofinds_bench')
+    parser.add_argument('--output', help='JSON results path (default benchmarks/results/<app>-<mode>-<time>.json)')
+    parser.add_argument('--compare', help='earlier results JSON to print deltas against')
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix=f'{args.app}-bench-'))
+    os.makedirs(workdir, exist_ok=True)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    os.chdir(workdir)  # both apps keep their database, uploads and bills relative to the cwd
+
+    flask_app, scenarios = (prepare_hackathon if args.app == 'hackathon' else prepare_ecofinds)(args)
+    if args.routes:
+        scenarios = {name: scenarios[name] for name in args.routes.split(',')}
+
+    server = start_server(flask_app) if args.mode == 'http' else None
+    results = {
+        'app': args.app,
+        'mode': args.mode,
+        'concurrency': args.concurrency,
+        'requests_per_route': args.requests,
+        'scale': {'users': args.users, 'products': args.products,
+                  'cart_items': args.cart_items, 'purchases': args.purchases},
+        'seed': args.seed,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'routes': {},
+    }
+
+    print(f"{'route':<16}{'rps':>10}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'errors':>8}  (ms)")
+    for route_index, (name, scenario) in enumerate(scenarios.items()):
+        sessions = []
+        for worker in range(args.concurrency):
+            session = ClientSession(flask_app) if server is None else HTTPSession(*server.server_address)
+            # Each worker is a different seeded user, so carts and purchases don't collide
+            user_id = 1 + (route_index * args.concurrency + worker) % min(args.users, CART_USERS)
+            session.post('/login', {'email': email(user_id), 'password': BENCH_PASSWORD})
+            sessions.append(session)
+        summary = run_scenario(name, scenario, sessions, args)
+        for session in sessions:
+            session.close()
+        results['routes'][name] = summary
+        latency = summary['latency_ms']
+        print(f"{name:<16}{summary['throughput_rps']:>10.1f}{latency['mean']:>9.2f}{latency['p50']:>9.2f}"
+              f"{latency['p95']:>9.2f}{latency['p99']:>9.2f}{latency['max']:>9.2f}{summary['errors']:>8}")
+
+    if server is not None:
+        server.shutdown()
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'{args.app}-{args.mode}-{stamp}.json')
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if baseline:
+        compare(results, baseline)
+
+if __name__ == '__main__':
+    main()
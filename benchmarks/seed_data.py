@@ -0,0 +1,124 @@
+"""Deterministic synthetic data for the benchmark databases.
+
+Both schemas get the same shape of data: ``users`` accounts that all log in
+with BENCH_PASSWORD, ``products`` listings spread over every category,
+``cart_items`` cart rows for each of the first CART_USERS users, and
+``purchases`` past orders. Rows are generated lazily and inserted in
+batches, so a million-row seed never holds the whole table in memory. The
+same seed always produces the same rows.
+"""
+import random
+from datetime import datetime, timedelta
+from itertools import islice
+
+from werkzeug.security import generate_password_hash
+
+BENCH_PASSWORD = 'benchpass'
+BATCH_SIZE = 5000
+CART_USERS = 1000  # benchmark workers log in as these users
+
+ADJECTIVES = ('vintage', 'wooden', 'refurbished', 'handmade', 'classic', 'compact', 'leather',
+              'ceramic', 'organic', 'antique', 'portable', 'cotton', 'steel', 'bamboo', 'woollen')
+NOUNS = ('lamp', 'chair', 'laptop', 'jacket', 'bookshelf', 'kettle', 'camera', 'table', 'novel',
+         'bicycle', 'sofa', 'phone', 'dress', 'guitar', 'backpack', 'desk', 'mirror', 'rug')
+
+# Words the search scenarios query for; each matches a known share of titles
+SEARCH_TERMS = ADJECTIVES + NOUNS
+
+def email(user_id):
+    return f'bench{user_id}@example.com'
+
+def batches(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def _listing(rng, i):
+    title = f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} #{i}"
+    description = (f"Second-hand {title.lower()} in {rng.choice(('good', 'great', 'fair'))} condition. "
+                   f"Pick-up or delivery, {rng.randint(1, 50)} km radius.")
+    return title, description, round(rng.uniform(2, 500), 2)
+
+def _cart_pairs(rng, users, products, cart_items):
+    # cart_items distinct products per user, so every cart has something to show
+    for user_id in range(1, users + 1):
+        for product_id in rng.sample(range(1, products + 1), min(cart_items, products)):
+            yield user_id, product_id, rng.randint(1, 3)
+
+def seed_hackathon(conn, users, products, cart_items, purchases, seed=1):
+    """Fill HACKATHON's SQLite schema; expects empty tables with migrations applied"""
+    rng = random.Random(seed)
+    password = generate_password_hash(BENCH_PASSWORD)
+    categories = ('Electronics', 'Clothing', 'Furniture', 'Books', 'Other')
+    start = datetime(2024, 1, 1)
+
+    for batch in batches((email(i), password, f'bench{i}') for i in range(1, users + 1)):
+        conn.executemany('INSERT INTO users (email, password, username) VALUES (?, ?, ?)', batch)
+
+    def listings():
+        for i in range(1, products + 1):
+            title, description, price = _listing(rng, i)
+            discount = rng.choice((0.0, 0.0, 5.0, 10.0))
+            yield rng.randint(1, users), title, description, rng.choice(categories), price, discount, 'placeholder.jpg'
+    for batch in batches(listings()):
+        conn.executemany('''INSERT INTO products (user_id, title, description, category, price, discount, image_url)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''', batch)
+
+    for batch in batches(_cart_pairs(rng, min(users, CART_USERS), products, cart_items)):
+        conn.executemany('INSERT INTO carts (user_id, product_id, quantity) VALUES (?, ?, ?)', batch)
+
+    def orders():
+        for _ in range(purchases):
+            quantity = rng.randint(1, 3)
+            when = start + timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            yield (rng.randint(1, users), rng.randint(1, products), when.strftime('%Y-%m-%d %H:%M:%S'),
+                   quantity, round(rng.uniform(2, 500) * quantity, 2))
+    for batch in batches(orders()):
+        conn.executemany('''INSERT INTO purchases (user_id, product_id, purchase_date, quantity, total_price)
+                            VALUES (?, ?, ?, ?, ?)''', batch)
+    conn.commit()
+
+def seed_ecofinds(connection, users, products, cart_items, purchases, seed=1):
+    """Fill Ecofinds' MySQL schema; expects migrations applied and categories seeded"""
+    rng = random.Random(seed)
+    password = generate_password_hash(BENCH_PASSWORD)
+    start = datetime(2024, 1, 1)
+    cursor = connection.cursor()
+    cursor.execute("SELECT id FROM categories")
+    categories = [row[0] for row in cursor.fetchall()]
+
+    for batch in batches((f'bench{i}', email(i), password) for i in range(1, users + 1)):
+        cursor.executemany("INSERT INTO users (username, email, password) VALUES (%s, %s, %s)", batch)
+        connection.commit()
+
+    def listings():
+        for i in range(1, products + 1):
+            title, description, price = _listing(rng, i)
+            created = start + timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+            yield title, description, price, rng.choice(categories), rng.randint(1, users), created
+    for batch in batches(listings()):
+        cursor.executemany("""
+            INSERT INTO products (title, description, price, category_id, seller_id, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, batch)
+        connection.commit()
+
+    for batch in batches(_cart_pairs(rng, min(users, CART_USERS), products, cart_items)):
+        cursor.executemany("INSERT INTO carts (user_id, product_id, quantity) VALUES (%s, %s, %s)", batch)
+        connection.commit()
+
+    def orders():
+        for _ in range(purchases):
+            quantity = rng.randint(1, 3)
+            when = start + timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            yield rng.randint(1, users), rng.randint(1, products), when, quantity, round(rng.uniform(2, 500) * quantity, 2)
+    for batch in batches(orders()):
+        cursor.executemany("""
+            INSERT INTO purchases (user_id, product_id, purchase_date, quantity, total_price)
+            VALUES (%s, %s, %s, %s, %s)
+        """, batch)
+        connection.commit()
+    cursor.close()
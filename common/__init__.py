@@ -0,0 +1,5 @@
+"""Modules shared by the Ecofinds and HACKATHON apps.
+
+Each app puts the repository root on sys.path and imports these as
+``common.<module>``, so a fix here applies to both.
+"""
@@ -0,0 +1,76 @@
+"""Helpers shared by the JSON API routes under /api/v1.
+
+Endpoints answer with compact JSON. A ``fields=a,b`` query parameter
+picks which fields each item carries, so a client that only redraws a
+badge or a card list doesn't download columns it never reads. Errors are
+raised as ApiError and turned into ``{"error": message}`` by the app.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+FORM_TYPES = {'application/x-www-form-urlencoded', 'multipart/form-data'}
+
+class ApiError(Exception):
+    """A client error reported as JSON with the given HTTP status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def select_fields(requested, available, default):
+    """Parse a comma-separated ``fields`` parameter against the fields an endpoint offers"""
+    if not requested:
+        return default
+    fields = tuple(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return fields or default
+
+def json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def project(row, fields, computed=None):
+    """A JSON-ready dict of just ``fields`` from a row.
+
+    ``computed`` maps extra field names to functions of the row, so derived
+    values such as URLs are only built when a client asks for them.
+    """
+    computed = computed or {}
+    return {name: json_value(computed[name](row) if name in computed else row[name]) for name in fields}
+
+def wants_json(request):
+    """Whether an error should be answered as JSON rather than a flash and a redirect.
+
+    True for /api/ routes, for bodies that aren't HTML forms (such as a
+    CSV import), and for clients that prefer JSON to HTML.
+    """
+    return (request.path.startswith('/api/') or bool(request.mimetype and request.mimetype not in FORM_TYPES)
+            or request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json')
+
+def json_body(request):
+    """The request's JSON object body"""
+    if not request.is_json:
+        raise ApiError('Send a JSON body with Content-Type: application/json.', 415)
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError('The body must be a JSON object.')
+    return body
+
+def int_param(value, name, default, minimum=1, maximum=None):
+    """An integer from a query parameter or JSON field, within [minimum, maximum]"""
+    if value is None or value == '':
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f"{name} must be an integer.")
+    if number < minimum or (maximum is not None and number > maximum):
+        raise ApiError(f"{name} must be between {minimum} and {maximum}." if maximum is not None
+                       else f"{name} must be at least {minimum}.")
+    return number
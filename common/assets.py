@@ -0,0 +1,268 @@
+"""Fingerprinted, precompressed static assets.
+
+``flask build-assets`` copies every file under static/ (except uploads)
+into static/dist/ with a hash of its content in the name, such as
+``css/style.3f2a1b9c0d.css``. JS and CSS are minified first. Text assets
+also get ``.gz`` and, when the brotli package is installed, ``.br``
+siblings compressed at the highest level once, at build time. A manifest
+maps each source name to its built name.
+
+Assets then rewrites ``url_for('static', filename='css/style.css')`` to
+the built file. It serves the smallest variant the browser accepts with
+a matching Content-Encoding, and marks built files immutable for a year.
+A changed file gets a new name, so browsers never need to revalidate.
+Workers read the manifest when they start, so restart them after a
+build. Without a build (in development) the original files are served
+as before.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+BUILD_FOLDER = 'dist'
+MANIFEST = 'manifest.json'
+SKIP_FOLDERS = {'uploads', BUILD_FOLDER}
+DIGEST_LENGTH = 10
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # in order of preference
+MAX_AGE = 365 * 24 * 3600
+
+# Characters after which a line break never ends a statement
+_JOINS_NEXT_LINE = set('{([,;=:?&|!')
+# Characters after which a '/' starts a regular expression rather than a division
+_BEFORE_REGEX = set('(,=:[!&|?{};+-*%<>~^')
+_WORD = re.compile(r'[\w$]')
+
+def minify_js(source):
+    """Drop comments and redundant whitespace, leaving strings, templates and regexes alone.
+
+    A line break is kept wherever automatic semicolon insertion could
+    depend on it.
+    """
+    out = []
+    i, n = 0, len(source)
+
+    def last():
+        return out[-1][-1] if out else ''
+
+    def copy_quoted(start):
+        # Index just past the string or template literal opening at ``start``
+        quote = source[start]
+        j = start + 1
+        while j < n:
+            c = source[j]
+            if c == '\\':
+                j += 2
+                continue
+            if c == quote:
+                return j + 1
+            if quote == '`' and source.startswith('${', j):
+                j = skip_code(j + 2)
+                continue
+            j += 1
+        return n
+
+    def skip_code(j):
+        # Index just past the '}' closing a template ${...} expression
+        depth = 1
+        while j < n:
+            c = source[j]
+            if c in '\'"`':
+                j = copy_quoted(j)
+                continue
+            if c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+                if depth == 0:
+                    return j + 1
+            j += 1
+        return n
+
+    while i < n:
+        c = source[i]
+        if c in '\'"`':
+            end = copy_quoted(i)
+            out.append(source[i:end])
+            i = end
+        elif source.startswith('//', i):
+            i = source.find('\n', i)
+            i = n if i == -1 else i
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            # A comment separates tokens like whitespace does
+            if out and out[-1] not in (' ', '\n'):
+                out.append(' ')
+        elif c == '/' and (not out or last() in _BEFORE_REGEX or ''.join(out).rstrip().endswith(('return', 'typeof'))):
+            j = i + 1
+            in_class = False
+            while j < n and (source[j] != '/' or in_class):
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and _WORD.match(source[j]):
+                j += 1
+            out.append(source[i:j])
+            i = j
+        elif c.isspace():
+            j = i
+            while j < n and source[j].isspace():
+                j += 1
+            newline = '\n' in source[i:j]
+            # Merge with whitespace already emitted around a removed comment
+            while out and out[-1] in (' ', '\n'):
+                newline = out.pop() == '\n' or newline
+            prev, following = last(), source[j] if j < n else ''
+            if not prev or not following:
+                pass
+            elif newline and prev not in _JOINS_NEXT_LINE and following not in ').]},;':
+                out.append('\n')
+            elif (_WORD.match(prev) and _WORD.match(following)) or (prev in '+-' and following in '+-'):
+                out.append(' ')
+            i = j
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out).strip() + '\n'
+
+_CSS_SKIP = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/''', re.S)
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+def _squeeze_css(text):
+    text = _CSS_PUNCTUATION.sub(r'\1', re.sub(r'\s+', ' ', text))
+    # Only the space after a colon can go: "a :hover" is a different selector from "a:hover"
+    return re.sub(r':\s+', ':', text).replace(';}', '}')
+
+def minify_css(source):
+    """Drop comments and collapse whitespace outside quoted strings"""
+    pieces = []
+    text = []
+    last = 0
+    for match in _CSS_SKIP.finditer(source):
+        text.append(source[last:match.start()])
+        last = match.end()
+        if match.group(1):
+            # Strings are kept as written
+            pieces += [_squeeze_css(''.join(text)), match.group(1)]
+            text = []
+        else:
+            text.append(' ')
+    text.append(source[last:])
+    pieces.append(_squeeze_css(''.join(text)))
+    return ''.join(pieces).strip() + '\n'
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+def build(static_folder):
+    """Build every static asset into static/dist; returns the new manifest.
+
+    Earlier builds are left in place so pages cached with their URLs keep
+    working.
+    """
+    manifest = {}
+    for root, folders, files in os.walk(static_folder):
+        if root == static_folder:
+            folders[:] = [folder for folder in folders if folder not in SKIP_FOLDERS]
+        for name in files:
+            path = os.path.join(root, name)
+            source = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            stem, ext = os.path.splitext(source)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if ext in MINIFIERS:
+                data = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+
+            digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+            built = f"{BUILD_FOLDER}/{stem}.{digest}{ext}"
+            target = os.path.join(static_folder, *built.split('/'))
+            _write(target, data)
+            if ext in COMPRESSIBLE:
+                variants = {'.gz': gzip.compress(data, 9, mtime=0)}
+                if brotli is not None:
+                    variants['.br'] = brotli.compress(data, quality=11)
+                for suffix, compressed in variants.items():
+                    if len(compressed) < len(data):
+                        _write(target + suffix, compressed)
+            manifest[source] = built
+
+    _write(os.path.join(static_folder, BUILD_FOLDER, MANIFEST),
+           json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.encodings = {}  # built name -> encodings with a precompressed file
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.load()
+        app.url_defaults(self._fingerprint)
+        self._send = app.view_functions['static']
+        app.view_functions['static'] = self._serve
+
+    def load(self):
+        """Read the manifest written by the last build, if there is one"""
+        try:
+            with open(os.path.join(self.static_folder, BUILD_FOLDER, MANIFEST), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except ValueError as e:
+            print(f"Ignoring unreadable asset manifest: {e}")
+            manifest = {}
+        self.encodings = {
+            built: {encoding for encoding, suffix in ENCODINGS
+                    if os.path.exists(os.path.join(self.static_folder, built + suffix))}
+            for built in manifest.values()
+        }
+        self.manifest = manifest
+
+    def _fingerprint(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
+
+    def _serve(self, filename):
+        encodings = self.encodings.get(filename)
+        if encodings is None:
+            return self._send(filename=filename)
+
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings and request.accept_encodings[encoding]:
+                response = send_from_directory(self.static_folder, filename + suffix,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.content_encoding = encoding
+                break
+        else:
+            response = self._send(filename=filename)
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+        return response
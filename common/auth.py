@@ -0,0 +1,116 @@
+"""Password hashing on a bounded pool of worker processes.
+
+PBKDF2 and scrypt are slow on purpose and hold the GIL while they run, so
+hashing on the request thread stalls every other request the worker is
+serving. PasswordHasher runs werkzeug's generate/check functions in a
+process pool instead, two processes by default, and caps how many jobs
+may wait for a process so a login storm is turned away with HasherBusy
+rather than queueing without limit. Every app process gets its own pool,
+so the default stays small: with several server workers per host, a pool
+per core would put far more hashers than cores on the machine.
+
+``method`` is a full werkzeug method string including its cost, such as
+``pbkdf2:sha256:600000`` or ``scrypt:32768:8:1``. A stored hash made with
+different parameters still verifies, and verify() hands back a fresh hash
+with the current ones so the caller can save it: raising the cost upgrades
+each account the next time it logs in.
+
+Workers are started with the spawn method, so they share no locks or
+connections with the threads of the process that starts them. A spawned
+process normally imports the parent's main module again; the hasher's
+workers are started with that module hidden, so running app.py directly
+doesn't boot another copy of the app in each of them. They import only
+this module.
+"""
+import multiprocessing
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_main_swap_lock = threading.Lock()
+
+class _WorkerProcess(multiprocessing.context.SpawnProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        # spawn tells the child to re-run whatever sys.modules['__main__'] is while it starts
+        with _main_swap_lock:
+            main = sys.modules['__main__']
+            sys.modules['__main__'] = types.ModuleType('__main__')
+            try:
+                return multiprocessing.context.SpawnProcess._Popen(process_obj)
+            finally:
+                sys.modules['__main__'] = main
+
+class _WorkerContext(multiprocessing.context.SpawnContext):
+    Process = _WorkerProcess
+
+class HasherBusy(Exception):
+    """Every hashing process is busy and the wait queue is full"""
+
+def hash_method(stored):
+    """The method string a stored hash was made with"""
+    return stored.split('$', 1)[0]
+
+def _verify(stored, password, method):
+    # Runs in a worker: check the password and, if it matches an outdated hash, rehash it
+    if not check_password_hash(stored, password):
+        return False, None
+    if hash_method(stored) != method:
+        return True, generate_password_hash(password, method)
+    return True, None
+
+class PasswordHasher:
+    def __init__(self, method='pbkdf2:sha256:600000', workers=2, max_waiting=None, wait=5.0):
+        self.method = method
+        self.workers = workers
+        self.wait = wait
+        # Jobs running plus jobs queued; workers=0 hashes on the calling thread
+        self._slots = threading.BoundedSemaphore(self.workers + (max_waiting or self.workers * 4)) if self.workers else None
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def hash(self, password):
+        """Hash a new password with the current method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored, password):
+        """Check a password against a stored hash.
+
+        Returns (valid, new_hash). new_hash is only set when the password is
+        valid and the stored hash used other parameters; save it in place of
+        the old one.
+        """
+        return self._run(_verify, stored, password, self.method)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=_WorkerContext())
+            return self._pool
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        if not self._slots.acquire(timeout=self.wait):
+            raise HasherBusy(f"No hashing process free within {self.wait} seconds")
+        try:
+            pool = self._executor()
+            return pool.submit(function, *args).result()
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next caller
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+        finally:
+            self._slots.release()
@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Request/response types for each supported format
+MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+FORMATS = {mimetype: fmt for fmt, mimetype in MIMETYPES.items()}
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+class RowError(ValueError):
+    """A row that can't be imported; the message is reported back for that row"""
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) from a CSV or NDJSON byte stream, one row at a time.
+
+    Nothing is read ahead beyond the decoder's buffer, so a large body is
+    never held in memory. A row that can't be parsed is yielded as a
+    RowError instead of a dict.
+    """
+    text = io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, RowError("More values than header columns")
+            else:
+                yield reader.line_num, row
+        return
+
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, RowError(f"Invalid JSON: {e}")
+            continue
+        yield number, row if isinstance(row, dict) else RowError("Expected a JSON object")
+
+def import_rows(rows, validate, insert_batch, db_errors, batch_size=BATCH_SIZE):
+    """Validate rows and insert them ``batch_size`` at a time; returns a summary for the response.
+
+    ``validate(row)`` returns the values to insert or raises RowError.
+    ``insert_batch(values)`` inserts a list of them in one transaction and
+    rolls back before raising one of ``db_errors``. A batch the database
+    rejects is retried row by row so the error is reported against the
+    row that caused it and the rest of the batch still goes in.
+
+    If the body goes over the request size limit part way, the rows read
+    before it are still imported. The RequestEntityTooLarge is then
+    re-raised with this summary attached as ``import_summary``, so the
+    client learns what was kept.
+    """
+    summary = {'imported': 0, 'failed': 0, 'errors': []}
+    batch = []
+
+    def fail(number, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'row': number, 'error': message})
+
+    def flush():
+        try:
+            insert_batch([values for _, values in batch])
+            summary['imported'] += len(batch)
+        except db_errors:
+            for number, values in batch:
+                try:
+                    insert_batch([values])
+                    summary['imported'] += 1
+                except db_errors as e:
+                    fail(number, str(e))
+        batch.clear()
+
+    try:
+        for number, row in rows:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                batch.append((number, validate(row)))
+            except RowError as e:
+                fail(number, str(e))
+            if len(batch) >= batch_size:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        # The rest of the body is unreadable; keep what was already imported
+        fail(None, f"Stopped reading: {e}")
+    except RequestEntityTooLarge as e:
+        if batch:
+            flush()
+        summary['errors_truncated'] = summary['failed'] > len(summary['errors'])
+        e.import_summary = summary
+        raise
+    if batch:
+        flush()
+
+    summary['errors_truncated'] = summary['failed'] > len(summary['errors'])
+    return summary
+
+def text_field(row, name, max_length, required=True):
+    value = row.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f"{name} is required")
+    if len(value) > max_length:
+        raise RowError(f"{name} is longer than {max_length} characters")
+    return value
+
+def number_field(row, name, minimum=0, maximum=None, default=None):
+    value = row.get(name)
+    if value is None or value == '':
+        if default is None:
+            raise RowError(f"{name} is required")
+        return default
+    try:
+        value = round(float(value), 2)
+    except (TypeError, ValueError):
+        raise RowError(f"{name} must be a number")
+    if value != value or value < minimum or (maximum is not None and value > maximum):
+        raise RowError(f"{name} must be between {minimum} and {maximum}" if maximum is not None
+                       else f"{name} must be at least {minimum}")
+    return value
+
+class _Echo:
+    # csv.writer target that hands each formatted line straight back
+    def write(self, line):
+        return line
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+def export_rows(rows, fields, fmt):
+    """Yield ``rows`` (sequences in ``fields`` order) as CSV lines, header first, or NDJSON lines"""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(fields, row)), default=_json_value) + '\n'
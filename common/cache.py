@@ -0,0 +1,362 @@
+import pickle
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlparse
+
+class CacheError(Exception):
+    """Raised by a backend that can't reach or understand its server"""
+
+class CacheUnavailable(CacheError):
+    """Raised without trying while a server that just failed is left alone"""
+
+class MemoryBackend:
+    """In-process LRU store. Only coherent within one worker process.
+
+    Counters live outside the LRU: evicting a tag's counter would reset it
+    and bring entries invalidated under an older version back to life.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at or None)
+        self._counters = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        """Set only if absent; True if this call stored the value"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counters(self, keys):
+        with self._lock:
+            return [self._counters.get(key, 0) for key in keys]
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class RedisBackend:
+    """Store on a Redis-compatible server, shared by every worker process.
+
+    Speaks the small subset of RESP needed here (GET, SET with PX/NX, DEL,
+    INCR, MGET) over one socket per thread, so there is no client library
+    to install. Values are pickled, so only point this at a server you
+    trust. Tag counters are stored without expiry; give the server a
+    volatile-* eviction policy so memory pressure only evicts entries.
+    """
+
+    def __init__(self, host='localhost', port=6379, db=0, timeout=0.5, prefix='', retry_after=5.0):
+        self.address = (host, port)
+        self.db = db
+        self.timeout = timeout
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def get(self, key):
+        data = self._command('GET', self.prefix + key)
+        return pickle.loads(data) if data is not None else None
+
+    def set(self, key, value, ttl=None):
+        args = ['SET', self.prefix + key, pickle.dumps(value)]
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        self._command(*args)
+
+    def add(self, key, value, ttl=None):
+        args = ['SET', self.prefix + key, pickle.dumps(value), 'NX']
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        return self._command(*args) is not None
+
+    def delete(self, key):
+        self._command('DEL', self.prefix + key)
+
+    def incr(self, key):
+        return self._command('INCR', self.prefix + key)
+
+    def get_counters(self, keys):
+        if not keys:
+            return []
+        return [int(value or 0) for value in self._command('MGET', *[self.prefix + key for key in keys])]
+
+    def _command(self, *args):
+        conn = self._connect()
+        payload = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode()
+            payload.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        try:
+            conn.sendall(b''.join(payload))
+            return self._read_reply(self._local.reader)
+        except (OSError, ValueError) as e:
+            self._disconnect()
+            raise CacheError(f"Cache server error: {e}") from e
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise CacheError("Cache server closed the connection")
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode()
+        if kind == b'-':
+            raise CacheError(body.decode())
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(body)
+            return None if count < 0 else [self._read_reply(reader) for _ in range(count)]
+        raise CacheError(f"Unexpected reply from cache server: {line!r}")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Don't make every request wait out the connect timeout while the server is down
+            if time.monotonic() < self._down_until:
+                raise CacheUnavailable("Cache server unavailable")
+            try:
+                conn = socket.create_connection(self.address, timeout=self.timeout)
+            except OSError as e:
+                self._down_until = time.monotonic() + self.retry_after
+                raise CacheError(f"Cannot reach cache server at {self.address[0]}:{self.address[1]}: {e}") from e
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._local.conn = conn
+            self._local.reader = conn.makefile('rb')
+            if self.db:
+                self._command('SELECT', self.db)
+        return conn
+
+    def _disconnect(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+class Cache:
+    """get/set/delete with TTLs, tag invalidation, hit counters and single-flight.
+
+    Tags are versioned counters in the backend. Every entry records the
+    versions of its tags when it was computed, and invalidate_tag() just
+    increments the counter, so all entries carrying that tag go stale at
+    once on every worker without anything having to find them.
+
+    Backend failures are counted and treated as misses; a cache outage
+    makes pages slower, never broken.
+    """
+
+    def __init__(self, backend, default_ttl=300, lock_timeout=5.0):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.lock_timeout = lock_timeout
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'errors': 0, 'fills': 0, 'waits': 0}
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url, prefix='', **kwargs):
+        """memory:// (optionally memory://?max_entries=N) or redis://host:port/db
+
+        ``prefix`` namespaces the keys so several apps can share one server.
+        """
+        parsed = urlparse(url)
+        cache_kwargs = {k: kwargs.pop(k) for k in ('default_ttl', 'lock_timeout') if k in kwargs}
+        if parsed.scheme == 'memory':
+            for name, value in parse_qsl(parsed.query):
+                kwargs[name] = int(value)
+            return cls(MemoryBackend(**kwargs), **cache_kwargs)
+        if parsed.scheme == 'redis':
+            db = int(parsed.path.lstrip('/') or 0)
+            backend = RedisBackend(parsed.hostname or 'localhost', parsed.port or 6379, db, prefix=prefix, **kwargs)
+            return cls(backend, **cache_kwargs)
+        raise ValueError(f"Unsupported cache URL: {url}")
+
+    def get(self, key, default=None):
+        try:
+            entry = self.backend.get(key)
+            if entry is not None and self._fresh(entry[1]):
+                self._count('hits')
+                return entry[0]
+        except CacheError as e:
+            self._error(e)
+        self._count('misses')
+        return default
+
+    def set(self, key, value, ttl=None, tags=()):
+        try:
+            self._store(key, value, ttl, self._tag_versions(tags))
+        except CacheError as e:
+            self._error(e)
+
+    def delete(self, key):
+        try:
+            self.backend.delete(key)
+        except CacheError as e:
+            self._error(e)
+
+    def invalidate_tag(self, *tags):
+        """Make every entry carrying any of ``tags`` stale, in every process"""
+        try:
+            for tag in tags:
+                self.backend.incr(self._tag_key(tag))
+        except CacheError as e:
+            self._error(e)
+
+    def get_or_set(self, key, compute, ttl=None, tags=(), tags_for=None):
+        """Return the cached value, computing it once on a miss.
+
+        Concurrent misses for the same key wait for a single compute()
+        instead of all running it: threads in this process share one call,
+        and other processes hold off while a short-lived lock key exists in
+        the backend. A compute() result of None is returned but not cached.
+
+        ``tags`` are known up front, so an invalidation racing with
+        compute() is never lost. ``tags_for(value)`` adds tags that depend
+        on the result (the products on a page, say); their versions can only
+        be read afterwards, so for those the ttl bounds that race.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._flights_lock:
+            flight = self._flights.setdefault(key, threading.Lock())
+        with flight:
+            try:
+                value = self._peek(key, missing)
+                if value is not missing:
+                    self._count('waits')
+                    return value
+                if not self._lock_remote(key):
+                    value = self._wait_remote(key, missing)
+                    if value is not missing:
+                        return value
+                try:
+                    try:
+                        versions = self._tag_versions(tags)
+                    except CacheError as e:
+                        self._error(e)
+                        return compute()
+                    value = compute()
+                    if value is not None:
+                        try:
+                            if tags_for:
+                                versions.update(self._tag_versions(set(tags_for(value)) - versions.keys()))
+                            self._store(key, value, ttl, versions)
+                            self._count('fills')
+                        except CacheError as e:
+                            self._error(e)
+                    return value
+                finally:
+                    self._unlock_remote(key)
+            finally:
+                with self._flights_lock:
+                    self._flights.pop(key, None)
+
+    def stats(self):
+        """Snapshot of this process's hit/miss/error/fill/wait counters"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _peek(self, key, default):
+        # get() without touching the hit/miss counters
+        try:
+            entry = self.backend.get(key)
+            if entry is not None and self._fresh(entry[1]):
+                return entry[0]
+        except CacheError as e:
+            self._error(e)
+        return default
+
+    def _lock_remote(self, key):
+        try:
+            return self.backend.add('lock:' + key, 1, ttl=self.lock_timeout)
+        except CacheError as e:
+            self._error(e)
+            return True
+
+    def _unlock_remote(self, key):
+        try:
+            self.backend.delete('lock:' + key)
+        except CacheError as e:
+            self._error(e)
+
+    def _wait_remote(self, key, default):
+        # Another process is computing this key; poll briefly before giving up
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.01)
+            value = self._peek(key, default)
+            if value is not default:
+                self._count('waits')
+                return value
+        return default
+
+    def _store(self, key, value, ttl, versions):
+        self.backend.set(key, (value, versions), ttl or self.default_ttl)
+
+    def _fresh(self, versions):
+        if not versions:
+            return True
+        current = self.backend.get_counters([self._tag_key(tag) for tag in versions])
+        return all(now == then for now, then in zip(current, versions.values()))
+
+    def _tag_versions(self, tags):
+        tags = list(tags)
+        if not tags:
+            return {}
+        return dict(zip(tags, self.backend.get_counters([self._tag_key(tag) for tag in tags])))
+
+    @staticmethod
+    def _tag_key(tag):
+        return 'tag:' + tag
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _error(self, e):
+        self._count('errors')
+        if not isinstance(e, CacheUnavailable):  # already reported when it went down
+            print(f"Cache error: {e}")
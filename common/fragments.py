@@ -0,0 +1,75 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from flask import make_response, request, session
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
+
+# html is safe to output as-is; data carries whatever the page still needs from the row
+Fragment = namedtuple('Fragment', 'html etag last_modified data')
+
+class FragmentCache:
+    """Rendered HTML fragments kept in the shared cache.
+
+    Fragments are stored under ``fragment:<kind>:<item id>`` and tagged
+    ``product:<item id>``, so invalidate(item_id) (or any other write path
+    invalidating that product's tag) retires every fragment rendered from
+    the old row, in every worker sharing the cache. Entries also expire
+    after ``ttl`` seconds as a backstop for writes that bypass the app.
+    """
+
+    def __init__(self, cache, ttl=60):
+        self.cache = cache
+        self.ttl = ttl
+
+    def get(self, kind, item_id, render, tags=(), tags_for=None):
+        """Return the cached fragment, calling ``render()`` on a miss.
+
+        ``render`` returns (html, data), or None when the item doesn't exist;
+        a None result is passed through and not cached. Extra ``tags``, or
+        ``tags_for(fragment)`` when they depend on the row, name anything
+        else shown in the fragment, such as its seller.
+        """
+        def build():
+            rendered = render()
+            if rendered is None:
+                return None
+            html, data = rendered
+            return Fragment(
+                Markup(html),
+                hashlib.sha1(html.encode()).hexdigest()[:16],
+                datetime.now(timezone.utc).replace(microsecond=0),
+                data
+            )
+
+        return self.cache.get_or_set(
+            f'fragment:{kind}:{item_id}', build, ttl=self.ttl,
+            tags=(f'product:{item_id}', *tags), tags_for=tags_for
+        )
+
+    def invalidate(self, item_id):
+        """Drop every fragment rendered for ``item_id``"""
+        self.cache.invalidate_tag(f'product:{item_id}')
+
+def conditional_page(fragment, render_page):
+    """Answer a page built around ``fragment`` with a 304 when the browser's copy is current.
+
+    The rest of the page (navigation, greeting) depends on the session, so
+    it is folded into the ETag. Pages carrying flash messages are never
+    validated, or a later 304 would replay the old message.
+    """
+    if '_flashes' in session:
+        return render_page()
+
+    viewer = repr(sorted(session.items())).encode()
+    etag = f"{fragment.etag}-{hashlib.sha1(viewer).hexdigest()[:8]}"
+    if not is_resource_modified(request.environ, etag=etag, last_modified=fragment.last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(render_page())
+        response.last_modified = fragment.last_modified
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,106 @@
+import os
+import re
+
+from PIL import Image, ImageOps
+
+MASTER_MAX = 1600          # longest edge of the JPEG fallback kept as the stored image
+WIDTHS = (320, 640, 1280)  # responsive WebP widths for listing cards and detail pages
+THUMB_SIZE = (160, 160)    # square crop for avatars and small previews
+MAX_PIXELS = 40_000_000    # largest upload we will decode (about 8000x5000)
+UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF')
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+DERIVATIVE_PATTERN = re.compile(r'_(\d+|thumb)\.webp$')
+
+def derivative_name(name, suffix):
+    return f"{os.path.splitext(name)[0]}_{suffix}.webp"
+
+def process_upload(stream, folder, name):
+    """Decode an uploaded image and store it with its derivatives.
+
+    Writes ``<stem>.jpg``, a JPEG fallback no larger than MASTER_MAX, plus the
+    WebP derivatives from write_derivatives(). Orientation is applied to the
+    pixels and EXIF (GPS, camera serials, ...) is not carried over. The JPEG is
+    written last and atomically, so once it exists the derivatives do too.
+    Returns the stored name of the JPEG fallback. Raises OSError if the stream
+    is not a readable image, and DecompressionBombError if its header declares
+    more than MAX_PIXELS; that check runs before any pixel data is decoded.
+    """
+    with Image.open(stream, formats=UPLOAD_FORMATS) as source:
+        if source.width * source.height > MAX_PIXELS:
+            raise Image.DecompressionBombError(
+                f"Image size ({source.width}x{source.height}) exceeds limit of {MAX_PIXELS} pixels"
+            )
+        image = _flatten(ImageOps.exif_transpose(source))
+
+    master_name = f"{os.path.splitext(name)[0]}.jpg"
+    write_derivatives(image, folder, master_name)
+    master = image.copy()
+    master.thumbnail((MASTER_MAX, MASTER_MAX))
+    master_path = os.path.join(folder, master_name)
+    master.save(master_path + '.tmp', 'JPEG', quality=85, optimize=True, progressive=True)
+    os.replace(master_path + '.tmp', master_path)
+    return master_name
+
+def write_derivatives(image, folder, name):
+    """Write the responsive WebP sizes and the square thumbnail for ``name``.
+
+    Widths larger than the source are skipped, except the smallest one, so
+    every image has at least one card-sized derivative.
+    """
+    for width in WIDTHS:
+        if width > image.width and width != WIDTHS[0]:
+            break
+        resized = image.copy()
+        resized.thumbnail((width, width * 4))
+        resized.save(os.path.join(folder, derivative_name(name, width)), 'WEBP', quality=80, method=4)
+
+    thumb = ImageOps.fit(image, THUMB_SIZE)
+    thumb.save(os.path.join(folder, derivative_name(name, 'thumb')), 'WEBP', quality=80, method=4)
+
+def remove_image(folder, name):
+    """Delete a stored image and all of its derivatives"""
+    names = [name, derivative_name(name, 'thumb')] + [derivative_name(name, width) for width in WIDTHS]
+    for filename in names:
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+def backfill(folder):
+    """Write derivatives for stored images that predate the pipeline; returns how many"""
+    count = 0
+    for filename in sorted(os.listdir(folder)):
+        if os.path.splitext(filename)[1].lower() not in IMAGE_EXTENSIONS or DERIVATIVE_PATTERN.search(filename):
+            continue
+        if os.path.exists(os.path.join(folder, derivative_name(filename, 'thumb'))):
+            continue
+        try:
+            with Image.open(os.path.join(folder, filename)) as source:
+                image = _flatten(ImageOps.exif_transpose(source))
+        except OSError as e:
+            print(f"Skipping {filename}: {e}")
+            continue
+        write_derivatives(image, folder, filename)
+        count += 1
+    return count
+
+def available_derivatives(folder, name):
+    """(size, filename) pairs for the derivatives of ``name`` that exist on disk.
+
+    ``size`` is a width from WIDTHS or 'thumb'. Not memoized, since another
+    worker process may write or remove the files at any time; it costs four
+    stats, and listing cards already hold the result in their cached fragment.
+    """
+    return tuple(
+        (size, derivative_name(name, size)) for size in WIDTHS + ('thumb',)
+        if os.path.exists(os.path.join(folder, derivative_name(name, size)))
+    )
+
+def _flatten(image):
+    # JPEG and our WebPs carry no alpha, so composite transparent images onto white
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
@@ -0,0 +1,194 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Literals folded out of a statement so repeats with different values group together
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r"\s+")
+
+def statement_shape(sql):
+    """A statement with literals replaced by ? and whitespace collapsed"""
+    return WHITESPACE.sub(' ', LITERALS.sub('?', sql)).strip()
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series):
+                    cumulative += count
+                    labels = _format_labels(self.labels + ('le',), label_values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+def stats_collector(name, help, label, read_stats):
+    """Collector exposing a dict of running totals, such as Cache.stats(), as one labelled counter"""
+    def collect():
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+        for key, value in sorted(read_stats().items()):
+            lines.append(f"{name}{_format_labels((label,), (key,))} {value}")
+        return lines
+    return collect
+
+class Instrumentation:
+    """Per-route latency, per-request query counts and a slow-query log.
+
+    init_app() times every request and serves the totals at /metrics in the
+    Prometheus text format. The database layer reports each statement to
+    record_query(); within a request the statements are tallied so that one
+    shape repeated ``repeat_threshold`` times or more (a query in a loop,
+    the classic N+1) is logged, and any statement slower than
+    ``slow_query_ms`` is logged along with the plan ``explain(sql, params)``
+    returns for it. Plans are fetched once the view has finished, and only
+    for statements that were already slow.
+    """
+
+    def __init__(self, slow_query_ms=100, repeat_threshold=10, explain=None):
+        self.slow_query_ms = slow_query_ms
+        self.repeat_threshold = repeat_threshold
+        self.explain = explain
+        self.collectors = []
+        self.request_latency = Histogram(
+            'http_request_duration_seconds', 'Time spent handling requests',
+            labels=('endpoint', 'method', 'status')
+        )
+        self.query_latency = Histogram(
+            'db_query_duration_seconds', 'Time spent executing database statements', labels=('endpoint',)
+        )
+        self.queries_per_request = Histogram(
+            'db_queries_per_request', 'Database statements executed per request',
+            labels=('endpoint',), buckets=QUERY_COUNT_BUCKETS
+        )
+        self.slow_queries = Counter('db_slow_queries_total', 'Statements slower than the slow-query threshold',
+                                    labels=('endpoint',))
+        self.repeated_queries = Counter('db_repeated_queries_total', 'Requests running one statement shape in a loop',
+                                        labels=('endpoint',))
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def add_collector(self, collect):
+        """Register ``collect()`` returning extra exposition lines for /metrics"""
+        self.collectors.append(collect)
+
+    def record_query(self, sql, params, seconds):
+        """Called by the database layer after each statement"""
+        if not has_request_context() or 'metrics_queries' not in g:
+            self.query_latency.observe(seconds, '')
+            return
+        self.query_latency.observe(seconds, request.endpoint or '')
+        g.metrics_queries.append((sql, params, seconds))
+
+    def metrics_view(self):
+        lines = []
+        for metric in (self.request_latency, self.query_latency, self.queries_per_request,
+                       self.slow_queries, self.repeated_queries):
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            lines.extend(collect())
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    def _start_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = []
+
+    def _record_status(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _finish_request(self, exc):
+        start = g.pop('metrics_start', None)
+        queries = g.pop('metrics_queries', None)
+        if start is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        status = g.pop('metrics_status', 500)
+        self.request_latency.observe(time.perf_counter() - start, endpoint, request.method, status)
+        self.queries_per_request.observe(len(queries), endpoint)
+        self._check_repeats(endpoint, queries)
+        self._log_slow(endpoint, queries)
+
+    def _check_repeats(self, endpoint, queries):
+        counts = {}
+        for sql, _, _ in queries:
+            shape = statement_shape(sql)
+            counts[shape] = counts.get(shape, 0) + 1
+        repeated = [(count, shape) for shape, count in counts.items() if count >= self.repeat_threshold]
+        if repeated:
+            self.repeated_queries.inc(endpoint)
+            for count, shape in sorted(repeated, reverse=True):
+                print(f"Possible N+1 in {endpoint}: ran {count} times: {shape}")
+
+    def _log_slow(self, endpoint, queries):
+        # One line and one plan per slow statement shape, with its slowest run
+        slowest = {}
+        for sql, params, seconds in queries:
+            if seconds * 1000 < self.slow_query_ms:
+                continue
+            self.slow_queries.inc(endpoint)
+            shape = statement_shape(sql)
+            if shape not in slowest or seconds > slowest[shape][2]:
+                slowest[shape] = (sql, params, seconds)
+        for shape, (sql, params, seconds) in slowest.items():
+            print(f"Slow query in {endpoint} ({seconds * 1000:.1f} ms): {shape}")
+            if self.explain and sql.lstrip()[:6].upper() == 'SELECT':
+                try:
+                    for line in self.explain(sql, params):
+                        print(f"    {line}")
+                except Exception as e:
+                    print(f"    (no plan: {e})")
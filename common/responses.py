@@ -0,0 +1,125 @@
+"""Streamed pages and gzip/brotli response compression.
+
+stream_page() sends a template as it renders, so the head of a page is
+on the wire while the data further down is still being queried. A
+template marks a good place to push out what it has so far with
+``{{ flush() }}``, usually just before the expensive part.
+
+Compression compresses text responses for clients that accept it. It
+prefers brotli when the optional brotli package is installed, and uses
+gzip otherwise. A buffered response is only compressed when it is at
+least ``min_size`` bytes, where the saving outweighs the cost. A streamed
+response is compressed as it goes. Output is pushed to the client at each
+flush() marker, so compression doesn't undo the early flush. Files sent
+with send_file and responses that already carry a Content-Encoding (such
+as precompressed assets) pass through untouched.
+"""
+import gzip
+import zlib
+
+from flask import Response, get_flashed_messages, request, session, stream_template
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzipped
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'application/javascript',
+    'application/json', 'application/x-ndjson', 'application/xml', 'image/svg+xml',
+}
+
+def flush():
+    """Template global: send everything rendered so far before continuing"""
+    # Rendered as an empty chunk, which is otherwise meaningless in a stream
+    return Markup('')
+
+def stream_page(template, **context):
+    """A response that renders ``template`` while it is being sent.
+
+    The session is saved before the body starts, so anything the page
+    reads from it must be settled up front: flashes are taken now (the
+    template's get_flashed_messages() returns the same ones) and the
+    session is marked as used so the response still varies on the cookie.
+    """
+    get_flashed_messages()
+    session.accessed = True
+    return Response(stream_template(template, **context))
+
+class Compression:
+    def __init__(self, app=None, min_size=1024, level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.add_template_global(flush)
+        app.after_request(self.compress)
+
+    def compress(self, response):
+        if (response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or request.method == 'HEAD' or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        if not response.is_streamed and (response.calculate_content_length() or 0) < self.min_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._choose_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if encoding == 'br':
+                response.set_data(brotli.compress(data, quality=self.brotli_quality))
+            else:
+                response.set_data(gzip.compress(data, self.level))
+        response.content_encoding = encoding
+
+        # The compressed bytes differ from the ones the tag was made for
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _choose_encoding(self):
+        if brotli is not None and request.accept_encodings['br']:
+            return 'br'
+        if request.accept_encodings['gzip']:
+            return 'gzip'
+        return None
+
+    def _stream(self, chunks, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            compress, sync, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            compress, finish = compressor.compress, compressor.flush
+            sync = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        pending = False
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    # A flush() marker: push out what the compressor is holding
+                    if pending:
+                        yield sync()
+                        pending = False
+                    continue
+                data = compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                pending = True
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
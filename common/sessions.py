@@ -0,0 +1,171 @@
+"""Server-side sessions: the cookie carries only a random session id.
+
+ServerSideSessionInterface replaces Flask's signed-cookie sessions. The
+session dict lives in a store and the browser holds a 43-character id, so
+request headers stay small however much the session holds, and logging a
+user out really ends the session. Data is serialised with the same tagged
+JSON Flask uses for cookies, so flashes and other values round-trip
+unchanged.
+
+A session is written back only when it was modified, and an untouched
+anonymous visitor gets no cookie and no row at all. Records expire
+PERMANENT_SESSION_LIFETIME after their last write.
+
+Stores:
+
+* ``sqlite:///sessions.db``: a local SQLite file shared by every worker
+  process on the host.
+* ``redis://host:port/db``: any Redis-compatible server, through the cache
+  module's client, for sessions shared between hosts.
+* ``memory://``: one process only; for development.
+"""
+import secrets
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+
+from .cache import Cache, CacheError
+
+class ServerSession(SecureCookieSession):
+    """A session dict that knows its id in the store"""
+
+    def __init__(self, initial=None, sid=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the session to a new id when it is saved, such as at login.
+
+        An id planted in the browser before login is then worthless.
+        """
+        if self.sid:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+class SqliteSessionStore:
+    """Sessions in a local SQLite file, one connection per thread"""
+
+    def __init__(self, path, prune_interval=3600):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._local = threading.local()
+        self._next_prune = 0.0
+        conn = self._connection()
+        conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)')
+
+    def load(self, sid):
+        row = self._connection().execute(
+            'SELECT data FROM sessions WHERE id = ? AND expires_at > ?', (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid, data, ttl):
+        now = time.time()
+        conn = self._connection()
+        conn.execute('INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)', (sid, data, now + ttl))
+        if now >= self._next_prune:
+            # Expired rows are never read again; sweep them now and then
+            self._next_prune = now + self.prune_interval
+            conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: every statement is its own short write transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+class CacheSessionStore:
+    """Sessions in a cache backend (memory:// or redis://) under ``session:<id>`` keys"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def load(self, sid):
+        return self.backend.get('session:' + sid)
+
+    def save(self, sid, data, ttl):
+        self.backend.set('session:' + sid, data, ttl)
+
+    def delete(self, sid):
+        self.backend.delete('session:' + sid)
+
+def store_from_url(url, prefix=''):
+    """sqlite:///path, redis://host:port/db or memory://"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'sqlite':
+        return SqliteSessionStore(parsed.path[1:])
+    if parsed.scheme in ('redis', 'memory'):
+        return CacheSessionStore(Cache.from_url(url, prefix=prefix).backend)
+    raise ValueError(f"Unsupported session store URL: {url}")
+
+class ServerSideSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            try:
+                data = self.store.load(sid)
+            except (sqlite3.Error, CacheError) as e:
+                print(f"Session store error: {e}")
+                data = None
+            if data is not None:
+                return self.session_class(self.serializer.loads(data), sid=sid)
+        return self.session_class()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        try:
+            if session.previous_sid:
+                self.store.delete(session.previous_sid)
+            if not session:
+                # Emptied (logout) or never used: drop the record and the cookie
+                if session.modified and session.sid:
+                    self.store.delete(session.sid)
+                    response.delete_cookie(name, domain=domain, path=path,
+                                           secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app))
+                return
+            if not session.modified:
+                return
+            new = session.sid is None
+            if new:
+                session.sid = secrets.token_urlsafe(32)
+            ttl = int(app.permanent_session_lifetime.total_seconds())
+            self.store.save(session.sid, self.serializer.dumps(dict(session)), ttl)
+        except (sqlite3.Error, CacheError) as e:
+            print(f"Session store error: {e}")
+            return
+
+        if new or session.permanent:
+            response.set_cookie(
+                name, session.sid, expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app)
+            )
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from flask import Request, current_app, has_request_context, request
+from werkzeug.exceptions import UnsupportedMediaType
+from werkzeug.utils import cached_property
+
+from . import images
+
+try:
+    import fcntl
+except ImportError:  # Windows: stored images are only locked between threads of one process
+    fcntl = None
+
+CHUNK_SIZE = 64 * 1024
+DIGEST_LENGTH = 32  # hex chars of SHA-256 kept in stored names (128 bits)
+LOCK_STRIPES = 256  # stored names hash onto this many locks
+
+# Leading bytes of the formats allowed_file() accepts
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SNIFF_LENGTH = max(len(signature) for signature, _ in SIGNATURES)
+
+# Stored names derived from content never change meaning, so they can be cached forever
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{%d}(_\d+|_thumb)?\.(jpg|webp)$' % DIGEST_LENGTH)
+
+def is_content_addressed(name):
+    return bool(CONTENT_ADDRESSED.match(os.path.basename(name)))
+
+def sniff_image(head):
+    """Name of the image format ``head`` starts with, or None"""
+    for signature, kind in SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    return None
+
+class SniffedUpload:
+    """Spool for one uploaded file that refuses anything but an image.
+
+    Werkzeug writes each multipart file into this object as the body is
+    parsed. The first SNIFF_LENGTH bytes are held back and checked against
+    SIGNATURES, so a renamed executable or PDF is rejected with a 415 after
+    its first chunk instead of after the whole body has been buffered.
+    Everything else is passed through to the wrapped spool file.
+    """
+
+    def __init__(self, spool):
+        self._spool = spool
+        self._head = b''
+
+    def write(self, data):
+        if self._head is None:
+            return self._spool.write(data)
+        self._head += data
+        if len(self._head) >= SNIFF_LENGTH:
+            if sniff_image(self._head) is None:
+                raise UnsupportedMediaType('Uploaded file is not a PNG, JPEG or GIF image.')
+            self._flush()
+        return len(data)
+
+    def seek(self, *args):
+        # Files shorter than SNIFF_LENGTH are left for the decoder to reject
+        self._flush()
+        return self._spool.seek(*args)
+
+    def read(self, *args):
+        self._flush()
+        return self._spool.read(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._spool, name)
+
+    def _flush(self):
+        if self._head is not None:
+            self._spool.write(self._head)
+            self._head = None
+
+class UploadRequest(Request):
+    """Request class that checks uploads while the body is still streaming in.
+
+    The body limit is looked up per endpoint in the UPLOAD_LIMITS config and
+    falls back to MAX_CONTENT_LENGTH, so only routes that take files accept
+    large bodies. Werkzeug enforces it while reading and aborts with a 413
+    as soon as it is crossed. Every named file part goes through
+    SniffedUpload.
+    """
+
+    @property
+    def max_content_length(self):
+        config = current_app.config
+        return config.get('UPLOAD_LIMITS', {}).get(self.endpoint, config['MAX_CONTENT_LENGTH'])
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return SniffedUpload(spool) if filename else spool
+
+    @cached_property
+    def held_image_locks(self):
+        """Stripe locks taken by store_image(), released when the request closes"""
+        return {}
+
+    def close(self):
+        for handle in self.held_image_locks.values():
+            _unlock(handle)
+        self.held_image_locks.clear()
+        super().close()
+
+def store_image(stream, folder):
+    """Store an uploaded image under the hash of its bytes and return the stored name.
+
+    The upload is copied to a temp file in CHUNK_SIZE pieces while it is
+    hashed, so it is never held in memory whole. If an image with the same
+    content is already stored, the stored copy is reused and nothing is
+    decoded or written.
+
+    Inside a request the image stays locked until the request ends, by which
+    time the caller has committed the row that references it, so a
+    release_lock() in another worker can't unlink it in between.
+    """
+    digest, tmp_path = _spool(stream, folder)
+    try:
+        name = f"{digest}.jpg"
+        _hold(folder, name)
+        if not os.path.exists(os.path.join(folder, name)):
+            with open(tmp_path, 'rb') as spooled:
+                images.process_upload(spooled, folder, name)
+        return name
+    finally:
+        os.remove(tmp_path)
+
+@contextmanager
+def release_lock(folder, name):
+    """Lock a stored image while its references are counted and its files removed.
+
+    Yields False when another request is storing an image on the same lock
+    right now. That request is about to reference the file, so the caller
+    should leave it alone. A request that already holds locks from
+    store_image() only tries the lock, so two requests can't wait on each
+    other.
+    """
+    held = _held_locks() or {}
+    stripe = _stripe(name)
+    if stripe in held:
+        yield True
+        return
+    handle = _lock(folder, stripe, blocking=not held)
+    try:
+        yield handle is not None
+    finally:
+        if handle:
+            _unlock(handle)
+
+_thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+def _held_locks():
+    # Locks the current request keeps until it ends; None outside an UploadRequest
+    return getattr(request, 'held_image_locks', None) if has_request_context() else None
+
+def _hold(folder, name):
+    held = _held_locks()
+    stripe = _stripe(name)
+    if held is None or stripe in held:
+        return
+    handle = _lock(folder, stripe, blocking=not held)
+    if handle:
+        held[stripe] = handle
+
+def _stripe(name):
+    return int(hashlib.sha256(os.path.basename(name).encode()).hexdigest()[:8], 16) % LOCK_STRIPES
+
+def _lock(folder, stripe, blocking=True):
+    # Every worker process on the host shares one lock file per stripe, outside the served folder
+    thread_lock = _thread_locks[stripe]
+    if not thread_lock.acquire(blocking):
+        return None
+    if fcntl is None:
+        return thread_lock, None
+    lock_dir = os.path.join(
+        tempfile.gettempdir(), 'upload-locks-' + hashlib.sha256(os.path.abspath(folder).encode()).hexdigest()[:12]
+    )
+    os.makedirs(lock_dir, exist_ok=True)
+    fd = os.open(os.path.join(lock_dir, f'{stripe:02x}'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        thread_lock.release()
+        return None
+    return thread_lock, fd
+
+def _unlock(handle):
+    thread_lock, fd = handle
+    if fd is not None:
+        os.close(fd)
+    thread_lock.release()
+
+def _spool(stream, folder):
+    sha = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return sha.hexdigest()[:DIGEST_LENGTH], tmp_path
@@ -0,0 +1,74 @@
+import importlib
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The shared modules are imported as the apps import them, from the common package
+sys.path.insert(0, ROOT)
+
+def import_from(folder, name):
+    # Both apps have top-level modules called app and migrations, so each app's modules are
+    # imported with only its own folder on the path and dropped from sys.modules afterwards
+    path = os.path.join(ROOT, folder)
+    sys.path.insert(0, path)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(path)
+        for key, module in list(sys.modules.items()):
+            module_file = getattr(module, '__file__', None)
+            if module_file and os.path.dirname(os.path.abspath(module_file)) == path:
+                del sys.modules[key]
+
+@pytest.fixture(scope='session')
+def database():
+    return import_from('Ecofinds', 'database')
+
+@pytest.fixture(scope='session')
+def catalog():
+    return import_from('Ecofinds', 'catalog')
+
+@pytest.fixture(scope='session')
+def migrations():
+    return import_from('HACKATHON', 'migrations')
+
+@pytest.fixture(scope='session')
+def bills():
+    return import_from('HACKATHON', 'bills')
+
+@pytest.fixture(scope='session')
+def connections():
+    return import_from('HACKATHON', 'connections')
+
+@pytest.fixture
+def conn(migrations):
+    # A fully migrated, empty HACKATHON database
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    yield conn
+    conn.close()
+
+@pytest.fixture(scope='session')
+def hackathon(tmp_path_factory):
+    # The HACKATHON app module, run from a scratch folder so its database, sessions and bills land there
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('hackathon'))
+    try:
+        app = import_from('HACKATHON', 'app')
+        app.init_db()
+        yield app
+    finally:
+        os.chdir(cwd)
+
+@pytest.fixture
+def client(hackathon):
+    # A test client logged in as the seeded admin
+    client = hackathon.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'admin'
+    return client
@@ -0,0 +1,24 @@
+from common.assets import minify_css, minify_js
+
+def test_js_comments_and_indentation_are_dropped():
+    source = '// header\nfunction add(a, b) {\n    /* sum */\n    return a + b;\n}\n'
+    assert minify_js(source) == 'function add(a,b){return a+b;}\n'
+
+def test_js_strings_templates_and_regexes_are_kept():
+    source = "const s = 'a // b', t = `x  ${ y }  /* z */`;\nconst re = /\\/\\*  +/g;\n"
+    minified = minify_js(source)
+    assert "'a // b'" in minified
+    assert '`x  ${ y }  /* z */`' in minified
+    assert '/\\/\\*  +/g' in minified
+
+def test_js_keeps_line_breaks_that_end_statements():
+    minified = minify_js('let a = 1\nlet b = a\n++b\n')
+    assert minified.splitlines() == ['let a=1', 'let b=a', '++b']
+
+def test_css_comments_and_whitespace_are_collapsed():
+    source = '/* theme */\nbody {\n    color: red;\n    margin: 0 auto;\n}\n'
+    assert minify_css(source) == 'body{color:red;margin:0 auto}\n'
+
+def test_css_strings_and_descendant_pseudo_classes_are_kept():
+    source = 'a :hover { content: "  /* not a comment */  "; }\n'
+    assert minify_css(source) == 'a :hover{content:"  /* not a comment */  "}\n'
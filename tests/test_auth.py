@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+from common.auth import PasswordHasher, hash_method
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stands in for app.py run directly: it records every time its top level runs
+SCRIPT = '''
+import sys
+sys.path.insert(0, {root!r})
+with open({marker!r}, 'a') as f:
+    f.write('imported\\n')
+from common.auth import PasswordHasher
+
+if __name__ == '__main__':
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=1)
+    print(hasher.verify(hasher.hash('secret'), 'secret'))
+    hasher.shutdown()
+'''
+
+def test_outdated_hash_is_upgraded_on_verify():
+    old = PasswordHasher('pbkdf2:sha256:1000', workers=0)
+    new = PasswordHasher('pbkdf2:sha256:2000', workers=0)
+    valid, upgraded = new.verify(old.hash('secret'), 'secret')
+    assert valid
+    assert hash_method(upgraded) == 'pbkdf2:sha256:2000'
+    assert new.verify(old.hash('secret'), 'wrong') == (False, None)
+
+def test_workers_do_not_import_the_main_module_again(tmp_path):
+    marker = tmp_path / 'imports'
+    script = tmp_path / 'main.py'
+    script.write_text(SCRIPT.format(root=ROOT, marker=str(marker)))
+    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=60)
+    assert result.stdout.strip() == '(True, None)', result.stderr
+    assert marker.read_text() == 'imported\n'
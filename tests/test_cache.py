@@ -0,0 +1,74 @@
+import threading
+import time
+
+from common.cache import Cache, MemoryBackend
+
+def counting(value):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return value
+    return compute, calls
+
+def test_get_or_set_computes_once():
+    cache = Cache(MemoryBackend())
+    compute, calls = counting('page')
+    assert cache.get_or_set('k', compute) == 'page'
+    assert cache.get_or_set('k', compute) == 'page'
+    assert len(calls) == 1
+
+def test_invalidate_tag_retires_only_tagged_entries():
+    cache = Cache(MemoryBackend())
+    books, book_calls = counting('books')
+    toys, toy_calls = counting('toys')
+    cache.get_or_set('books', books, tags=['category:Books', 'category:all'])
+    cache.get_or_set('toys', toys, tags=['category:Toys'])
+    cache.invalidate_tag('category:all')
+    cache.get_or_set('books', books, tags=['category:Books', 'category:all'])
+    cache.get_or_set('toys', toys, tags=['category:Toys'])
+    assert (len(book_calls), len(toy_calls)) == (2, 1)
+
+def test_tags_for_adds_tags_from_the_value():
+    cache = Cache(MemoryBackend())
+    compute, calls = counting([{'id': 7}])
+    tags_for = lambda rows: [f"product:{row['id']}" for row in rows]
+    cache.get_or_set('page', compute, tags_for=tags_for)
+    cache.invalidate_tag('product:8')
+    cache.get_or_set('page', compute, tags_for=tags_for)
+    assert len(calls) == 1
+    cache.invalidate_tag('product:7')
+    cache.get_or_set('page', compute, tags_for=tags_for)
+    assert len(calls) == 2
+
+def test_none_is_not_cached():
+    cache = Cache(MemoryBackend())
+    compute, calls = counting(None)
+    cache.get_or_set('missing', compute)
+    cache.get_or_set('missing', compute)
+    assert len(calls) == 2
+
+def test_concurrent_misses_share_one_compute():
+    cache = Cache(MemoryBackend())
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'page'
+
+    start = threading.Barrier(8)
+    results = []
+
+    def worker():
+        start.wait()
+        results.append(cache.get_or_set('k', compute))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['page'] * 8
+    assert len(calls) == 1
+    assert cache.stats()['fills'] == 1
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+class FeedCursor:
+    """Answers fetch_product_page's keyset queries from a list of rows.
+
+    The bound and the LIMIT are always the last parameters, so the fake only
+    needs to know which column the page is sorted on and in which direction.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, sql, params):
+        self.queries.append((sql, list(params)))
+        key = 'relevance' if 'relevance' in sql.split('ORDER BY')[-1] else 'created_at'
+        ascending = 'ASC' in sql
+        rows = sorted(self.rows, key=lambda row: (row[key], row['id']), reverse=not ascending)
+        if 'p.id <' in sql or 'p.id >' in sql:
+            bound = tuple(params[-3:-1])
+            if ascending:
+                rows = [row for row in rows if (row[key], row['id']) > bound]
+            else:
+                rows = [row for row in rows if (row[key], row['id']) < bound]
+        self.result = rows[:params[-1]]
+
+    def fetchall(self):
+        return [dict(row) for row in self.result]
+
+def feed(count):
+    # Two products per second, so most pages split a tie on created_at
+    return [{'id': i, 'created_at': START + timedelta(seconds=i // 2)} for i in range(1, count + 1)]
+
+def test_cursor_round_trip(catalog):
+    product = {'id': 42, 'created_at': START}
+    assert catalog.decode_cursor(catalog.encode_cursor(product)) == (START, 42)
+
+def test_malformed_cursors_decode_to_none(catalog):
+    for token in (None, '', 'abc', '20240101120000', '20240101120000_x', 'x_1', '1_2_3'):
+        assert catalog.decode_cursor(token) is None
+
+def test_walking_the_feed_visits_every_product_once(catalog):
+    cursor = FeedCursor(feed(11))
+    seen, after, pages = [], None, 0
+    while True:
+        products, after, prev = catalog.fetch_product_page(cursor, after=after, per_page=3)
+        assert (prev is None) == (pages == 0)
+        seen += [product['id'] for product in products]
+        pages += 1
+        if after is None:
+            break
+    assert seen == list(range(11, 0, -1))
+    assert pages == 4
+
+def test_previous_cursor_returns_the_page_before(catalog):
+    cursor = FeedCursor(feed(11))
+    first, after, _ = catalog.fetch_product_page(cursor, per_page=3)
+    second, _, before = catalog.fetch_product_page(cursor, after=after, per_page=3)
+    back, next_cursor, prev = catalog.fetch_product_page(cursor, before=before, per_page=3)
+    assert [p['id'] for p in back] == [p['id'] for p in first]
+    assert next_cursor == after
+    assert prev is None
+
+def test_malformed_cursor_serves_the_first_page(catalog):
+    cursor = FeedCursor(feed(5))
+    products, _, prev = catalog.fetch_product_page(cursor, after='garbage', per_page=3)
+    assert [p['id'] for p in products] == [5, 4, 3]
+    assert prev is None
+    assert 'p.id <' not in cursor.queries[-1][0]
+
+def test_boolean_query_requires_every_word_as_a_prefix(catalog):
+    assert catalog.boolean_query('red lamp!') == '+red* +lamp*'
+    assert catalog.boolean_query('-chair +"oak"') == '+chair* +oak*'
+
+def test_boolean_query_without_words_is_none(catalog):
+    assert catalog.boolean_query('!!! ++ "') is None
+
+def test_ranked_cursor_round_trip(catalog):
+    product = {'id': 7, 'created_at': START, 'relevance': 1.25}
+    token = catalog.encode_cursor(product)
+    assert token == '1.250000_7'
+    assert catalog.decode_cursor(token, ranked=True) == (1.25, 7)
+    assert catalog.decode_cursor(token) is None
+
+def test_search_pages_by_relevance(catalog):
+    rows = [dict(row, relevance=float(row['id'] % 3)) for row in feed(10)]
+    cursor = FeedCursor(rows)
+    expected = [row['id'] for row in sorted(rows, key=lambda row: (row['relevance'], row['id']), reverse=True)]
+    seen, after = [], None
+    while True:
+        products, after, _ = catalog.fetch_product_page(cursor, after=after, per_page=4, search='lamp')
+        seen += [product['id'] for product in products]
+        if after is None:
+            break
+    assert seen == expected
+    sql, params = cursor.queries[0]
+    assert 'relevance' in sql
+    assert params[0] == '+lamp*'
+
+def test_search_without_words_finds_nothing(catalog):
+    cursor = FeedCursor(feed(5))
+    assert catalog.fetch_product_page(cursor, search='!!!') == ([], None, None)
+    assert cursor.queries == []
@@ -0,0 +1,130 @@
+import threading
+
+import pytest
+from mysql.connector import errorcode
+
+class FakeConnection:
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+        self.in_transaction = False
+        self.unread_result = False
+        self.rollbacks = 0
+
+    def is_connected(self):
+        return self.connected
+
+    def consume_results(self):
+        self.unread_result = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def opened(monkeypatch, database):
+    # Every connection the pool opens, in order
+    opened = []
+
+    def connect(**config):
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(database.mysql.connector, 'connect', connect)
+    return opened
+
+def test_released_connection_is_reused(database, opened):
+    pool = database.ConnectionPool(size=2)
+    connection, created_at = pool.acquire()
+    pool.release(connection, created_at)
+    assert pool.acquire()[0] is connection
+    assert len(opened) == 1
+
+def test_release_rolls_back_open_work(database, opened):
+    pool = database.ConnectionPool(size=1)
+    connection, created_at = pool.acquire()
+    connection.in_transaction = True
+    connection.unread_result = True
+    pool.release(connection, created_at)
+    assert connection.rollbacks == 1
+    assert not connection.unread_result
+
+def test_acquire_times_out_when_every_slot_is_taken(database, opened):
+    pool = database.ConnectionPool(size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(database.PoolTimeout):
+        pool.acquire()
+
+def test_release_wakes_a_waiting_caller(database, opened):
+    pool = database.ConnectionPool(size=1, timeout=2)
+    connection, created_at = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()[0]))
+    waiter.start()
+    pool.release(connection, created_at)
+    waiter.join()
+    assert got == [connection]
+
+def test_old_connections_are_recycled(database, opened):
+    pool = database.ConnectionPool(size=1, recycle=0)
+    connection, created_at = pool.acquire()
+    pool.release(connection, created_at)
+    replacement, _ = pool.acquire()
+    assert connection.closed
+    assert replacement is not connection
+
+def test_dead_idle_connections_are_replaced(database, opened):
+    pool = database.ConnectionPool(size=1, ping_interval=0)
+    connection, created_at = pool.acquire()
+    pool.release(connection, created_at)
+    connection.connected = False
+    assert pool.acquire()[0] is not connection
+    assert connection.closed
+
+def test_connection_that_fails_to_reset_is_dropped(database, opened):
+    pool = database.ConnectionPool(size=1, timeout=0.05)
+    connection, created_at = pool.acquire()
+    connection.in_transaction = True
+
+    def rollback():
+        raise database.Error('server has gone away')
+
+    connection.rollback = rollback
+    pool.release(connection, created_at)
+    assert connection.closed
+    assert pool.acquire()[0] is not connection
+
+def test_duplicate_key_names_the_colliding_index(database):
+    error = database.mysql.connector.IntegrityError(
+        msg="Duplicate entry 'bob' for key 'users.username'", errno=errorcode.ER_DUP_ENTRY)
+    assert database.duplicate_key(error) == 'username'
+    older = database.mysql.connector.IntegrityError(
+        msg="Duplicate entry 'bob@example.com' for key 'email'", errno=errorcode.ER_DUP_ENTRY)
+    assert database.duplicate_key(older) == 'email'
+
+def test_duplicate_key_ignores_other_integrity_errors(database):
+    error = database.mysql.connector.IntegrityError(
+        msg='Cannot add or update a child row', errno=errorcode.ER_NO_REFERENCED_ROW_2)
+    assert database.duplicate_key(error) is None
+
+def test_first_use_creates_one_pool_for_every_thread(database, opened, monkeypatch):
+    monkeypatch.setattr(database, '_pool', None)
+    start = threading.Barrier(8)
+    pools = []
+
+    def borrow():
+        start.wait()
+        with database.get_connection():
+            pools.append(database._pool)
+
+    threads = [threading.Thread(target=borrow) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(pools) == 8
+    assert all(pool is pools[0] for pool in pools)
+    assert not any(connection.closed for connection in opened)
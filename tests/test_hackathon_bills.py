@@ -0,0 +1,39 @@
+import os
+import threading
+
+def test_bill_is_rendered_to_its_file(bills, tmp_path):
+    store = bills.BillStore(str(tmp_path))
+    bill = bills.Bill('buyer', '2024-01-01 10:00:00', [bills.BillItem('Lamp', 2, 10.0)], 10.0)
+    path = store.get(7, bill)
+    assert path == store.path(7)
+    with open(path, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
+    assert os.listdir(tmp_path) == ['7.pdf']
+
+def test_concurrent_requests_share_one_render(bills, tmp_path, monkeypatch):
+    started, release, renders = threading.Event(), threading.Event(), []
+
+    def render(path, bill):
+        renders.append(path)
+        started.set()
+        release.wait(5)
+        open(path, 'w').close()
+        return path
+
+    monkeypatch.setattr(bills, 'render_bill', render)
+    store = bills.BillStore(str(tmp_path))
+    first = store.submit(7, None)
+    started.wait(5)
+    assert store.submit(7, None) is first
+    release.set()
+    first.result(5)
+    assert len(renders) == 1
+
+def test_finished_render_does_not_forget_a_newer_one(bills, tmp_path):
+    store = bills.BillStore(str(tmp_path))
+    old, new = object(), object()
+    store._pending[7] = new
+    store._forget(7, old)
+    assert store._pending[7] is new
+    store._forget(7, new)
+    assert 7 not in store._pending
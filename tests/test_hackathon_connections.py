@@ -0,0 +1,29 @@
+import gc
+import sqlite3
+import threading
+
+import pytest
+
+@pytest.fixture
+def manager(connections, tmp_path):
+    return connections.ConnectionManager(str(tmp_path / 'shop.db'))
+
+def test_thread_keeps_its_connection(manager):
+    assert manager.get() is manager.get()
+
+def test_connection_is_closed_when_its_thread_ends(manager):
+    opened = []
+    thread = threading.Thread(target=lambda: opened.append(manager.get()))
+    thread.start()
+    thread.join()
+    del thread
+    gc.collect()
+    with pytest.raises(sqlite3.ProgrammingError, match='closed'):
+        opened[0].execute('SELECT 1')
+
+def test_close_opens_a_fresh_connection_next_time(manager):
+    first = manager.get()
+    manager.close()
+    with pytest.raises(sqlite3.ProgrammingError, match='closed'):
+        first.execute('SELECT 1')
+    assert manager.get() is not first
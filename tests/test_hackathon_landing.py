@@ -0,0 +1,9 @@
+def test_search_without_words_lists_nothing(client):
+    page = client.get('/?search=!!!').get_data(as_text=True)
+    assert 'No products match your search.' in page
+    assert 'product-card' not in page
+
+def test_landing_without_search_shows_best_picks(client):
+    page = client.get('/').get_data(as_text=True)
+    assert 'No products match your search.' not in page
+    assert 'product-card' in page
@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+
+def add_user(conn, name='buyer'):
+    return conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                        (name, f'{name}@example.com', 'x')).lastrowid
+
+def add_product(conn, user_id, price, discount=0.0):
+    return conn.execute('''INSERT INTO products (user_id, title, description, category, price, discount)
+                           VALUES (?, 'Lamp', 'A lamp', 'Other', ?, ?)''', (user_id, price, discount)).lastrowid
+
+def summary(conn, user_id):
+    row = conn.execute('SELECT item_count, total FROM cart_summaries WHERE user_id = ?', (user_id,)).fetchone()
+    return (row['item_count'], row['total']) if row else None
+
+def test_fresh_database_reaches_the_last_migration(migrations):
+    conn = sqlite3.connect(':memory:')
+    assert migrations.current_version(conn) == 0
+    assert migrations.migrate(conn) == len(migrations.MIGRATIONS)
+    assert migrations.current_version(conn) == migrations.MIGRATIONS[-1][0]
+
+def test_migrate_skips_applied_versions(migrations, conn):
+    assert migrations.migrate(conn) == 0
+
+def test_failed_migration_is_rolled_back(migrations, conn, monkeypatch):
+    latest = migrations.MIGRATIONS[-1][0]
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS + [
+        (latest + 1, 'broken', ['CREATE TABLE half_done (x)', 'SELECT * FROM no_such_table']),
+    ])
+    with pytest.raises(sqlite3.OperationalError):
+        migrations.migrate(conn)
+    assert migrations.current_version(conn) == latest
+    assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone()
+
+def test_duplicate_cart_rows_are_folded_before_the_unique_index(migrations, monkeypatch):
+    conn = sqlite3.connect(':memory:')
+    everything = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [m for m in everything if m[0] < 5])
+    migrations.migrate(conn)
+    conn.executemany('''INSERT INTO products (user_id, title, description, category, price)
+                        VALUES (1, ?, 'A lamp', 'Other', 5)''', [('Lamp',), ('Desk',)])
+    conn.executemany('INSERT INTO carts (user_id, product_id, quantity) VALUES (?, ?, ?)',
+                     [(1, 1, 2), (1, 1, 3), (1, 2, 1)])
+    conn.commit()
+    monkeypatch.setattr(migrations, 'MIGRATIONS', everything)
+    migrations.migrate(conn)
+    assert conn.execute('SELECT product_id, quantity FROM carts ORDER BY product_id').fetchall() == [(1, 5), (2, 1)]
+
+def test_cart_summary_follows_inserts_and_updates(conn):
+    user_id = add_user(conn)
+    product_id = add_product(conn, user_id, 10.0, discount=2.0)
+    conn.execute('INSERT INTO carts (user_id, product_id, quantity) VALUES (?, ?, 3)', (user_id, product_id))
+    assert summary(conn, user_id) == (3, 24.0)
+    conn.execute('UPDATE carts SET quantity = 5 WHERE user_id = ?', (user_id,))
+    assert summary(conn, user_id) == (5, 40.0)
+
+def test_cart_summary_resets_to_zero_when_emptied(conn):
+    user_id = add_user(conn)
+    first = add_product(conn, user_id, 0.1)
+    second = add_product(conn, user_id, 0.2)
+    for product_id in (first, second):
+        conn.execute('INSERT INTO carts (user_id, product_id, quantity) VALUES (?, ?, 3)', (user_id, product_id))
+    conn.execute('DELETE FROM carts WHERE product_id = ?', (first,))
+    conn.execute('DELETE FROM carts WHERE product_id = ?', (second,))
+    # Exactly zero, not the float residue of subtracting the lines one by one
+    assert summary(conn, user_id) == (0, 0)
+
+def test_cart_summary_reprices_with_the_product(conn):
+    user_id = add_user(conn)
+    product_id = add_product(conn, user_id, 10.0)
+    other_id = add_product(conn, user_id, 4.0)
+    conn.execute('INSERT INTO carts (user_id, product_id, quantity) VALUES (?, ?, 2)', (user_id, product_id))
+    conn.execute('INSERT INTO carts (user_id, product_id, quantity) VALUES (?, ?, 1)', (user_id, other_id))
+    conn.execute('UPDATE products SET price = 12.5, discount = 0.5 WHERE id = ?', (product_id,))
+    assert summary(conn, user_id) == (3, 28.0)
+
+def test_deleted_product_leaves_carts(conn):
+    user_id = add_user(conn)
+    product_id = add_product(conn, user_id, 10.0)
+    other_id = add_product(conn, user_id, 4.0)
+    conn.execute('INSERT INTO carts (user_id, product_id, quantity) VALUES (?, ?, 2)', (user_id, product_id))
+    conn.execute('INSERT INTO carts (user_id, product_id, quantity) VALUES (?, ?, 1)', (user_id, other_id))
+    conn.execute('DELETE FROM products WHERE id = ?', (product_id,))
+    assert summary(conn, user_id) == (1, 4.0)
+    assert conn.execute('SELECT COUNT(*) FROM carts').fetchone()[0] == 1
+
+def test_backfilled_bills_group_purchases_made_in_one_checkout(migrations, monkeypatch):
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    everything = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [m for m in everything if m[0] < 8])
+    migrations.migrate(conn)
+    user_id = add_user(conn)
+    product_id = add_product(conn, user_id, 5.0)
+    # The first checkout inserted row by row, so one order can cross a second boundary
+    for date in ('2024-01-01 10:00:00', '2024-01-01 10:00:01', '2024-01-01 10:30:00'):
+        conn.execute('''INSERT INTO purchases (user_id, product_id, purchase_date, quantity, total_price)
+                        VALUES (?, ?, ?, 1, 5)''', (user_id, product_id, date))
+    conn.commit()
+    monkeypatch.setattr(migrations, 'MIGRATIONS', everything)
+    migrations.migrate(conn)
+    bills = conn.execute('SELECT id, created_at, total FROM bills ORDER BY id').fetchall()
+    assert [tuple(bill) for bill in bills] == [(1, '2024-01-01 10:00:00', 10.0), (3, '2024-01-01 10:30:00', 5.0)]
@@ -0,0 +1,60 @@
+import pytest
+
+def walk(fetch):
+    # Follow next cursors from the first page to the last, collecting ids
+    ids, after = [], None
+    while True:
+        page, after = fetch(after)
+        ids += page
+        if not after:
+            return ids
+
+@pytest.fixture
+def buyer(conn):
+    user_id = conn.execute("INSERT INTO users (username, email, password) VALUES ('buyer', 'b@example.com', 'x')").lastrowid
+    product_id = conn.execute('''INSERT INTO products (user_id, title, description, category, price)
+                                 VALUES (?, 'Lamp', 'A lamp', 'Other', 5)''', (user_id,)).lastrowid
+    # Three purchases per timestamp, so the id has to break ties between pages
+    for day in range(1, 8):
+        for _ in range(3):
+            conn.execute('''INSERT INTO purchases (user_id, product_id, purchase_date, quantity, total_price)
+                            VALUES (?, ?, ?, 1, 5)''', (user_id, product_id, f'2024-01-0{day} 10:00:00'))
+    return user_id
+
+def test_purchase_cursor_visits_every_row_once(hackathon, conn, buyer):
+    newest_first = [row['id'] for row in conn.execute(
+        'SELECT id FROM purchases ORDER BY purchase_date DESC, id DESC')]
+
+    def fetch(after):
+        rows, cursor = hackathon.purchase_page(conn, buyer, after, per_page=4)
+        return [row['id'] for row in rows], cursor
+
+    assert walk(fetch) == newest_first
+
+def test_purchase_cursor_encodes_date_and_id(hackathon, conn, buyer):
+    rows, cursor = hackathon.purchase_page(conn, buyer, per_page=2)
+    assert cursor == f"{rows[-1]['purchase_date']}_{rows[-1]['id']}"
+
+def test_mangled_purchase_cursor_starts_over(hackathon, conn, buyer):
+    first, _ = hackathon.purchase_page(conn, buyer, per_page=4)
+    again, _ = hackathon.purchase_page(conn, buyer, 'not-a-cursor', per_page=4)
+    assert [row['id'] for row in again] == [row['id'] for row in first]
+
+def test_search_cursor_visits_every_match_once(client):
+    rows = ''.join(f'Keysetlamp {i},{"keysetlamp " * (i % 4)}d,Books,{i + 1}\n' for i in range(23))
+    response = client.post('/products/import', data='title,description,category,price\n' + rows, content_type='text/csv')
+    assert response.json['imported'] == 23
+
+    def fetch(after):
+        query = '/api/v1/search?search=keysetlamp&limit=5' + (f'&after={after}' if after else '')
+        body = client.get(query).json
+        return [product['id'] for product in body['products']], body['next']
+
+    ids = walk(fetch)
+    everything = client.get('/api/v1/search?search=keysetlamp&limit=50').json['products']
+    assert ids == [product['id'] for product in everything]
+    assert len(set(ids)) == 23
+
+def test_mangled_search_cursor_is_rejected(client):
+    response = client.get('/api/v1/search?search=lamp&after=7')
+    assert response.status_code == 400
@@ -0,0 +1,12 @@
+from PIL import Image
+
+from common import images
+
+def test_derivatives_written_later_are_seen(tmp_path):
+    # Another worker may write or remove the files between two renders
+    assert images.available_derivatives(str(tmp_path), 'lamp.jpg') == ()
+    images.write_derivatives(Image.new('RGB', (400, 300)), str(tmp_path), 'lamp.jpg')
+    assert images.available_derivatives(str(tmp_path), 'lamp.jpg') == (
+        (320, 'lamp_320.webp'), ('thumb', 'lamp_thumb.webp'))
+    (tmp_path / 'lamp_thumb.webp').unlink()
+    assert images.available_derivatives(str(tmp_path), 'lamp.jpg') == ((320, 'lamp_320.webp'),)
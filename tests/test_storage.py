@@ -0,0 +1,89 @@
+import io
+import threading
+
+import pytest
+from flask import Flask
+from PIL import Image
+from werkzeug.exceptions import UnsupportedMediaType
+
+from common.storage import SniffedUpload, UploadRequest, release_lock, sniff_image, store_image
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 32
+
+@pytest.mark.parametrize('head, kind', [
+    (PNG, 'png'),
+    (b'\xff\xd8\xff\xe0' + b'\0' * 8, 'jpeg'),
+    (b'GIF89a' + b'\0' * 8, 'gif'),
+    (b'%PDF-1.7\n', None),
+])
+def test_sniff_image(head, kind):
+    assert sniff_image(head) == kind
+
+def test_image_passes_through_in_small_chunks():
+    spool = io.BytesIO()
+    upload = SniffedUpload(spool)
+    for i in range(0, len(PNG), 3):
+        upload.write(PNG[i:i + 3])
+    upload.seek(0)
+    assert upload.read() == PNG
+
+def test_non_image_is_rejected_on_its_first_chunk():
+    upload = SniffedUpload(io.BytesIO())
+    with pytest.raises(UnsupportedMediaType):
+        upload.write(b'MZ\x90\x00' + b'\0' * 60)
+
+def test_short_file_is_left_for_the_decoder():
+    spool = io.BytesIO()
+    upload = SniffedUpload(spool)
+    upload.write(b'GIF')
+    upload.seek(0)
+    assert spool.getvalue() == b'GIF'
+
+def png(color):
+    out = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(out, 'PNG')
+    out.seek(0)
+    return out
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+    return app
+
+def release_in_thread(app, folder, name, store=None):
+    # Runs release_lock() from another request, optionally after that request stored an image
+    result = []
+
+    def run():
+        with app.test_request_context('/', method='POST'):
+            if store:
+                store_image(store, folder)
+            with release_lock(folder, name) as locked:
+                result.append(locked)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+def test_stored_image_is_locked_until_the_request_ends(app, tmp_path):
+    with app.test_request_context('/', method='POST'):
+        name = store_image(png('red'), str(tmp_path))
+        thread, result = release_in_thread(app, str(tmp_path), name)
+        thread.join(0.2)
+        assert thread.is_alive()
+    thread.join(5)
+    assert result == [True]
+
+def test_release_gives_way_instead_of_waiting_while_holding_a_lock(app, tmp_path):
+    with app.test_request_context('/', method='POST'):
+        name = store_image(png('red'), str(tmp_path))
+        thread, result = release_in_thread(app, str(tmp_path), name, store=png('blue'))
+        thread.join(5)
+        assert result == [False]
+
+def test_release_inside_the_storing_request_goes_ahead(app, tmp_path):
+    with app.test_request_context('/', method='POST'):
+        name = store_image(png('red'), str(tmp_path))
+        with release_lock(str(tmp_path), name) as locked:
+            assert locked